@@ -0,0 +1,129 @@
+"""
+Acesso assíncrono ao banco com a API async do PyMongo (AsyncMongoClient)
+
+As consultas independentes de uma tela (contagens da Visão Geral, resumo +
+scans de uma residência, ...) são disparadas juntas com asyncio.gather, então
+o tempo de parede fica próximo do da consulta mais lenta, e não da soma dos
+round trips — o que pesa em links com RTT alto (Atlas).
+
+Um único AsyncMongoClient, com o pool de conexões ajustado em
+DEFAULT_POOL_OPTIONS, é compartilhado. Como o Streamlit executa o script de
+forma síncrona, `AsyncRunner` mantém um event loop em uma thread própria e
+`run()` espera o resultado de uma corrotina a partir do código síncrono.
+
+Requer pymongo>=4.13.
+"""
+
+import asyncio
+import os
+import threading
+
+from pymongo import AsyncMongoClient
+
+from rollups import RESIDENCE_STATS
+from scan_store import (
+    DOCUMENTS, hourly_series_pipeline, scan_collection, scan_count_pipeline, scan_ids_pipeline, storage_mode,
+)
+
+# pool dimensionado para várias telas consultando em paralelo; zlib reduz bytes
+# trafegados em links lentos sem dependência extra
+DEFAULT_POOL_OPTIONS = {
+    "maxPoolSize": 50,
+    "minPoolSize": 4,
+    "maxIdleTimeMS": 60_000,
+    "maxConnecting": 4,
+    "serverSelectionTimeoutMS": 10_000,
+    "compressors": "zlib",
+}
+
+
+ACTIVE_OBJECTS = {"status": "ativo"}
+
+
+def recent_objects_pipeline(limit, projection=None):
+    """Objetos mais recentes da Visão Geral (percorre o índice last_seen_1 de trás para frente)."""
+    stages = [{"$sort": {"last_seen": -1}}, {"$limit": limit}]
+    if projection:
+        stages.append({"$project": projection})
+    return stages
+
+
+def async_client(uri=None, event_listeners=None, **options):
+    """AsyncMongoClient com as opções de pool padrão (sobrescrevíveis)."""
+    opts = dict(DEFAULT_POOL_OPTIONS, **options)
+    return AsyncMongoClient(uri or os.getenv("MONGODB_URI"), event_listeners=event_listeners or [], **opts)
+
+
+class AsyncRunner:
+    """Event loop em uma thread dedicada, para usar corrotinas a partir de código síncrono."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="async-db", daemon=True)
+        self._thread.start()
+
+    def run(self, coro, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+
+class AsyncDataAccess:
+    """Consultas do dashboard agrupadas por tela, executadas concorrentemente."""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def gather(self, **queries):
+        """Aguarda as corrotinas nomeadas juntas e devolve um dict com os resultados."""
+        results = await asyncio.gather(*queries.values())
+        return dict(zip(queries, results))
+
+    async def find(self, collection, filter=None, projection=None, sort=None, limit=0):
+        cursor = self.db[collection].find(filter or {}, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        return await cursor.to_list(None)
+
+    async def aggregate(self, collection, pipeline):
+        cursor = await self.db[collection].aggregate(pipeline)
+        return await cursor.to_list(None)
+
+    async def find_one(self, collection, filter, projection=None):
+        return await self.db[collection].find_one(filter, projection)
+
+    async def overview(self, recent_limit, recent_projection):
+        """Contagens + objetos mais recentes da Visão Geral, em paralelo."""
+        db = self.db
+        return await self.gather(
+            users=db.users.estimated_document_count(),
+            residences=db.residences.estimated_document_count(),
+            objects=db.objects.estimated_document_count(),
+            scans=self.count_scans(),
+            history=db.history.estimated_document_count(),
+            active_objects=db.objects.count_documents(ACTIVE_OBJECTS),
+            recent=self.aggregate("objects", recent_objects_pipeline(recent_limit, recent_projection)),
+        )
+
+    async def count_scans(self):
+        mode = storage_mode()
+        if mode == DOCUMENTS:
+            return await self.db.scans.estimated_document_count()
+        result = await self.aggregate(scan_collection(mode), scan_count_pipeline(mode))
+        return result[0]["n"] if result else 0
+
+    async def residence_view(self, residence_id, series=False, max_points=None):
+        """Resumo da residência + ids dos scans (e, opcionalmente, a série por hora do gráfico,
+        com até `max_points` pontos)."""
+        scans = scan_collection()
+        queries = {
+            "stats": self.find_one(RESIDENCE_STATS, {"_id": residence_id}),
+            "scan_ids": self.aggregate(scans, scan_ids_pipeline(residence_id)),
+        }
+        if series:
+            queries["series"] = self.aggregate(scans, hourly_series_pipeline(residence_id, max_points=max_points))
+        return await self.gather(**queries)
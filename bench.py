@@ -0,0 +1,312 @@
+"""
+Benchmark dos caminhos de escrita e leitura
+
+Para cada escala (quantidade de usuários):
+- popula o banco com o gerador do pop_db.py (modo bulk) e mede docs/s por coleção
+- mede a latência de ingest_scan (um scan com suas detecções, com deduplicação)
+- mede as consultas do dashboard, as mesmas que o `python migrations.py --advise`
+  analisa (migrations.dashboard_query_shapes, montadas pelas funções que as
+  páginas chamam, no SCAN_STORAGE ativo), com valores sorteados do banco
+
+Usa MONGODB_URI (ou --uri) se informado; senão sobe um mongod descartável
+em um diretório temporário (--mongod aponta o binário). O banco de
+benchmark é apagado ao final. O resultado vai para JSON e pode ser comparado
+com uma execução anterior (--compare), sinalizando regressões.
+
+Uso:
+    python bench.py --scales 10,100,1000 --out bench.json
+    python bench.py --scales 100 --compare bench.json --threshold 0.2
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient
+
+import pop_db
+from common import COLLECTION_ORDER, summarize
+from dedup import MatcherCache
+from migrations import dashboard_query_shapes, migrate, sample_values
+from rollups import rebuild_stats
+from scan_store import migrate_scans, storage_mode
+from ingest import ingest_scan
+
+DEFAULT_SCALES = [10, 100]
+DEFAULT_REPEAT = 50
+DEFAULT_INGESTS = 200
+BENCH_DB = "map_app_bench"
+
+
+# --- mongod descartável -------------------------------------------------------
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ThrowawayMongod:
+    """Sobe um mongod em diretório temporário e remove tudo ao sair."""
+
+    def __init__(self, binary="mongod"):
+        self.binary = binary
+        self.dbpath = None
+        self.process = None
+        self.uri = None
+
+    def __enter__(self):
+        if shutil.which(self.binary) is None:
+            raise SystemExit(f"mongod não encontrado ('{self.binary}'). Informe --mongod ou MONGODB_URI.")
+        self.dbpath = tempfile.mkdtemp(prefix="bench_mongod_")
+        port = _free_port()
+        self.process = subprocess.Popen(
+            [self.binary, "--dbpath", self.dbpath, "--port", str(port), "--bind_ip", "127.0.0.1", "--quiet"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT,
+        )
+        self.uri = f"mongodb://127.0.0.1:{port}"
+        client = MongoClient(self.uri, serverSelectionTimeoutMS=1000)
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                client.admin.command("ping")
+                break
+            except Exception:
+                if time.monotonic() > deadline or self.process.poll() is not None:
+                    self.__exit__(None, None, None)
+                    raise SystemExit("mongod não respondeu a tempo.")
+                time.sleep(0.2)
+        client.close()
+        return self
+
+    def __exit__(self, *exc):
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.dbpath:
+            shutil.rmtree(self.dbpath, ignore_errors=True)
+
+
+# --- medições -------------------------------------------------------------------
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def bench_seed(db, num_users, batch_size, seed):
+    seeder = pop_db.BulkSeeder(db, batch_size=batch_size)
+    started = time.perf_counter()
+    for bundle in pop_db.generate_bundles(0, num_users, seed=seed):
+        seeder.add(bundle)
+    seeder.flush()
+    total_seconds = time.perf_counter() - started
+    result = {"total_seconds": round(total_seconds, 3), "collections": {}}
+    for name in COLLECTION_ORDER:
+        seconds = seeder.write_seconds[name]
+        result["collections"][name] = {
+            "docs": seeder.totals[name],
+            "write_seconds": round(seconds, 3),
+            "docs_per_s": round(seeder.totals[name] / seconds, 1) if seconds else None,
+        }
+    total_docs = sum(seeder.totals.values())
+    result["docs_per_s"] = round(total_docs / total_seconds, 1) if total_seconds else None
+    return result
+
+
+def bench_ingest(db, count, rng):
+    residences = [r["_id"] for r in db.residences.find({}, {"_id": 1})]
+    if not residences:
+        return {}
+    base = datetime(2030, 1, 1)
+    # índice de deduplicação por residência, carregado no primeiro scan dela (como na ingestão real)
+    matchers = MatcherCache(db)
+    samples = []
+    for i in range(count):
+        residence_id = rng.choice(residences)
+        known = [o["vision_hash"] for o in db.objects.find({"residence_id": residence_id}, {"vision_hash": 1}).limit(20)]
+        detections = []
+        for _ in range(rng.randint(0, pop_db.MAX_OBJECTS_PER_SCAN)):
+            coords = pop_db.jitter_coords(rng.uniform(0, 4), rng.uniform(0, 4), 0, rng=rng)
+            if known and rng.random() < 0.5:
+                vision_hash = rng.choice(known)
+            else:
+                vision_hash = pop_db.make_vision_hash("bench", coords, rng=rng)
+            detections.append({
+                "name": rng.choice(pop_db.object_base_names),
+                "type": rng.choice(pop_db.object_types),
+                "color": rng.choice(pop_db.colors),
+                "coordinates": coords,
+                "confidence": round(rng.uniform(0.5, 0.99), 3),
+                "vision_hash": vision_hash,
+            })
+        scan_doc = {"timestamp": base + timedelta(seconds=i), "camera_meta": {"device": "bench"}}
+        started = time.perf_counter()
+        ingest_scan(db, residence_id, scan_doc, detections, matcher=matchers.get(residence_id))
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def run_command(db, command):
+    """Executa um comando de dashboard_query_shapes, consumindo o cursor inteiro."""
+    if "find" in command or "aggregate" in command:
+        return list(db.cursor_command(command))
+    return db.command(command)  # count/distinct
+
+
+def query_values(db, size=50):
+    """Conjuntos de valores (usuário, residência, scan, objeto) sorteados do banco."""
+    objects = list(db.objects.aggregate([
+        {"$sample": {"size": size}}, {"$project": {"residence_id": 1, "scan_id": 1}}
+    ]))
+    if not objects:
+        return [sample_values(db)]
+    owners = {
+        r["_id"]: r["user_id"]
+        for r in db.residences.find({"_id": {"$in": [o["residence_id"] for o in objects]}}, {"user_id": 1})
+    }
+    return [
+        {"user_id": owners.get(o["residence_id"]), "residence_id": o["residence_id"],
+         "scan_id": o.get("scan_id"), "object_id": o["_id"]}
+        for o in objects
+    ]
+
+
+def dashboard_queries(db, rng):
+    """As consultas das páginas do dashboard (migrations.dashboard_query_shapes)."""
+    shapes = [dashboard_query_shapes(v) for v in query_values(db)]
+    return {
+        label: lambda i=i: run_command(db, rng.choice(shapes)[i][1])
+        for i, (label, _) in enumerate(shapes[0])
+    }
+
+
+def run_scale(client, num_users, args):
+    client.drop_database(BENCH_DB)
+    db = client[BENCH_DB]
+    migrate(db, verbose=False)
+    rng = random.Random(args.seed)
+
+    print(f"[{num_users} usuários] populando ...")
+    result = {"users": num_users, "seed": bench_seed(db, num_users, args.batch_size, args.seed)}
+    # como no pop_db --bulk: scans na coleção do SCAN_STORAGE e resumos prontos para as páginas
+    migrate_scans(db, storage_mode(), drop_source=True)
+    rebuild_stats(db)
+    print(f"[{num_users} usuários] ingest_scan x{args.ingests} ...")
+    result["ingest_scan"] = bench_ingest(db, args.ingests, rng)
+    print(f"[{num_users} usuários] consultas do dashboard x{args.repeat} ...")
+    result["queries"] = {name: timed(fn, args.repeat) for name, fn in dashboard_queries(db, rng).items()}
+    return result
+
+
+# --- comparação -----------------------------------------------------------------
+
+def compare(current, baseline, threshold):
+    """Lista de regressões: latência p50 maior ou vazão menor que o limite."""
+    regressions = []
+    base_scales = {str(s["users"]): s for s in baseline.get("scales", [])}
+    for scale in current["scales"]:
+        base = base_scales.get(str(scale["users"]))
+        if base is None:
+            continue
+        label = f"{scale['users']} usuários"
+        old_rate, new_rate = base["seed"].get("docs_per_s"), scale["seed"].get("docs_per_s")
+        if old_rate and new_rate and new_rate < old_rate * (1 - threshold):
+            regressions.append(f"{label} seed: {old_rate} -> {new_rate} docs/s")
+        metrics = {"ingest_scan": (base.get("ingest_scan", {}), scale.get("ingest_scan", {}))}
+        for name, stats in scale["queries"].items():
+            metrics[name] = (base["queries"].get(name, {}), stats)
+        for name, (old, new) in metrics.items():
+            if old.get("p50_ms") and new.get("p50_ms") and new["p50_ms"] > old["p50_ms"] * (1 + threshold):
+                regressions.append(f"{label} {name}: p50 {old['p50_ms']} -> {new['p50_ms']} ms")
+    return regressions
+
+
+def print_report(report):
+    for scale in report["scales"]:
+        print(f"\n=== {scale['users']} usuários ===")
+        print(f"seed: {scale['seed']['docs_per_s']} docs/s em {scale['seed']['total_seconds']} s")
+        for name, stats in scale["seed"]["collections"].items():
+            print(f"  {name:<11} {stats['docs']:>9} docs  {stats['docs_per_s'] or '-':>10} docs/s")
+        rows = {"ingest_scan": scale["ingest_scan"], **scale["queries"]}
+        width = max(map(len, rows))
+        print(f"  {'operação':<{width}} {'p50':>9} {'p95':>9} {'p99':>9}  (ms)")
+        for name, stats in rows.items():
+            if stats:
+                print(f"  {name:<{width}} {stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['p99_ms']:>9}")
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Benchmark de escrita e leitura contra um mongod local.")
+    parser.add_argument("--uri", default=os.getenv("MONGODB_URI"), help="URI de um mongod existente")
+    parser.add_argument("--mongod", default="mongod", help="binário do mongod descartável")
+    parser.add_argument("--scales", default=",".join(map(str, DEFAULT_SCALES)), help="usuários por escala, ex.: 10,100,1000")
+    parser.add_argument("--batch-size", type=int, default=pop_db.DEFAULT_BATCH_SIZE)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="repetições de cada consulta")
+    parser.add_argument("--ingests", type=int, default=DEFAULT_INGESTS, help="scans ingeridos por escala")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", default=None, help="JSON de uma execução anterior")
+    parser.add_argument("--threshold", type=float, default=0.2, help="variação tolerada (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+    report = {
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "params": {k: v for k, v in vars(args).items() if k not in ("uri",)},
+        "scales": [],
+    }
+
+    def run(uri):
+        client = MongoClient(uri)
+        try:
+            report["server_version"] = client.server_info().get("version")
+            for num_users in scales:
+                report["scales"].append(run_scale(client, num_users, args))
+        finally:
+            client.drop_database(BENCH_DB)
+            client.close()
+
+    if args.uri:
+        run(args.uri)
+    else:
+        with ThrowawayMongod(args.mongod) as mongod:
+            run(mongod.uri)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print_report(report)
+    print(f"\nResultados gravados em {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print("\nRegressões encontradas:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print("\nSem regressões em relação a", args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
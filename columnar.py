@@ -0,0 +1,284 @@
+"""
+Carga colunar dos resultados de consulta para análise e gráficos
+
+`to_df` monta um DataFrame de dicts BSON completos: `coordinates` e
+`camera_meta.position` viram colunas de dicts, ObjectId/datetime/strings
+ficam em colunas object-dtype (um objeto Python por célula). Aqui cada coleção
+tem um esquema de colunas tipadas e os resultados são decodificados direto
+nelas:
+
+- campos aninhados achatados (`coordinates.x`, `coordinates.y`, ...) em float64
+- type/color/status/action_type como categóricos (códigos inteiros)
+- datas em datetime64[ms] (int64 por baixo)
+- ObjectId como string hexadecimal (armazenamento Arrow quando há pyarrow)
+
+Com PyMongoArrow instalado (`pip install pymongoarrow`), a agregação é
+decodificada em C direto para uma tabela Arrow. Sem ele, os lotes BSON crus
+(`aggregate_raw_batches`) são decodificados um por vez e empilhados em arrays
+NumPy, então só um lote de dicts existe em memória por vez.
+
+Uso:
+    python columnar.py --limit 100000   # compara memória: to_df x colunar
+"""
+
+import argparse
+import gc
+import os
+import time
+import tracemalloc
+from array import array
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from bson import ObjectId, decode_all
+
+try:
+    import pyarrow as pa
+    STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    pa = None
+    STRING_DTYPE = object
+
+try:
+    from pymongoarrow.api import Schema, aggregate_arrow_all
+    HAS_PYMONGOARROW = True
+except ImportError:
+    HAS_PYMONGOARROW = False
+
+DEFAULT_BATCH_SIZE = 10_000
+EPOCH = datetime(1970, 1, 1)
+EPOCH_UTC = EPOCH.replace(tzinfo=timezone.utc)
+
+# tipos de coluna: id (ObjectId -> hex), ref (ObjectId repetido -> categórico de
+# hex), str, category, float, int, datetime
+OBJECT_SCHEMA = {
+    "_id": "id",
+    "residence_id": "ref",
+    "name": "category",
+    "type": "category",
+    "color": "category",
+    "status": "category",
+    "coordinates.x": "float",
+    "coordinates.y": "float",
+    "coordinates.z": "float",
+    "confidence": "float",
+    "first_seen": "datetime",
+    "last_seen": "datetime",
+    "vision_hash": "str",
+}
+SCAN_SCHEMA = {
+    "_id": "id",
+    "residence_id": "ref",
+    "timestamp": "datetime",
+    "objects_detected_count": "int",
+    "camera_meta.device": "category",
+    "camera_meta.fov": "int",
+    "camera_meta.position.x": "float",
+    "camera_meta.position.y": "float",
+    "camera_meta.position.z": "float",
+}
+HISTORY_SCHEMA = {
+    "_id": "id",
+    "object_id": "ref",
+    "action_type": "category",
+    "timestamp": "datetime",
+    "notes": "str",
+}
+
+
+def select(schema, *fields):
+    """Subconjunto do esquema (ex.: select(OBJECT_SCHEMA, "_id", "coordinates.x", ...))."""
+    return {f: schema[f] for f in fields}
+
+
+def _project(schema):
+    """$project que entrega só os campos do esquema, com ObjectId já como string."""
+    project = {"_id": 0}
+    for field, kind in schema.items():
+        project[field] = {"$toString": f"${field}"} if kind in ("id", "ref") else 1
+    return project
+
+
+def columnar_pipeline(filter=None, schema=OBJECT_SCHEMA, sort=None, limit=0):
+    stages = [{"$match": filter or {}}]
+    if sort:
+        stages.append({"$sort": dict(sort)})
+    if limit:
+        stages.append({"$limit": limit})
+    stages.append({"$project": _project(schema)})
+    return stages
+
+
+def _get(doc, field):
+    for part in field.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+class _Column:
+    """Acumula os valores de uma coluna lote a lote, já no tipo final."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        if kind in ("category", "ref"):
+            self.codes = array("i")
+            self.categories = {}
+        elif kind in ("float", "int"):
+            self.values = array("d")
+        elif kind == "datetime":
+            self.values = array("q")
+        else:
+            self.values = []
+
+    def extend(self, values):
+        kind = self.kind
+        if kind in ("category", "ref"):
+            cats = self.categories
+            # -1 é o código de ausente em pd.Categorical
+            if kind == "ref":
+                values = (str(v) if isinstance(v, ObjectId) else v for v in values)
+            self.codes.extend(-1 if v is None else cats.setdefault(v, len(cats)) for v in values)
+        elif kind in ("float", "int"):
+            self.values.extend(v if isinstance(v, (int, float)) else np.nan for v in values)
+        elif kind == "datetime":
+            nat = np.iinfo(np.int64).min
+            self.values.extend(nat if v is None else _epoch_ms(v) for v in values)
+        elif kind == "id":
+            self.values.extend(str(v) if isinstance(v, ObjectId) else v for v in values)
+        else:
+            self.values.extend(values)
+
+    def finish(self):
+        kind = self.kind
+        if kind in ("category", "ref"):
+            codes = np.frombuffer(self.codes, dtype=np.int32) if len(self.codes) else np.empty(0, np.int32)
+            return pd.Categorical.from_codes(codes, categories=list(self.categories))
+        if kind == "float":
+            return np.frombuffer(self.values, dtype=np.float64).copy()
+        if kind == "int":
+            values = np.frombuffer(self.values, dtype=np.float64)
+            return pd.array(np.where(np.isnan(values), None, values), dtype="Int64")
+        if kind == "datetime":
+            return np.frombuffer(self.values, dtype=np.int64).view("datetime64[ms]").copy()
+        return pd.array(self.values, dtype=STRING_DTYPE) if STRING_DTYPE != object else np.array(self.values, dtype=object)
+
+
+def _epoch_ms(value):
+    # datas do PyMongo são UTC sem tzinfo (a menos que o client use tz_aware)
+    delta = value - (EPOCH_UTC if value.tzinfo is not None else EPOCH)
+    return (delta.days * 86_400 + delta.seconds) * 1000 + delta.microseconds // 1000
+
+
+class ColumnBuilder:
+    """Monta um DataFrame tipado a partir de lotes de documentos."""
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.columns = {field: _Column(kind) for field, kind in schema.items()}
+
+    def add(self, docs):
+        for field, column in self.columns.items():
+            column.extend(_get(d, field) for d in docs)
+
+    def frame(self):
+        return pd.DataFrame({field: column.finish() for field, column in self.columns.items()})
+
+
+def frame_from_docs(docs, schema):
+    """DataFrame tipado de documentos já buscados (ex.: uma página do dashboard)."""
+    builder = ColumnBuilder(schema)
+    builder.add(docs)
+    return builder.frame()
+
+
+def _arrow_type(kind):
+    return {
+        "float": pa.float64(), "int": pa.int64(), "datetime": pa.timestamp("ms"),
+    }.get(kind, pa.string())
+
+
+def _arrow_schema(schema):
+    # campos com ponto viram structs aninhados, como na consulta
+    tree = {}
+    for field, kind in schema.items():
+        node = tree
+        *parents, leaf = field.split(".")
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = _arrow_type(kind)
+
+    def build(node):
+        return {k: pa.struct(list(build(v).items())) if isinstance(v, dict) else v for k, v in node.items()}
+
+    return Schema(build(tree))
+
+
+def _arrow_frame(table, schema):
+    while any(pa.types.is_struct(f.type) for f in table.schema):
+        table = table.flatten()
+    columns = {}
+    for field, kind in schema.items():
+        column = table.column(field)
+        if kind in ("category", "ref"):
+            columns[field] = column.dictionary_encode().to_pandas()
+        elif kind in ("id", "str"):
+            columns[field] = column.to_pandas().astype(STRING_DTYPE)
+        elif kind == "int":
+            columns[field] = pd.array(column.to_pandas(), dtype="Int64")
+        else:
+            columns[field] = column.to_numpy(zero_copy_only=False)
+    return pd.DataFrame(columns)
+
+
+def load_frame(col, filter=None, schema=OBJECT_SCHEMA, sort=None, limit=0, batch_size=DEFAULT_BATCH_SIZE):
+    """Executa a consulta no servidor e devolve um DataFrame tipado pelo esquema."""
+    pipeline = columnar_pipeline(filter, schema, sort, limit)
+    if HAS_PYMONGOARROW:
+        return _arrow_frame(aggregate_arrow_all(col, pipeline, schema=_arrow_schema(schema)), schema)
+    builder = ColumnBuilder(schema)
+    for batch in col.aggregate_raw_batches(pipeline, batchSize=batch_size):
+        builder.add(decode_all(batch))
+    return builder.frame()
+
+
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+def _traced(load):
+    """Executa `load` e devolve (resultado, MB ainda alocados, segundos)."""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = load()
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current / 1024 ** 2, elapsed
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Compara memória e tempo: DataFrame de dicts x carga colunar.")
+    parser.add_argument("--limit", type=int, default=100_000, help="quantidade de objetos carregados")
+    args = parser.parse_args()
+
+    db = MongoClient(os.getenv("MONGODB_URI"))[os.getenv("MONGODB_DB")]
+    projection = {f.split(".")[0]: 1 for f in OBJECT_SCHEMA}
+
+    # memory_usage(deep=True) não conta o conteúdo dos dicts aninhados: mede com tracemalloc
+    dicts, dicts_mb, dicts_s = _traced(lambda: pd.DataFrame(list(db.objects.find({}, projection).limit(args.limit))))
+    del dicts
+    typed, typed_mb, typed_s = _traced(lambda: load_frame(db.objects, limit=args.limit))
+
+    print(f"Objetos: {len(typed)} ({'PyMongoArrow' if HAS_PYMONGOARROW else 'lotes BSON + NumPy'})")
+    print(f"to_df:    {dicts_mb:8.1f} MB  {dicts_s:6.2f}s")
+    print(f"colunar:  {typed_mb:8.1f} MB  {typed_s:6.2f}s")
+    if len(typed):
+        print(f"redução:  {dicts_mb / typed_mb:.1f}x")
@@ -0,0 +1,31 @@
+"""
+Constantes e medições usadas por vários scripts
+
+- COLLECTION_ORDER: ordem de escrita que respeita as referências entre
+  coleções (pop_db.py, write_behind.py, bench.py)
+- DUPLICATE_KEY: código de erro do MongoDB para chave duplicada
+- summarize: resumo de latências (bench.py, write_behind.py)
+"""
+
+import statistics
+
+# ordem de escrita respeitando as referências entre coleções
+COLLECTION_ORDER = ["users", "residences", "scans", "objects", "history"]
+
+DUPLICATE_KEY = 11000
+
+
+def summarize(samples):
+    """Estatísticas de latência em milissegundos."""
+    ms = sorted(s * 1000 for s in samples)
+    if not ms:
+        return {}
+    pick = lambda q: ms[min(len(ms) - 1, int(round(q * (len(ms) - 1))))]
+    return {
+        "n": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "p50_ms": round(pick(0.50), 3),
+        "p95_ms": round(pick(0.95), 3),
+        "p99_ms": round(pick(0.99), 3),
+        "max_ms": round(ms[-1], 3),
+    }
@@ -0,0 +1,39 @@
+"""
+Páginas do dashboard, carregadas sob demanda
+
+O dashboard.py só importa o módulo da página escolhida, então pandas, plotly
+e o driver só são carregados na primeira vez que uma página precisa deles,
+e não na abertura do app. Nos reruns seguintes o módulo já está em
+sys.modules e só o `render()` da página roda de novo.
+
+Cada módulo expõe `render()`. Para adicionar uma página, crie o módulo aqui,
+registre-o em PAGES e confira o tempo de importação e da primeira
+renderização com `python startup_report.py`.
+"""
+
+import importlib
+import sys
+import time
+
+PAGES = {
+    "Visão Geral": "dashboard_pages.overview",
+    "Objetos": "dashboard_pages.objects",
+    "History (Eventos)": "dashboard_pages.history",
+    "Scans": "dashboard_pages.scans",
+    "Ao Vivo": "dashboard_pages.live",
+}
+# só aparece com ?diag=1 na URL ou DASHBOARD_DIAG=1 no ambiente
+HIDDEN_PAGES = {
+    "Diagnóstico": "dashboard_pages.diagnostics",
+}
+ALL_PAGES = {**PAGES, **HIDDEN_PAGES}
+
+
+def load_page(label):
+    """(módulo da página, ms gastos importando-o agora; 0 se já estava carregado)."""
+    name = ALL_PAGES[label]
+    if name in sys.modules:
+        return sys.modules[name], 0.0
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    return module, (time.perf_counter() - started) * 1000
@@ -0,0 +1,135 @@
+"""
+Acesso a dados compartilhado pelas páginas do dashboard
+
+Os recursos (client síncrono e async, cache de consultas, índices espaciais,
+change stream, perfil de consultas) são criados no primeiro uso, com
+st.cache_resource, e não na importação: abrir o app ou uma página que não
+consulta o banco não conecta nem importa o driver. Os imports pesados
+ficam dentro das funções que precisam deles.
+"""
+
+import os
+import sys
+
+import streamlit as st
+
+from dashboard_pages.timing import RunTimings
+
+RECENT_OBJECTS_LIMIT = 50
+RECENT_OBJECTS_PROJECTION = {
+    "_id": 0, "name": 1, "type": 1, "color": 1, "status": 1,
+    "confidence": 1, "first_seen": 1, "last_seen": 1,
+}
+NAME_PROJECTION = {"name": 1}
+OBJECT_TABLE_PROJECTION = {
+    "name": 1, "type": 1, "color": 1, "coordinates": 1,
+    "first_seen": 1, "last_seen": 1, "status": 1, "confidence": 1,
+}
+SCAN_TABLE_PROJECTION = {
+    "timestamp": 1, "objects_detected_count": 1, "camera_meta": 1,
+}
+
+
+# perfil das consultas (latência por forma de consulta), compartilhado pelo servidor
+@st.cache_resource
+def get_profiler():
+    from instrumentation import QueryProfiler
+    return QueryProfiler()
+
+
+# conexao com o MongoDB
+@st.cache_resource
+def get_db():
+    from pymongo.mongo_client import MongoClient
+    from pymongo.server_api import ServerApi
+
+    uri = os.getenv("MONGODB_URI")
+    db_name = os.getenv("MONGODB_DB")
+    profiler = get_profiler()
+
+    try:
+        client = MongoClient(uri, server_api=ServerApi('1'), event_listeners=[profiler])
+        client.admin.command('ping')
+    except Exception:
+        client = MongoClient(uri, event_listeners=[profiler])
+        client.admin.command('ping')
+
+    profiler.attach(client)
+    return client[db_name]
+
+
+# consultas independentes de uma tela saem juntas pelo client async (pool compartilhado)
+@st.cache_resource
+def get_async_data():
+    from async_db import AsyncDataAccess, AsyncRunner, async_client
+
+    runner = AsyncRunner()
+
+    async def make():
+        client = async_client(event_listeners=[get_profiler()])
+        return AsyncDataAccess(client[os.getenv("MONGODB_DB")])
+
+    return runner, runner.run(make())
+
+
+def run_async(method, *args):
+    runner, data = get_async_data()
+    return runner.run(getattr(data, method)(*args))
+
+
+# cache de consultas compartilhado entre todas as sessões do servidor
+@st.cache_resource
+def get_query_cache():
+    from query_cache import QueryCache
+    return QueryCache()
+
+
+# índices espaciais por residência (grade sobre as coordenadas x/y/z)
+@st.cache_resource
+def get_spatial_cache():
+    from spatial import SpatialIndexCache
+    return SpatialIndexCache(get_db())
+
+
+# um único assinante de change stream por servidor, compartilhado pelas sessões
+@st.cache_resource
+def get_live_feed():
+    from live_feed import LiveFeed
+    feed = LiveFeed(get_db())
+    feed.start()
+    return feed
+
+
+@st.cache_resource
+def get_run_timings():
+    return RunTimings()
+
+
+def invalidate_all():
+    """Botão Atualizar: limpa o cache de consultas e, se já carregados, os índices espaciais."""
+    get_query_cache().invalidate()
+    if "spatial" in sys.modules:
+        get_spatial_cache().invalidate()
+
+
+def load_residence_view(residence_id, series=False, max_points=None):
+    """Resumo + scans da residência (e a série do gráfico), buscados em paralelo."""
+    from query_cache import make_key
+    from rollups import RESIDENCE_STATS
+
+    return get_query_cache().get_or_load(
+        make_key(RESIDENCE_STATS, "residence_view", residence_id, series, max_points),
+        lambda: run_async("residence_view", residence_id, series, max_points)
+    )
+
+
+def user_options():
+    """{nome: _id} dos usuários (só _id e name), em ordem de nome."""
+    users = get_query_cache().find(get_db().users, projection=NAME_PROJECTION, sort=[("name", 1)])
+    return {u["name"]: u["_id"] for u in users}
+
+
+def residence_options(user_id):
+    """{nome: _id} das residências do usuário."""
+    residences = get_query_cache().find(get_db().residences, {"user_id": user_id}, NAME_PROJECTION)
+    return {r["name"]: r["_id"] for r in residences}
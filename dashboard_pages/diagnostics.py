@@ -0,0 +1,58 @@
+"""Diagnóstico: latência por forma de consulta e tempos de inicialização das páginas."""
+
+import plotly.express as px
+import streamlit as st
+
+from dashboard_pages.data import get_profiler, get_run_timings
+from dashboard_pages.timing import FIRST_RENDER_BUDGET_MS, IMPORT_BUDGET_MS
+from dashboard_pages.widgets import to_df
+
+
+def render():
+    st.title("🩺 Diagnóstico de Consultas")
+    profiler = get_profiler()
+
+    if st.button("Zerar métricas"):
+        profiler.reset()
+
+    rows = profiler.summary()
+    if not rows:
+        st.info("Nenhuma consulta registrada ainda. Navegue pelas outras páginas e volte aqui.")
+    else:
+        df = to_df(rows)
+        df["index_used"] = df["index_used"].map({True: "sim", False: "COLLSCAN"}).fillna("-")
+        slow = df[df["index_used"] == "COLLSCAN"]
+        if not slow.empty:
+            st.warning(f"{len(slow)} forma(s) de consulta sem índice (COLLSCAN).")
+
+        st.subheader("Consultas por forma (mais lentas primeiro)")
+        st.dataframe(df[[
+            "collection", "shape", "count", "p50_ms", "p95_ms", "p99_ms",
+            "docs_per_call", "avg_bytes", "index_used", "failures",
+        ]])
+
+        by_collection = df.groupby("collection", as_index=False)["total_ms"].sum()
+        fig = px.bar(by_collection, x="collection", y="total_ms", title="Tempo total no servidor por coleção (ms)")
+        st.plotly_chart(fig)
+        st.caption("Bytes por resposta são amostrados; o uso de índice vem de um explain por forma de consulta.")
+
+    # partida a frio e reruns do script, por página
+    st.subheader("Inicialização e reruns")
+    timings = get_run_timings()
+    first = timings.first_run
+    if first is not None:
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Primeira execução (ms)", f"{first['total_ms']:.0f}")
+        col2.metric("Importação da página (ms)", f"{first['import_ms']:.0f}")
+        col3.metric("Renderização (ms)", f"{first['render_ms']:.0f}")
+        st.caption(f"Partida a frio em \"{first['page']}\" (orçamento: {FIRST_RENDER_BUDGET_MS} ms).")
+        if first["total_ms"] > FIRST_RENDER_BUDGET_MS:
+            st.warning("A primeira execução passou do orçamento.")
+
+    df_runs = to_df(timings.summary())
+    if not df_runs.empty:
+        over = df_runs[df_runs["import_ms"] > IMPORT_BUDGET_MS]
+        if not over.empty:
+            st.warning(f"Importação acima de {IMPORT_BUDGET_MS} ms: {', '.join(over['page'])}.")
+        st.dataframe(df_runs)
+    st.caption("Importação por módulo, medida em processos novos: `python startup_report.py`.")
@@ -0,0 +1,101 @@
+"""History (Eventos): linha do tempo paginada e distribuição dos eventos."""
+
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+from dashboard_pages.data import get_db, get_query_cache, residence_options, user_options
+from dashboard_pages.widgets import paged_query, to_df
+from query_cache import make_key
+from rollups import OBJECT_STATS, RESIDENCE_STATS
+from timeline import search_objects, timeline_filter, timeline_page
+
+
+def render():
+    db = get_db()
+    cache = get_query_cache()
+
+    st.title("🔔 Histórico Inteligente do Ambiente")
+
+    # filtro usuário
+    user_by_name = user_options()
+
+    selected_user = st.selectbox("👤 Selecionar usuário", [""] + list(user_by_name))
+
+    if selected_user:
+        user_id = user_by_name[selected_user]
+
+        res_by_name = residence_options(user_id)
+
+        col_res, col_actions = st.columns(2)
+        selected_res = col_res.selectbox("🏠 Residência", ["Todas"] + list(res_by_name))
+        action_options = cache.get_or_load(
+            make_key("history", "distinct", "action_type"),
+            lambda: sorted(a for a in db.history.distinct("action_type") if a)
+        )
+        action_types = col_actions.multiselect("Tipo de evento", action_options)
+
+        residence_id = res_by_name.get(selected_res)
+        search_ids = [residence_id] if residence_id is not None else list(res_by_name.values())
+
+        # busca por prefixo do nome: só os objetos que casam, não a lista inteira
+        prefix = st.text_input("📦 Buscar objeto pelo nome (opcional)", placeholder="ex.: Sof")
+        object_id = None
+        if prefix:
+            found = cache.get_or_load(
+                make_key("objects", "search", search_ids, prefix),
+                lambda: search_objects(db, search_ids, prefix)
+            )
+            res_names = {v: k for k, v in res_by_name.items()}
+            # nomes se repetem: o rótulo inclui tipo, cor, residência e o fim do _id
+            labels = {
+                f"{o['name']} ({o.get('type')}, {o.get('color')}) — "
+                f"{res_names.get(o['residence_id'], '?')} · {str(o['_id'])[-6:]}": o["_id"]
+                for o in found
+            }
+            if labels:
+                choice = st.selectbox("Objeto", [""] + list(labels))
+                object_id = labels.get(choice)
+            else:
+                st.info("Nenhum objeto com esse nome.")
+
+        scope = {"user_id": user_id, "residence_id": residence_id, "object_id": object_id}
+        # no escopo de residência o filtro resolve os _id dos objetos: fica em cache junto com objects
+        query = cache.get_or_load(
+            make_key("objects", "timeline_filter", scope, action_types),
+            lambda: timeline_filter(db, action_types=action_types, **scope)
+        )
+        history = paged_query(
+            "timeline", db.history, query, "timestamp",
+            fetch=lambda after, page_size: timeline_page(db, after=after, page_size=page_size, query=query)
+        )
+        df_history = to_df(history)
+
+        if df_history.empty:
+            st.info("Nenhum histórico encontrado.")
+        else:
+            df_history["timestamp"] = pd.to_datetime(df_history["timestamp"])
+            columns = ["timestamp", "action_type", "object_name", "object_type", "residence", "notes"]
+            st.dataframe(df_history[[c for c in columns if c in df_history] +
+                                    [c for c in df_history.columns if c not in columns and c != "_id"]])
+
+            # distribuição lida dos resumos (objeto, residência ou residências do usuário)
+            if object_id is not None:
+                stats = cache.find(db[OBJECT_STATS], {"_id": object_id}, {"by_action": 1})
+                by_action = stats[0]["by_action"] if stats else {}
+            else:
+                stats_filter = {"_id": residence_id} if residence_id is not None else {"user_id": user_id}
+                by_action = {}
+                for doc in cache.find(db[RESIDENCE_STATS], stats_filter, {"history_by_action": 1}):
+                    for action, count in doc.get("history_by_action", {}).items():
+                        by_action[action] = by_action.get(action, 0) + count
+            if action_types:
+                by_action = {k: v for k, v in by_action.items() if k in action_types}
+            if by_action:
+                fig = px.bar(
+                    x=list(by_action),
+                    y=list(by_action.values()),
+                    labels={"x": "action_type", "y": "count"},
+                    title="Distribuição de eventos"
+                )
+                st.plotly_chart(fig)
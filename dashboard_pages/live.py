@@ -0,0 +1,48 @@
+"""Ao Vivo: métricas e documentos recentes do change stream, atualizados por fragmento."""
+
+import plotly.express as px
+import streamlit as st
+
+from dashboard_pages.data import get_live_feed
+from scan_store import scan_collection
+
+
+def render():
+    st.title("🔴 Monitoramento ao Vivo")
+
+    feed = get_live_feed()
+    scans = scan_collection()
+    interval = st.sidebar.slider("Atualizar a cada (s)", 1, 30, 3)
+
+    @st.fragment(run_every=interval)
+    def live_panel():
+        applied = feed.apply_pending()
+        events = feed.metrics["events"]
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Objetos (novos eventos)", events["objects"])
+        col2.metric("Scans (novos eventos)", events[scans])
+        col3.metric("Histórico (novos eventos)", events["history"])
+        col4.metric("Aplicados agora", applied)
+        st.caption(f"Modo: {feed.mode or 'iniciando'} | último evento: {feed.last_event_at or '-'}")
+        if feed.error is not None:
+            st.error(f"Assinatura interrompida: {feed.error}")
+
+        status = feed.metrics["object_status"]
+        actions = feed.metrics["action_types"]
+        col_a, col_b = st.columns(2)
+        if status:
+            col_a.plotly_chart(px.bar(x=list(status), y=list(status.values()), title="Objetos por status"))
+        if actions:
+            col_b.plotly_chart(px.bar(x=list(actions), y=list(actions.values()), title="Eventos por tipo"))
+
+        for name, label in [(scans, "📷 Scans recentes"), ("objects", "📦 Objetos recentes"), ("history", "🔔 Eventos recentes")]:
+            frame = feed.frame(name)
+            st.subheader(label)
+            if frame.empty:
+                st.info("Nenhum dado ainda.")
+            else:
+                # ObjectId e dicts aninhados exibidos como texto
+                st.dataframe(frame.tail(20).iloc[::-1].drop(columns="_id").astype(str))
+
+    live_panel()
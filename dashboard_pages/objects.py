@@ -0,0 +1,138 @@
+"""Objetos: filtros por facetas, tabela paginada, mapa 3D e busca por proximidade."""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+from bson import ObjectId
+
+from columnar import OBJECT_SCHEMA, frame_from_docs, select
+from dashboard_pages.data import (
+    OBJECT_TABLE_PROJECTION, get_db, get_query_cache, get_spatial_cache,
+    load_residence_view, residence_options, user_options,
+)
+from dashboard_pages.widgets import paged_query, point_budget, show_residence_stats
+from facets import DATE_FIELDS, SORT_FIELD, base_match, confidence_bands, object_facets, selection_match
+from lod import point_cloud
+from query_cache import make_key
+
+OBJECT_TABLE_COLUMNS = select(
+    OBJECT_SCHEMA, "name", "type", "color", "coordinates.x", "coordinates.y", "coordinates.z",
+    "first_seen", "last_seen", "status", "confidence"
+)
+
+
+def render():
+    db = get_db()
+    cache = get_query_cache()
+    budget = point_budget()
+
+    st.title("📦 Monitoramento de Objetos com Filtros Inteligentes")
+
+    # listas de opções com projeção: só _id e name de users/residences
+    user_by_name = user_options()
+    selected_user_name = st.selectbox("👤 Selecionar usuário", [""] + list(user_by_name))
+
+    if selected_user_name:
+        user_id = user_by_name[selected_user_name]
+        res_by_name = residence_options(user_id)
+        selected_res_name = st.selectbox("🏠 Residência", ["Todas"] + list(res_by_name))
+        residence_id = res_by_name.get(selected_res_name)
+        residence_ids = [residence_id] if residence_id is not None else list(res_by_name.values())
+
+        scan_id = None
+        if residence_id is not None:
+            view = load_residence_view(residence_id)
+            show_residence_stats(view["stats"])
+            scan_options = [str(x["_id"]) for x in view["scan_ids"]]
+            selected_scan_id = st.selectbox("📷 Scan", ["Todos"] + scan_options)
+            scan_id = ObjectId(selected_scan_id) if selected_scan_id != "Todos" else None
+
+        # opções das facetas vêm de distinct no escopo (índice residence_id)
+        scope = {"residence_id": {"$in": residence_ids}}
+        col_type, col_color, col_status, col_band = st.columns(4)
+        selections = {
+            "type": col_type.multiselect("Tipo", sorted(v for v in cache.distinct(db.objects, "type", scope) if v)),
+            "color": col_color.multiselect("Cor", sorted(v for v in cache.distinct(db.objects, "color", scope) if v)),
+            "status": col_status.multiselect("Status", sorted(v for v in cache.distinct(db.objects, "status", scope) if v)),
+        }
+        bands = col_band.multiselect("Confiança", [label for label, _, _ in confidence_bands()])
+
+        col_field, col_from, col_to = st.columns([1, 1, 1])
+        date_field = col_field.radio("Período por", DATE_FIELDS, horizontal=True)
+        date_from = col_from.date_input("De", value=None)
+        date_to = col_to.date_input("Até", value=None)
+        base = base_match(
+            residence_ids, scan_id, date_field,
+            datetime.combine(date_from, datetime.min.time()) if date_from else None,
+            # "Até" inclui o dia inteiro
+            datetime.combine(date_to, datetime.min.time()) + timedelta(days=1) if date_to else None,
+        )
+
+        # contagens das facetas ($facet) + página da tabela (busca por chave no índice de last_seen)
+        objects, counts = paged_query(
+            "objects_facets", db.objects, {"base": base, "selections": selections, "bands": bands}, SORT_FIELD,
+            fetch=lambda after, size: object_facets(
+                db.objects, base, selections, bands, after, size, OBJECT_TABLE_PROJECTION
+            )
+        )
+
+        st.caption(f"{counts['total']} objetos com os filtros atuais")
+        facet_cols = st.columns(4)
+        for col, (field, title) in zip(facet_cols, [
+            ("type", "Por tipo"), ("color", "Por cor"), ("status", "Por status"), ("confidence", "Por confiança"),
+        ]):
+            if counts[field]:
+                col.plotly_chart(px.bar(
+                    x=[str(k) for k in counts[field]], y=list(counts[field].values()),
+                    labels={"x": field, "y": "objetos"}, title=title
+                ))
+
+        df = frame_from_docs(objects, OBJECT_TABLE_COLUMNS)
+
+        if df.empty:
+            st.info("Nenhum objeto encontrado para este filtro.")
+        else:
+            st.subheader("📦 Objetos filtrados")
+            st.dataframe(df)
+
+            # mapa 3D de todos os objetos do filtro (não só da página), limitado ao orçamento de pontos
+            xyz = df[["coordinates.x", "coordinates.y", "coordinates.z"]].to_numpy()
+            if np.isnan(xyz).any():
+                st.warning("Alguns objetos não possuem coordenadas completas.")
+            match = {**base, **selection_match(selections, bands)}
+            cloud, voxel = cache.get_or_load(
+                make_key("objects", "point_cloud", match, budget),
+                lambda: point_cloud(db.objects, match, budget)
+            )
+            if voxel is None:
+                title = "Mapa 3D dos Objetos Filtrados"
+            else:
+                title = f"Mapa 3D dos Objetos Filtrados (voxels de {voxel:.2f} m; tamanho = objetos)"
+            # scatter_3d já desenha em WebGL
+            fig = px.scatter_3d(
+                cloud, x="x", y="y", z="z", color="type", hover_name="name",
+                size="count" if voxel is not None else None, hover_data=["count"], title=title
+            )
+            st.plotly_chart(fig)
+
+        if residence_id is not None:
+            # busca por proximidade sobre o índice espacial da residência
+            with st.expander("📍 Objetos próximos de um ponto"):
+                index = get_spatial_cache().get(residence_id)
+                c1, c2, c3, c4 = st.columns(4)
+                qx = c1.number_input("x", value=2.0, step=0.1)
+                qy = c2.number_input("y", value=2.0, step=0.1)
+                qz = c3.number_input("z", value=0.5, step=0.1)
+                radius = c4.number_input("raio (m)", value=1.0, min_value=0.1, step=0.1)
+
+                idx, dist = index.within_radius((qx, qy, qz), radius)
+                if len(idx):
+                    st.dataframe(pd.DataFrame(index.records(idx, dist)).drop(columns="_id"))
+                else:
+                    st.info(f"Nenhum objeto ativo a até {radius:.1f} m.")
+                near, near_dist = index.nearest((qx, qy, qz))
+                if len(near):
+                    st.caption(f"Obstáculo mais próximo: {index.extra['name'][near[0]]} a {near_dist[0]:.2f} m")
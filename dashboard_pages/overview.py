@@ -0,0 +1,45 @@
+"""Visão Geral: contagens do sistema e objetos mais recentes."""
+
+import streamlit as st
+
+from columnar import OBJECT_SCHEMA, frame_from_docs, select
+from dashboard_pages.data import (
+    RECENT_OBJECTS_LIMIT, RECENT_OBJECTS_PROJECTION, get_query_cache, run_async,
+)
+from query_cache import make_key
+
+# colunas tipadas (categóricos, datetime64) da tabela de objetos recentes
+RECENT_OBJECTS_COLUMNS = select(
+    OBJECT_SCHEMA, "name", "type", "color", "status", "confidence", "first_seen", "last_seen"
+)
+
+
+def render():
+    st.title("📊 Monitoramento Geral do Sistema")
+
+    limit = st.session_state.get("recent_objects_limit", RECENT_OBJECTS_LIMIT)
+
+    # as seis contagens e os objetos recentes saem juntos (um round trip de parede);
+    # contagens sem filtro vêm dos metadados, a de ativos do índice status_1 e o
+    # $sort + $limit percorre o índice last_seen_1 de trás para frente
+    overview = get_query_cache().get_or_load(
+        make_key("objects", "overview", limit),
+        lambda: run_async("overview", limit, RECENT_OBJECTS_PROJECTION)
+    )
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Usuários", overview["users"])
+    col2.metric("Residências", overview["residences"])
+    col3.metric("Objetos Detectados", overview["objects"])
+    col4.metric("Total de Scans", overview["scans"])
+
+    col5, col6 = st.columns(2)
+    col5.metric("Objetos Ativos", overview["active_objects"])
+    col6.metric("Eventos no Histórico", overview["history"])
+
+    st.subheader("📍 Objetos mais recentes")
+    st.slider("Quantidade de objetos", 10, 500, RECENT_OBJECTS_LIMIT, step=10, key="recent_objects_limit")
+
+    df_objects = frame_from_docs(overview["recent"], RECENT_OBJECTS_COLUMNS)
+    if not df_objects.empty:
+        st.dataframe(df_objects)
@@ -0,0 +1,69 @@
+"""Scans: tabela paginada e série por hora com orçamento de pontos."""
+
+import plotly.express as px
+import streamlit as st
+
+from columnar import SCAN_SCHEMA, frame_from_docs, select
+from dashboard_pages.data import (
+    SCAN_TABLE_PROJECTION, get_db, load_residence_view, residence_options, user_options,
+)
+from dashboard_pages.widgets import paged_query, point_budget, show_residence_stats, to_df
+from lod import lttb_frame
+from scan_store import scan_collection, scan_page
+
+SCAN_TABLE_COLUMNS = select(
+    SCAN_SCHEMA, "timestamp", "objects_detected_count",
+    "camera_meta.device", "camera_meta.fov", "camera_meta.position.x", "camera_meta.position.y", "camera_meta.position.z"
+)
+
+
+def render():
+    db = get_db()
+    budget = point_budget()
+
+    st.title("📷 Histórico de Scans com Filtros Inteligentes")
+
+    user_by_name = user_options()
+
+    selected_user = st.selectbox("👤 Selecionar usuário", [""] + list(user_by_name))
+
+    if selected_user:
+        user_id = user_by_name[selected_user]
+
+        res_by_name = residence_options(user_id)
+
+        selected_res = st.selectbox("🏠 Selecionar residência", [""] + list(res_by_name))
+
+        if selected_res:
+            residence_id = res_by_name[selected_res]
+            # faixas de horas no servidor ($bucketAuto) ou série completa reduzida por LTTB
+            reduction = st.radio("Redução da série", ["Faixas no servidor", "LTTB"], horizontal=True)
+            server_side = reduction == "Faixas no servidor"
+            view = load_residence_view(residence_id, series=True, max_points=budget if server_side else None)
+            show_residence_stats(view["stats"])
+
+            # página já ordenada no servidor, no modo de armazenamento configurado
+            scans = paged_query(
+                "scans", db[scan_collection()], {"residence_id": residence_id}, "timestamp",
+                fetch=lambda after, size: scan_page(db, residence_id, after, size, SCAN_TABLE_PROJECTION)
+            )
+            df_scans = frame_from_docs(scans, SCAN_TABLE_COLUMNS)
+
+            if df_scans.empty:
+                st.info("Nenhum scan encontrado.")
+            else:
+                st.dataframe(df_scans)
+
+                # série por hora agregada no servidor (no modo buckets, lida dos totais de cada hora)
+                series = to_df(view["series"])
+                if not server_side:
+                    series = lttb_frame(series, "hour", ["objects_avg", "objects_max", "scans"], budget)
+                fig = px.line(
+                    series,
+                    x="hour",
+                    y=["objects_avg", "objects_max"],
+                    title="Objetos Detectados por Hora (média e máximo)",
+                    render_mode="webgl"
+                )
+                st.plotly_chart(fig)
+                st.plotly_chart(px.bar(series, x="hour", y="scans", title="Scans por Hora"))
@@ -0,0 +1,58 @@
+"""
+Tempos de execução do script do dashboard
+
+Cada execução registra o tempo total, o de importação do módulo da página
+(só na primeira vez que ela é aberta no processo) e o do `render()`. A
+primeira execução do processo é a partida a frio; as demais são reruns.
+
+Os orçamentos abaixo valem para a página de diagnóstico e para
+`python startup_report.py` (que sai com erro quando algum é estourado).
+"""
+
+import threading
+from collections import deque
+
+MAX_SAMPLES = 200
+# orçamentos (ms): importação de uma página a frio e primeira renderização do app
+IMPORT_BUDGET_MS = 1500
+FIRST_RENDER_BUDGET_MS = 3000
+
+
+def _pick(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class RunTimings:
+    """Tempos por página, compartilhados pelas sessões do servidor."""
+
+    def __init__(self):
+        self.first_run = None  # {"page", "total_ms", "import_ms", "render_ms"}
+        self.page_imports = {}
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def record(self, page, total_ms, import_ms, render_ms):
+        with self._lock:
+            if self.first_run is None:
+                self.first_run = {"page": page, "total_ms": total_ms, "import_ms": import_ms, "render_ms": render_ms}
+            if import_ms:
+                self.page_imports[page] = import_ms
+            self._runs.setdefault(page, deque(maxlen=MAX_SAMPLES)).append(total_ms)
+
+    def summary(self):
+        """Uma linha por página: importação e tempo das execuções (ms)."""
+        with self._lock:
+            runs = {page: list(samples) for page, samples in self._runs.items()}
+            imports = dict(self.page_imports)
+        return [
+            {
+                "page": page,
+                "import_ms": round(imports.get(page, 0.0), 1),
+                "runs": len(samples),
+                "p50_ms": round(_pick(samples, 0.50), 1),
+                "p95_ms": round(_pick(samples, 0.95), 1),
+                "last_ms": round(samples[-1], 1),
+            }
+            for page, samples in runs.items()
+        ]
@@ -0,0 +1,82 @@
+"""
+Componentes de tela usados por mais de uma página
+"""
+
+import streamlit as st
+from bson import json_util
+
+from dashboard_pages.data import get_query_cache
+from pagination import DEFAULT_PAGE_SIZE, PAGE_SIZES, keyset_aggregate, keyset_page
+from query_cache import make_key
+
+
+def to_df(data):
+    import pandas as pd
+    return pd.DataFrame(data) if data else pd.DataFrame()
+
+
+def point_budget():
+    """Teto de pontos enviados ao navegador por gráfico (séries reduzidas, nuvem 3D em voxels)."""
+    from lod import DEFAULT_POINT_BUDGET, POINT_BUDGETS
+    return st.sidebar.selectbox(
+        "Pontos por gráfico", POINT_BUDGETS, index=POINT_BUDGETS.index(DEFAULT_POINT_BUDGET), key="point_budget"
+    )
+
+
+def show_residence_stats(stats):
+    """Métricas da residência a partir do documento em residence_stats."""
+    if not stats:
+        st.caption("Resumo da residência indisponível (rode `python rollups.py`).")
+        return
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Objetos", stats.get("objects_total", 0))
+    col2.metric("Objetos ativos", stats.get("active_objects", 0))
+    col3.metric("Scans", stats.get("scans_total", 0))
+    col4.metric("Eventos", stats.get("history_total", 0))
+    if stats.get("last_scan_at"):
+        st.caption(f"Último scan: {stats['last_scan_at']:%d/%m/%Y %H:%M}")
+
+
+def paged_query(key, col, filter, sort_field, projection=None, direction=-1, pipeline=None, fetch=None):
+    """Página atual de uma consulta paginada por chave, com controles na tela.
+
+    Os cursores das páginas já visitadas ficam em st.session_state, então
+    avançar/voltar só busca a página pedida (com sort e projeção no servidor).
+    Com `pipeline`, a página vem de uma agregação e os estágios rodam só
+    sobre os documentos dela; `fetch(after, page_size)` substitui a busca
+    inteira (ex.: scan_store.scan_page) e deve devolver o mesmo que keyset_page.
+    Se `fetch` devolver um terceiro item (ex.: as contagens de facetas da
+    mesma agregação), o retorno passa a ser (documentos, item).
+    """
+    state_key = f"pager:{key}:{json_util.dumps(filter, sort_keys=True)}"
+    state = st.session_state.setdefault(state_key, {"cursors": [None], "size": DEFAULT_PAGE_SIZE})
+
+    col_size, col_prev, col_next, col_info = st.columns([2, 1, 1, 2])
+    page_size = col_size.selectbox(
+        "Linhas por página", PAGE_SIZES,
+        index=PAGE_SIZES.index(state["size"]), key=f"{state_key}:size"
+    )
+    if page_size != state["size"]:
+        state.update(cursors=[None], size=page_size)
+
+    after = state["cursors"][-1]
+    if fetch is not None:
+        load = lambda: fetch(after, page_size)
+    elif pipeline is not None:
+        load = lambda: keyset_aggregate(col, filter, sort_field, direction, after, page_size, pipeline)
+    else:
+        load = lambda: keyset_page(col, filter, sort_field, direction, after, page_size, projection)
+    docs, next_cursor, *extra = get_query_cache().get_or_load(
+        make_key(col.name, "page", key, filter, sort_field, direction, after, page_size, projection, pipeline),
+        load
+    )
+
+    col_info.caption(f"Página {len(state['cursors'])}")
+    if col_prev.button("⬅️ Anterior", key=f"{state_key}:prev", disabled=len(state["cursors"]) == 1):
+        state["cursors"].pop()
+        st.rerun()
+    if col_next.button("Próxima ➡️", key=f"{state_key}:next", disabled=next_cursor is None):
+        state["cursors"].append(next_cursor)
+        st.rerun()
+
+    return (list(docs), extra[0]) if extra else list(docs)
@@ -0,0 +1,255 @@
+"""
+Deduplicação espaço-temporal das detecções de um scan
+
+O vision_hash de uma detecção nova leva um sal aleatório, então ele sozinho
+só reconhece objetos que já chegam com o hash certo. Aqui cada detecção sem
+hash conhecido é comparada com os objetos ativos da mesma residência e herda
+o vision_hash de um deles quando:
+
+- type e color são iguais e o nome base é o mesmo (sem sufixos como
+  "#2", "(scan3)" ou "(renomeado)")
+- a distância entre as coordenadas é de até `radius` metros
+- o objeto foi visto a até `window` do horário do scan
+
+Cada residência tem um `ResidenceMatcher` em memória: arrays NumPy com
+posição, chave (nome base, type, color) e last_seen de cada objeto, e uma
+grade de células de lado `radius` (só as 27 células vizinhas podem ter
+candidatos). O índice é carregado uma vez por residência (`MatcherCache`) e
+atualizado a cada scan, sem reconsultar o banco. As distâncias das detecções
+de um scan são calculadas em lote, e cada objeto recebe no máximo uma
+detecção por scan (pares mais próximos primeiro).
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from itertools import product
+
+import numpy as np
+
+from columnar import OBJECT_SCHEMA, load_frame, select
+from spatial import coords_to_array
+
+DEFAULT_MATCH_RADIUS = 1.0  # metros
+DEFAULT_MATCH_WINDOW = timedelta(days=30)
+DEFAULT_CACHE_SIZE = 256
+INITIAL_CAPACITY = 64
+
+MATCH_COLUMNS = select(
+    OBJECT_SCHEMA, "vision_hash", "name", "type", "color",
+    "coordinates.x", "coordinates.y", "coordinates.z", "last_seen",
+)
+
+_SUFFIX = re.compile(r"\s*(\([^()]*\)|#\d+)\s*$")
+_NEIGHBORS = np.array(list(product((-1, 0, 1), repeat=3)), dtype=np.int64)
+_NO_TIME = np.iinfo(np.int64).min
+
+
+def name_key(name):
+    """Nome base para comparação: sem sufixos "#n"/"(...)", minúsculo."""
+    name = name or ""
+    while True:
+        stripped = _SUFFIX.sub("", name)
+        if stripped == name:
+            return name.strip().lower()
+        name = stripped
+
+
+def _ms(value):
+    return _NO_TIME if value is None else int(np.datetime64(value, "ms").astype(np.int64))
+
+
+class ResidenceMatcher:
+    """Objetos ativos de uma residência indexados por posição e chave."""
+
+    def __init__(self, radius=DEFAULT_MATCH_RADIUS, window=DEFAULT_MATCH_WINDOW):
+        self.radius = radius
+        self.window_ms = None if window is None else int(window / timedelta(milliseconds=1))
+        self.points = np.full((INITIAL_CAPACITY, 3), np.nan)
+        self.keys = np.full(INITIAL_CAPACITY, -1, dtype=np.int64)
+        self.last_seen = np.full(INITIAL_CAPACITY, _NO_TIME, dtype=np.int64)
+        self.active = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        self.hashes = []
+        self._row_of = {}    # vision_hash -> linha
+        self._codes = {}     # (nome base, type, color) -> código
+        self._fields = []    # (name, type, color) de cada linha
+        self._cells = {}     # célula -> linhas
+        self._cell_of = {}   # linha -> célula
+
+    def __len__(self):
+        return int(self.active[:len(self.hashes)].sum())
+
+    def _key(self, name, type, color, create=False):
+        key = (name_key(name), type, color)
+        if create:
+            return self._codes.setdefault(key, len(self._codes))
+        return self._codes.get(key, -1)
+
+    def _cell(self, point):
+        if np.isnan(point).any():
+            return None
+        return tuple(np.floor(point / self.radius).astype(np.int64).tolist())
+
+    def _grow(self):
+        size = len(self.points) * 2
+        self.points = np.concatenate([self.points, np.full((size - len(self.points), 3), np.nan)])
+        self.keys = np.concatenate([self.keys, np.full(size - len(self.keys), -1, dtype=np.int64)])
+        self.last_seen = np.concatenate([self.last_seen, np.full(size - len(self.last_seen), _NO_TIME, dtype=np.int64)])
+        self.active = np.concatenate([self.active, np.zeros(size - len(self.active), dtype=bool)])
+
+    def _place(self, row, cell):
+        old = self._cell_of.pop(row, None)
+        if old is not None:
+            self._cells[old].discard(row)
+            if not self._cells[old]:
+                del self._cells[old]
+        if cell is not None:
+            self._cells.setdefault(cell, set()).add(row)
+            self._cell_of[row] = cell
+
+    def upsert(self, doc):
+        """Insere ou atualiza o objeto `doc` (vision_hash + campos alterados).
+
+        Campos ausentes em `doc` mantêm o valor anterior; status diferente de
+        "ativo" (ex.: "removido") tira o objeto das comparações.
+        """
+        vision_hash = doc["vision_hash"]
+        row = self._row_of.get(vision_hash)
+        if row is None:
+            row = len(self.hashes)
+            if row == len(self.points):
+                self._grow()
+            self.hashes.append(vision_hash)
+            self._fields.append((None, None, None))
+            self._row_of[vision_hash] = row
+            self.active[row] = True
+        name, type, color = self._fields[row]
+        name, type, color = doc.get("name", name), doc.get("type", type), doc.get("color", color)
+        self._fields[row] = (name, type, color)
+        self.keys[row] = self._key(name, type, color, create=True)
+        if "coordinates" in doc:
+            self.points[row] = coords_to_array([doc["coordinates"]])[0]
+            self._place(row, self._cell(self.points[row]))
+        if doc.get("last_seen") is not None:
+            self.last_seen[row] = _ms(doc["last_seen"])
+        if "status" in doc:
+            self.active[row] = doc["status"] == "ativo"
+        if not self.active[row]:
+            self._place(row, None)
+
+    def match(self, detections, when=None, keep=()):
+        """vision_hash do objeto correspondente a cada detecção (None: objeto novo).
+
+        Uma detecção cujo vision_hash já está no índice, ou em `keep` (hashes
+        já gravados no banco), fica com ele e reserva o objeto; as demais são
+        comparadas em lote com os objetos ativos próximos ainda não reservados.
+        """
+        result = [None] * len(detections)
+        claimed = set()
+        pending = []
+        for i, det in enumerate(detections):
+            vision_hash = det.get("vision_hash")
+            row = self._row_of.get(vision_hash)
+            # o mesmo hash repetido no scan continua sendo o mesmo objeto
+            if vision_hash in keep or (row is not None and self.active[row]):
+                result[i] = vision_hash
+                if row is not None:
+                    claimed.add(row)
+            else:
+                pending.append(i)
+        if not pending or not self._cells:
+            return result
+
+        points = coords_to_array([detections[i].get("coordinates") for i in pending])
+        keys = np.array([self._key(detections[i].get("name"), detections[i].get("type"),
+                                   detections[i].get("color")) for i in pending], dtype=np.int64)
+        cells = np.floor(points / self.radius)
+
+        # pares (detecção, objeto) candidatos das 27 células vizinhas de cada detecção
+        pair_det, pair_row = [], []
+        for j in range(len(pending)):
+            if keys[j] < 0 or np.isnan(cells[j]).any():
+                continue
+            for cell in (cells[j].astype(np.int64) + _NEIGHBORS).tolist():
+                rows = self._cells.get(tuple(cell))
+                if rows:
+                    pair_row.extend(rows)
+                    pair_det.extend([j] * len(rows))
+        if not pair_row:
+            return result
+
+        pair_det = np.array(pair_det, dtype=np.int64)
+        pair_row = np.array(pair_row, dtype=np.int64)
+        dist = np.linalg.norm(self.points[pair_row] - points[pair_det], axis=1)
+        ok = (self.keys[pair_row] == keys[pair_det]) & (dist <= self.radius) & self.active[pair_row]
+        if self.window_ms is not None and when is not None:
+            seen = self.last_seen[pair_row]
+            ok &= (seen == _NO_TIME) | (np.abs(seen - _ms(when)) <= self.window_ms)
+        pair_det, pair_row, dist = pair_det[ok], pair_row[ok], dist[ok]
+
+        # atribuição gulosa: pares mais próximos primeiro, um objeto por detecção e vice-versa
+        taken = set()
+        for k in np.argsort(dist, kind="stable"):
+            j, row = int(pair_det[k]), int(pair_row[k])
+            if j in taken or row in claimed:
+                continue
+            taken.add(j)
+            claimed.add(row)
+            result[pending[j]] = self.hashes[row]
+        return result
+
+
+def load_matcher(db, residence_id, radius=DEFAULT_MATCH_RADIUS, window=DEFAULT_MATCH_WINDOW):
+    """Índice dos objetos ativos da residência, lido uma vez do banco."""
+    df = load_frame(db.objects, {"residence_id": residence_id, "status": "ativo"}, MATCH_COLUMNS)
+    matcher = ResidenceMatcher(radius, window)
+    points = df[["coordinates.x", "coordinates.y", "coordinates.z"]].to_numpy()
+    last_seen = df["last_seen"].to_numpy()
+    # categóricos ausentes viriam como NaN
+    fields = [df[f].astype(object).where(df[f].notna(), None) for f in ("vision_hash", "name", "type", "color")]
+    for i, (vision_hash, name, type, color) in enumerate(zip(*fields)):
+        matcher.upsert({
+            "vision_hash": vision_hash,
+            "name": name, "type": type, "color": color,
+            "coordinates": dict(zip(("x", "y", "z"), points[i].tolist())),
+            "last_seen": None if np.isnat(last_seen[i]) else last_seen[i],
+        })
+    return matcher
+
+
+class MatcherCache:
+    """Um ResidenceMatcher por residência (LRU), carregado no primeiro uso.
+
+    Sem TTL: o índice acompanha os scans gravados por este processo. Escritas
+    de outros processos só aparecem depois de `invalidate`.
+    """
+
+    def __init__(self, db, max_entries=DEFAULT_CACHE_SIZE, radius=DEFAULT_MATCH_RADIUS, window=DEFAULT_MATCH_WINDOW):
+        self.db = db
+        self.max_entries = max_entries
+        self.radius = radius
+        self.window = window
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, residence_id):
+        with self._lock:
+            matcher = self._entries.get(residence_id)
+            if matcher is not None:
+                self._entries.move_to_end(residence_id)
+                return matcher
+        matcher = load_matcher(self.db, residence_id, self.radius, self.window)
+        with self._lock:
+            matcher = self._entries.setdefault(residence_id, matcher)
+            self._entries.move_to_end(residence_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return matcher
+
+    def invalidate(self, residence_id=None):
+        with self._lock:
+            if residence_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(residence_id, None)
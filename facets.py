@@ -0,0 +1,122 @@
+"""
+Filtros facetados da página Objetos
+
+Cada página da tabela faz duas consultas:
+- uma agregação com $facet: contagens por type, color, status e faixa de
+  confidence, e o total de objetos com todos os filtros
+- a página da tabela, uma busca própria com paginação por chave em
+  last_seen (pagination.keyset_page), fora do $facet
+
+O $match inicial (residências + intervalo de datas) usa o índice
+residence_id_1_last_seen_-1 ou, com o período por first_seen,
+residence_id_1_first_seen_-1; os filtros de faceta rodam dentro do $facet,
+sobre o conjunto já reduzido. Cada faceta aplica os filtros das outras, mas
+não o seu próprio (ex.: com type=móvel marcado, a contagem de type continua
+mostrando os outros tipos), para o usuário ver o que mais pode escolher.
+
+A página da tabela usa o mesmo índice em last_seen: o servidor lê só os
+documentos da página, sem ordenar o filtro inteiro em memória (dentro do
+$facet nenhum estágio usa índice). Com o período por first_seen, o
+intervalo sai do índice de first_seen e a ordenação por last_seen é feita
+em memória.
+"""
+
+from pagination import DEFAULT_PAGE_SIZE, keyset_page
+
+FACET_FIELDS = ("type", "color", "status")
+CONFIDENCE_FIELD = "confidence"
+CONFIDENCE_BOUNDARIES = [0.0, 0.5, 0.7, 0.85, 1.01]
+NO_CONFIDENCE = "sem confiança"
+DATE_FIELDS = ("last_seen", "first_seen")
+SORT_FIELD = "last_seen"
+
+
+def band_label(lo, hi):
+    return f"{lo:.2f}–{min(hi, 1.0):.2f}"
+
+
+def confidence_bands():
+    """(rótulo, início, fim) de cada faixa de confidence."""
+    bounds = CONFIDENCE_BOUNDARIES
+    return [(band_label(lo, hi), lo, hi) for lo, hi in zip(bounds, bounds[1:])]
+
+
+def base_match(residence_ids, scan_id=None, date_field=SORT_FIELD, date_from=None, date_to=None):
+    """Filtro do $match inicial, coberto pelo índice residence_id + data."""
+    match = {"residence_id": {"$in": list(residence_ids)}}
+    if scan_id is not None:
+        match["scan_id"] = scan_id
+    if date_field not in DATE_FIELDS:
+        raise ValueError(f"date_field deve ser um de {DATE_FIELDS}")
+    dates = {}
+    if date_from is not None:
+        dates["$gte"] = date_from
+    if date_to is not None:
+        dates["$lt"] = date_to
+    if dates:
+        match[date_field] = dates
+    return match
+
+
+def selection_match(selections, bands=None, skip=None):
+    """Filtro das facetas marcadas (exceto a faceta `skip`)."""
+    match = {}
+    for field in FACET_FIELDS:
+        values = selections.get(field)
+        if values and field != skip:
+            match[field] = {"$in": list(values)}
+    if bands and skip != CONFIDENCE_FIELD:
+        ranges = {label: (lo, hi) for label, lo, hi in confidence_bands()}
+        match["$or"] = [
+            {CONFIDENCE_FIELD: {"$gte": ranges[b][0], "$lt": ranges[b][1]}} for b in bands if b in ranges
+        ]
+    return match
+
+
+def facet_pipeline(base, selections, bands=None):
+    """Agregação das contagens (as facetas e o total); a página da tabela fica de fora."""
+    facets = {
+        field: [
+            {"$match": selection_match(selections, bands, skip=field)},
+            {"$group": {"_id": f"${field}", "n": {"$sum": 1}}},
+            {"$sort": {"n": -1}},
+        ]
+        for field in FACET_FIELDS
+    }
+    facets[CONFIDENCE_FIELD] = [
+        {"$match": selection_match(selections, bands, skip=CONFIDENCE_FIELD)},
+        {"$bucket": {
+            "groupBy": f"${CONFIDENCE_FIELD}",
+            "boundaries": CONFIDENCE_BOUNDARIES,
+            "default": NO_CONFIDENCE,
+            "output": {"n": {"$sum": 1}},
+        }},
+    ]
+    facets["total"] = [{"$match": selection_match(selections, bands)}, {"$count": "n"}]
+    return [{"$match": base}, {"$facet": facets}]
+
+
+def page_filter(base, selections, bands=None):
+    """Filtro da página da tabela: o $match inicial com as facetas marcadas."""
+    return {**base, **selection_match(selections, bands)}
+
+
+def _counts(rows):
+    return {row["_id"]: row["n"] for row in rows}
+
+
+def object_facets(col, base, selections, bands=None, after=None, page_size=DEFAULT_PAGE_SIZE, projection=None):
+    """Executa as contagens facetadas e busca a página da tabela.
+
+    Retorna (objetos_da_página, cursor_da_próxima_página, contagens), com as
+    contagens no formato {"type": {valor: n}, ..., "confidence": {faixa: n}, "total": n}.
+    """
+    result = next(col.aggregate(facet_pipeline(base, selections, bands)), None) or {}
+    docs, next_cursor = keyset_page(col, page_filter(base, selections, bands), SORT_FIELD, -1,
+                                    after, page_size, projection)
+    labels = {lo: label for label, lo, _ in confidence_bands()}
+    counts = {field: _counts(result.get(field, [])) for field in FACET_FIELDS}
+    counts[CONFIDENCE_FIELD] = {labels.get(k, k): n for k, n in _counts(result.get(CONFIDENCE_FIELD, [])).items()}
+    total = result.get("total", [])
+    counts["total"] = total[0]["n"] if total else 0
+    return docs, next_cursor, counts
@@ -0,0 +1,251 @@
+"""
+Histórico esparso, compactação e arquivamento
+
+Eventos de history guardam só os campos preenchidos (`history_event`): um
+`moved` leva old/new_coordinates, um `renamed` leva old/new_name, e assim por
+diante, sem os seis campos old_/new_ nulos.
+
+A compactação percorre os objetos em lotes de `_id` e, para os eventos mais
+antigos que a janela de retenção:
+
+1. copia os eventos para `history_archive` (mesmo _id; cópias repetidas são ignoradas)
+2. acumula contagens por action_type, primeiro/último evento e os últimos
+   valores de posição/nome/cor em `history_summaries` (um documento por objeto)
+3. remove os eventos de `history`, mantendo o índice object_id_1_timestamp_-1 pequeno
+
+Ao final, `rebuild_stats` refaz object_stats e residence_stats a partir de
+history + history_summaries, para os resumos refletirem o que foi compactado.
+
+O progresso (corte e último objeto processado) fica em `history_compaction`:
+uma execução interrompida continua do lote seguinte com o mesmo corte. Cada
+resumo guarda até onde já foi compactado (`compacted_until`), então refazer um
+lote não conta eventos duas vezes. O arquivo pode ainda ser exportado para
+arquivos .bson.gz por mês (`export_archive`).
+
+Uso:
+    python history_archive.py --days 90             # compacta/arquiva eventos com mais de 90 dias
+    python history_archive.py --restart --days 30   # descarta o progresso salvo e recomeça
+    python history_archive.py --export-dir .\\arquivo --before 2025-01-01
+"""
+
+import argparse
+import gzip
+import os
+from datetime import datetime, timedelta
+
+from bson import encode
+from pymongo import ASCENDING, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from common import DUPLICATE_KEY
+from rollups import HISTORY_SUMMARIES, UNKNOWN, rebuild_stats
+
+ARCHIVE = "history_archive"
+SUMMARIES = HISTORY_SUMMARIES
+STATE = "history_compaction"
+
+DEFAULT_RETENTION_DAYS = 90
+DEFAULT_BATCH_SIZE = 500
+
+# campos old_/new_ de cada evento; o último new_ vira o "último valor" no resumo
+CHANGE_FIELDS = ("coordinates", "color", "name")
+
+
+def history_event(object_id, action_type, performed_by, timestamp, notes="", _id=None, **changes):
+    """Documento de history só com os campos preenchidos.
+
+    `changes` são os pares old_*/new_* da ação (ex.: old_name="Sofá",
+    new_name="Sofá (renomeado)"); valores None são omitidos.
+    """
+    doc = {
+        "object_id": object_id,
+        "action_type": action_type,
+        "performed_by": performed_by,
+        "timestamp": timestamp,
+    }
+    if _id is not None:
+        doc = {"_id": _id, **doc}
+    if notes:
+        doc["notes"] = notes
+    doc.update((k, v) for k, v in changes.items() if v is not None)
+    return doc
+
+
+def strip_nulls_update():
+    """Pipeline de update que remove os campos nulos de eventos antigos (formato denso)."""
+    return [{"$replaceWith": {"$arrayToObject": {"$filter": {
+        "input": {"$objectToArray": "$$ROOT"},
+        "cond": {"$ne": ["$$this.v", None]},
+    }}}}]
+
+
+def summary_update(object_id, residence_id, events, cutoff):
+    """Operação que acumula `events` (já ordenados por timestamp) no resumo do objeto."""
+    inc = {"events_total": len(events)}
+    for event in events:
+        key = f"by_action.{event.get('action_type') or UNKNOWN}"
+        inc[key] = inc.get(key, 0) + 1
+    last_values = {}
+    for event in events:
+        for field in CHANGE_FIELDS:
+            if event.get(f"new_{field}") is not None:
+                last_values[f"last_{field}"] = event[f"new_{field}"]
+    # só chegam aqui eventos posteriores ao último corte resumido: os últimos valores avançam
+    return UpdateOne(
+        {"_id": object_id},
+        {
+            "$inc": inc,
+            "$min": {"first_event_at": events[0]["timestamp"]},
+            "$max": {"last_event_at": events[-1]["timestamp"], "compacted_until": cutoff},
+            "$set": {"residence_id": residence_id, **last_values},
+        },
+        upsert=True,
+    )
+
+
+def _archive(db, events):
+    if not events:
+        return 0
+    try:
+        return db[ARCHIVE].bulk_write([InsertOne(e) for e in events], ordered=False).inserted_count
+    except BulkWriteError as exc:
+        # cópia já feita por uma execução interrompida
+        if any(err.get("code") != DUPLICATE_KEY for err in exc.details.get("writeErrors", [])):
+            raise
+        return exc.details.get("nInserted", 0)
+
+
+def compact_batch(db, objects, cutoff):
+    """Arquiva e resume os eventos anteriores a `cutoff` de um lote de objetos.
+
+    `objects` são documentos com _id e residence_id. Retorna (arquivados, removidos).
+    """
+    ids = [o["_id"] for o in objects]
+    residence_of = {o["_id"]: o.get("residence_id") for o in objects}
+    old = {"object_id": {"$in": ids}, "timestamp": {"$lt": cutoff}}
+
+    events = list(db.history.find(old).sort([("object_id", ASCENDING), ("timestamp", ASCENDING)]))
+    archived = _archive(db, events)
+
+    done_until = {
+        s["_id"]: s.get("compacted_until")
+        for s in db[SUMMARIES].find({"_id": {"$in": ids}}, {"compacted_until": 1})
+    }
+    by_object = {}
+    for event in events:
+        # eventos já resumidos por uma execução anterior com o mesmo corte (ou outro maior)
+        until = done_until.get(event["object_id"])
+        if until is not None and event["timestamp"] < until:
+            continue
+        by_object.setdefault(event["object_id"], []).append(event)
+    ops = [summary_update(oid, residence_of.get(oid), evs, cutoff) for oid, evs in by_object.items()]
+    if ops:
+        db[SUMMARIES].bulk_write(ops, ordered=False)
+
+    removed = db.history.delete_many(old).deleted_count if events else 0
+    # os eventos que ficam no history perdem os campos nulos do formato antigo
+    dense = {"$or": [{f"{side}_{field}": {"$type": "null"}} for side in ("old", "new") for field in CHANGE_FIELDS]}
+    db.history.update_many({"object_id": {"$in": ids}, **dense}, strip_nulls_update())
+    return archived, removed
+
+
+def compact_history(db, retention_days=DEFAULT_RETENTION_DAYS, batch_size=DEFAULT_BATCH_SIZE,
+                    restart=False, now=None, verbose=True, update_stats=True):
+    """Compacta o histórico de todos os objetos em lotes, retomando o progresso salvo.
+
+    Com `update_stats`, reconstrói os resumos ao final se algum evento saiu de history.
+    """
+    state = None if restart else db[STATE].find_one({"_id": "history", "done": False})
+    if state is None:
+        state = {
+            "_id": "history",
+            "cutoff": (now or datetime.utcnow()) - timedelta(days=retention_days),
+            "last_object_id": None,
+            "archived": 0,
+            "removed": 0,
+            "started_at": datetime.utcnow(),
+            "done": False,
+        }
+        db[STATE].replace_one({"_id": "history"}, state, upsert=True)
+    elif verbose:
+        print(f"Retomando compactação (corte {state['cutoff']:%d/%m/%Y}) após {state['last_object_id']} ...")
+
+    cutoff = state["cutoff"]
+    while True:
+        query = {"_id": {"$gt": state["last_object_id"]}} if state["last_object_id"] else {}
+        objects = list(db.objects.find(query, {"residence_id": 1}).sort("_id", ASCENDING).limit(batch_size))
+        if not objects:
+            break
+        archived, removed = compact_batch(db, objects, cutoff)
+        state["last_object_id"] = objects[-1]["_id"]
+        state["archived"] += archived
+        state["removed"] += removed
+        db[STATE].update_one({"_id": "history"}, {
+            "$set": {"last_object_id": state["last_object_id"]},
+            "$inc": {"archived": archived, "removed": removed},
+        })
+        if verbose:
+            print(f"  até {state['last_object_id']}: {state['archived']} arquivados, {state['removed']} removidos")
+
+    if update_stats and state["removed"]:
+        if verbose:
+            print("Reconstruindo residence_stats/object_stats ...")
+        rebuild_stats(db)
+    db[STATE].update_one({"_id": "history"}, {"$set": {"done": True, "finished_at": datetime.utcnow()}})
+    return state
+
+
+def export_archive(db, out_dir, before):
+    """Grava os eventos arquivados anteriores a `before` em <ano-mês>_<before>.bson.gz e os remove do arquivo.
+
+    Os resumos em history_summaries continuam com as contagens. Um mês só é
+    removido depois de gravado por completo; repetir a exportação com o mesmo
+    `before` regrava os mesmos arquivos, sem duplicar eventos.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    months = db[ARCHIVE].aggregate([
+        {"$match": {"timestamp": {"$lt": before}}},
+        {"$group": {"_id": {"$dateToString": {"date": "$timestamp", "format": "%Y-%m"}}}},
+        {"$sort": {"_id": 1}},
+    ])
+    exported = {}
+    for month in [m["_id"] for m in months]:
+        start = datetime.strptime(month, "%Y-%m")
+        end = (start + timedelta(days=32)).replace(day=1)
+        query = {"timestamp": {"$gte": start, "$lt": min(end, before)}}
+        path = os.path.join(out_dir, f"{month}_{before:%Y%m%d}.bson.gz")
+        count = 0
+        with gzip.open(path, "wb") as f:
+            for doc in db[ARCHIVE].find(query).sort("timestamp", ASCENDING):
+                f.write(encode(doc))
+                count += 1
+        db[ARCHIVE].delete_many(query)
+        exported[month] = count
+    return exported
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Compacta e arquiva eventos antigos de history.")
+    parser.add_argument("--days", type=int, default=DEFAULT_RETENTION_DAYS, help="janela de retenção em dias")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="objetos por lote")
+    parser.add_argument("--restart", action="store_true", help="ignora o progresso salvo de uma execução interrompida")
+    parser.add_argument("--export-dir", default=None, help="exporta history_archive para .bson.gz neste diretório")
+    parser.add_argument("--before", default=None, help="com --export-dir, exporta só eventos antes desta data (AAAA-MM-DD)")
+    parser.add_argument("--no-stats", action="store_true", help="não reconstrói residence_stats/object_stats ao final")
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv("MONGODB_URI"))
+    db = client[os.getenv("MONGODB_DB")]
+    if args.export_dir:
+        before = datetime.strptime(args.before, "%Y-%m-%d") if args.before else datetime.utcnow()
+        for month, count in export_archive(db, args.export_dir, before).items():
+            print(f"{month}: {count} eventos exportados")
+    else:
+        state = compact_history(db, args.days, args.batch_size, restart=args.restart,
+                               update_stats=not args.no_stats)
+        print(f"Compactação concluída: {state['archived']} eventos arquivados, {state['removed']} removidos de history")
+        print("Rode `python rollups.py` se os resumos do dashboard precisarem ser reconstruídos.")
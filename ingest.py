@@ -0,0 +1,246 @@
+"""
+Ingestão de um scan com reconciliação dos objetos detectados em lote
+
+Para cada scan recebido:
+1. uma consulta $in resolve quais vision_hash já existem na residência
+2. o scan é gravado já com objects_detected_count final, sem update posterior
+3. um único bulk_write faz upsert de todos os objetos (novos entram com
+   $setOnInsert; existentes só atualizam last_seen/scan_id/coordinates/
+   confidence)
+
+São três round trips por scan (mais o $inc dos resumos), independentemente da
+quantidade de objetos, no lugar de insert_one + find_one + update_one por objeto.
+
+O scan vai para a coleção do modo de armazenamento configurado (SCAN_STORAGE,
+ver scan_store.py); no modo buckets ele entra no documento da hora com um upsert.
+
+Com um `matcher` (dedup.py), detecções cujo vision_hash não existe na
+residência herdam o hash de um objeto ativo próximo com o mesmo nome base, type
+e color (um $in a mais só quando alguma herda), e o índice em memória da
+residência é atualizado com o resultado do scan.
+"""
+
+from datetime import timedelta
+import random
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from common import DUPLICATE_KEY
+from rollups import UNKNOWN, apply_stat_ops, history_stat_ops, object_stat_ops, scan_stat_ops
+from scan_store import DOCUMENTS, insert_scan, storage_mode
+
+
+def _insert_scan(db, scan_doc, retries=5):
+    mode = storage_mode()
+    if mode != DOCUMENTS:
+        # scans_ts e scan_buckets não têm índice único em residence_id+timestamp
+        insert_scan(db, scan_doc, mode)
+        return
+    # índice único residence_id+timestamp: em colisão, desloca alguns segundos
+    for _ in range(retries):
+        try:
+            db.scans.insert_one(scan_doc)
+            return
+        except DuplicateKeyError:
+            scan_doc["timestamp"] = scan_doc["timestamp"] + timedelta(seconds=random.randint(1, 300))
+    db.scans.insert_one(scan_doc)
+
+
+def _find_existing(db, residence_id, hashes):
+    if not hashes:
+        return {}
+    return {
+        doc["vision_hash"]: doc
+        for doc in db.objects.find(
+            {"residence_id": residence_id, "vision_hash": {"$in": list(hashes)}},
+            {"vision_hash": 1, "status": 1, "name": 1, "type": 1, "color": 1},
+        )
+    }
+
+
+def unique_by_hash(original_hashes, detections):
+    """{vision_hash: detecção} do scan.
+
+    A mesma detecção repetida no scan (mesmo vision_hash de origem) conta uma
+    vez, e a última leitura vence. Duas detecções diferentes com o mesmo hash
+    depois da deduplicação são um erro: uma apagaria a outra.
+    """
+    by_hash, origin = {}, {}
+    for original, det in zip(original_hashes, detections):
+        vision_hash = det["vision_hash"]
+        if origin.setdefault(vision_hash, original) != original:
+            raise ValueError(
+                f"detecções {origin[vision_hash]!r} e {original!r} resolvidas para o mesmo objeto {vision_hash!r}"
+            )
+        by_hash[vision_hash] = det
+    return by_hash
+
+
+def ingest_scan(db, residence_id, scan_doc, detections, update_stats=True, matcher=None):
+    """Grava um scan e reconcilia suas detecções com os objetos da residência.
+
+    `detections` são dicts com name, type, color, coordinates, confidence e
+    vision_hash. `matcher` é o ResidenceMatcher da residência (opcional).
+    Retorna um dict com scan_id, object_ids e vision_hashes (na ordem das
+    detecções, já com os hashes herdados), inserted e updated.
+    """
+    scan_doc = dict(scan_doc, residence_id=residence_id)
+    scan_doc.setdefault("_id", ObjectId())
+    scan_id = scan_doc["_id"]
+    scan_time = scan_doc["timestamp"]
+
+    original_hashes = [det["vision_hash"] for det in detections]
+    existing = _find_existing(db, residence_id, set(original_hashes))
+
+    if matcher is not None:
+        # hash já gravado mantém a identidade e reserva o objeto antes das demais detecções
+        matched = matcher.match(detections, scan_time, keep=existing)
+        detections = [
+            dict(det, vision_hash=vision_hash) if vision_hash not in (None, det["vision_hash"]) else det
+            for det, vision_hash in zip(detections, matched)
+        ]
+        inherited = {
+            det["vision_hash"] for det, original in zip(detections, original_hashes) if det["vision_hash"] != original
+        } - set(existing)
+        existing.update(_find_existing(db, residence_id, inherited))
+
+    by_hash = unique_by_hash(original_hashes, detections)
+
+    # o scan entra já com a contagem final, antes dos objetos que apontam para ele
+    scan_doc["objects_detected_count"] = len(by_hash)
+    _insert_scan(db, scan_doc)
+
+    planned = []  # (vision_hash, campos $set), na mesma ordem das operações
+    ops = []
+    new_objects = []
+    ids_by_hash = {}
+    for vision_hash, det in by_hash.items():
+        seen = {
+            "last_seen": scan_time,
+            "scan_id": scan_id,
+            "coordinates": det["coordinates"],
+            "confidence": det.get("confidence"),
+        }
+        update = {"$set": seen}
+        if vision_hash in existing:
+            ids_by_hash[vision_hash] = existing[vision_hash]["_id"]
+        else:
+            ids_by_hash[vision_hash] = ObjectId()
+            on_insert = {
+                "_id": ids_by_hash[vision_hash],
+                "name": det.get("name"),
+                "type": det.get("type"),
+                "color": det.get("color"),
+                "first_seen": scan_time,
+                "status": det.get("status", "ativo"),
+            }
+            update["$setOnInsert"] = on_insert
+            new_objects.append(dict(on_insert, residence_id=residence_id))
+        planned.append((vision_hash, seen))
+        # upsert pela chave única: concorrência entre scanners não duplica objetos
+        ops.append(UpdateOne({"vision_hash": vision_hash, "residence_id": residence_id}, update, upsert=True))
+
+    inserted = updated = 0
+    if ops:
+        try:
+            result = db.objects.bulk_write(ops, ordered=False)
+            inserted, updated = result.upserted_count, result.matched_count
+        except BulkWriteError as exc:
+            # outro scanner inseriu o mesmo objeto entre o $in e o bulk_write:
+            # refaz só essas operações como update simples
+            raced = []
+            for err in exc.details.get("writeErrors", []):
+                if err.get("code") != DUPLICATE_KEY:
+                    raise
+                raced.append(planned[err["index"]])
+            inserted = exc.details.get("nUpserted", 0)
+            updated = exc.details.get("nMatched", 0)
+            if raced:
+                retry = [
+                    UpdateOne({"vision_hash": vision_hash, "residence_id": residence_id}, {"$set": seen})
+                    for vision_hash, seen in raced
+                ]
+                updated += db.objects.bulk_write(retry, ordered=False).matched_count
+                # os _id pré-atribuídos a esses objetos não foram usados
+                raced_hashes = [vision_hash for vision_hash, _ in raced]
+                for doc in db.objects.find(
+                    {"residence_id": residence_id, "vision_hash": {"$in": raced_hashes}}, {"vision_hash": 1}
+                ):
+                    ids_by_hash[doc["vision_hash"]] = doc["_id"]
+                new_objects = [o for o in new_objects if o["_id"] in set(ids_by_hash.values())]
+
+    if matcher is not None:
+        for vision_hash, det in by_hash.items():
+            # objeto existente mantém nome/type/color/status gravados; novo entra com os da detecção
+            source = existing.get(vision_hash, det)
+            matcher.upsert({
+                "vision_hash": vision_hash,
+                "name": source.get("name"),
+                "type": source.get("type"),
+                "color": source.get("color"),
+                "status": source.get("status", "ativo"),
+                "coordinates": det["coordinates"],
+                "last_seen": scan_time,
+            })
+
+    if update_stats:
+        stat_ops = scan_stat_ops(scan_doc)
+        for obj in new_objects:
+            stat_ops += object_stat_ops(obj)
+        apply_stat_ops(db, stat_ops)
+
+    return {
+        "scan_id": scan_id,
+        "object_ids": [ids_by_hash[det["vision_hash"]] for det in detections],
+        "vision_hashes": [det["vision_hash"] for det in detections],
+        "inserted": inserted,
+        "updated": updated,
+    }
+
+
+def record_object_events(db, residence_id, events, object_updates, update_stats=True):
+    """Grava eventos de history e os $set que eles causam nos objetos.
+
+    `events` são documentos de history (com object_id); `object_updates` é
+    {object_id: campos alterados}. O status anterior dos objetos cujo status
+    muda é lido antes da escrita (um $in, só quando há mudança de status),
+    para os resumos moverem a contagem de um status para o outro.
+    Retorna a quantidade de eventos gravados.
+    """
+    changed = [obj_id for obj_id, fields in object_updates.items() if "status" in fields]
+    old_status = {}
+    if update_stats and changed:
+        old_status = {
+            doc["_id"]: doc.get("status")
+            for doc in db.objects.find({"_id": {"$in": changed}}, {"status": 1})
+        }
+
+    if object_updates:
+        db.objects.bulk_write(
+            [UpdateOne({"_id": obj_id}, {"$set": fields}) for obj_id, fields in object_updates.items()],
+            ordered=False
+        )
+
+    inserted = list(events)
+    if events:
+        try:
+            db.history.insert_many(events, ordered=False)
+        except BulkWriteError as exc:
+            # só os eventos gravados entram nos resumos
+            failed = {err["index"] for err in exc.details.get("writeErrors", [])}
+            inserted = [event for i, event in enumerate(events) if i not in failed]
+
+    if update_stats:
+        stat_ops = []
+        for event in inserted:
+            stat_ops += history_stat_ops(event, residence_id)
+        for obj_id in changed:
+            if obj_id in old_status:
+                stat_ops += object_stat_ops(
+                    {"residence_id": residence_id, "status": object_updates[obj_id]["status"]},
+                    old_status=old_status[obj_id] or UNKNOWN,
+                )
+        apply_stat_ops(db, stat_ops)
+    return len(inserted)
@@ -0,0 +1,379 @@
+"""
+Instrumentação das consultas via CommandListener do PyMongo
+
+Cada comando (find, aggregate, count, insert, update, ...) é agrupado por
+"forma" — comando + coleção + campos do filtro/ordenação, sem os valores — e
+registra latência, documentos retornados e, por amostragem, bytes da resposta
+e se o plano usou índice (explain em uma thread separada, nunca dentro do
+callback do driver).
+
+Uma consulta que devolve um cursor com vários lotes conta como uma execução
+da forma que a abriu: cada getMore soma seus documentos e sua duração à
+consulta de origem, que só é registrada quando o cursor chega ao id 0 (ou é
+fechado com killCursors).
+
+Uso:
+    profiler = QueryProfiler()
+    client = MongoClient(uri, event_listeners=[profiler])
+    profiler.attach(client)       # habilita o explain amostrado
+    ...
+    print(profiler.format_table())
+"""
+
+import queue
+import random
+import threading
+from collections import deque
+
+from bson import encode
+from pymongo import monitoring
+
+# comandos de leitura que aceitam explain
+EXPLAINABLE = {"find", "aggregate", "count", "distinct"}
+# campos copiados do comando original para o explain; o resto (apiVersion,
+# apiStrict, readConcern, txnNumber, lsid, $db, ...) faria o servidor recusá-lo
+EXPLAIN_FIELDS = {
+    "find", "filter", "sort", "projection", "limit", "hint",
+    "aggregate", "pipeline", "count", "query", "distinct", "key", "collation",
+}
+# comandos internos/administrativos que não interessam ao perfil
+IGNORED = {
+    "ping", "hello", "ismaster", "isMaster", "buildInfo", "saslStart", "saslContinue",
+    "endSessions", "explain", "listCollections", "listIndexes",
+}
+
+DEFAULT_SAMPLE_RATE = 0.05
+MAX_SAMPLES_PER_SHAPE = 2000
+
+
+def _shape_of(value):
+    # substitui valores por "?" mantendo a estrutura (nomes de campos e operadores)
+    if isinstance(value, dict):
+        return {k: _shape_of(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(v, dict) for v in value):
+            return [_shape_of(v) for v in value]
+        return "?"
+    return "?"
+
+
+def _pipeline_shape(pipeline):
+    parts = []
+    for stage in pipeline:
+        name = next(iter(stage), "?")
+        if name == "$match":
+            parts.append(f"$match{_shape_of(stage[name])}")
+        elif name == "$sort":
+            parts.append(f"$sort{dict(stage[name])}")
+        else:
+            parts.append(name)
+    return " | ".join(parts)
+
+
+def command_shape(command_name, command):
+    collection = command.get(command_name)
+    if not isinstance(collection, str):
+        collection = "-"
+    if command_name == "find":
+        detail = f"filter={_shape_of(command.get('filter', {}))}"
+        if command.get("sort"):
+            detail += f" sort={dict(command['sort'])}"
+    elif command_name == "aggregate":
+        detail = _pipeline_shape(command.get("pipeline", []))
+    elif command_name in ("count", "distinct"):
+        detail = f"query={_shape_of(command.get('query', {}))}"
+    elif command_name in ("update", "delete"):
+        ops = command.get("updates") or command.get("deletes") or []
+        detail = f"q={_shape_of(ops[0].get('q', {}))}" if ops else ""
+    else:
+        detail = ""
+    return collection, f"{command_name} {collection} {detail}".strip()
+
+
+def _cursor_id(reply):
+    cursor = reply.get("cursor")
+    return cursor.get("id", 0) if cursor is not None else 0
+
+
+def _docs_returned(command_name, reply):
+    cursor = reply.get("cursor")
+    if cursor is not None:
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    if command_name in ("count", "insert", "delete"):
+        return reply.get("n", 0)
+    if command_name == "update":
+        return reply.get("nModified", reply.get("n", 0))
+    if command_name == "distinct":
+        return len(reply.get("values", []))
+    return 0
+
+
+INDEX_STAGES = {
+    "IXSCAN", "IDHACK", "COUNT_SCAN", "DISTINCT_SCAN", "EXPRESS_IXSCAN", "EXPRESS_CLUSTERED_IXSCAN",
+}
+
+
+def plan_stages(plan):
+    """Nomes dos estágios de um plano do explain, em profundidade."""
+    stages = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if "stage" in node:
+                stages.append(node["stage"])
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(plan)
+    return stages
+
+
+def plan_uses_index(plan):
+    """True se algum estágio do plano usa índice, False se só COLLSCAN, None se não dá para saber."""
+    stages = plan_stages(plan)
+    if INDEX_STAGES.intersection(stages):
+        return True
+    if "COLLSCAN" in stages:
+        return False
+    return None
+
+
+class ShapeStats:
+    def __init__(self, collection, shape):
+        self.collection = collection
+        self.shape = shape
+        self.count = 0
+        self.failures = 0
+        self.latencies = deque(maxlen=MAX_SAMPLES_PER_SHAPE)
+        self.docs = 0
+        self.bytes_sampled = 0
+        self.bytes_samples = 0
+        self.index_used = None
+
+    def export(self):
+        return {
+            "collection": self.collection, "shape": self.shape, "count": self.count,
+            "failures": self.failures, "latencies": list(self.latencies), "docs": self.docs,
+            "bytes_sampled": self.bytes_sampled, "bytes_samples": self.bytes_samples,
+            "index_used": self.index_used,
+        }
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class QueryProfiler(monitoring.CommandListener):
+    """Agrega latência/documentos/bytes/uso de índice por forma de consulta."""
+
+    def __init__(self, sample_rate=DEFAULT_SAMPLE_RATE, explain=True):
+        self.sample_rate = sample_rate
+        self.explain = explain
+        self.stats = {}
+        self._pending = {}
+        self._cursors = {}  # (conexão, id do cursor) -> execução ainda aberta
+        self._lock = threading.Lock()
+        self._client = None
+        self._explain_queue = queue.Queue(maxsize=100)
+        self._explained = set()
+        self._index_used = {}
+        self._rng = random.Random()
+
+    # --- registro --------------------------------------------------------------
+
+    def attach(self, client):
+        """Informa o client usado para o explain amostrado (thread própria)."""
+        self._client = client
+        if self.explain:
+            threading.Thread(target=self._explain_worker, name="profiler-explain", daemon=True).start()
+
+    def started(self, event):
+        if event.command_name in IGNORED:
+            return
+        if event.command_name == "getMore":
+            with self._lock:
+                self._pending[(event.connection_id, event.request_id)] = ("getMore", event.command["getMore"])
+            return
+        if event.command_name == "killCursors":
+            # cursor fechado antes do fim (ex.: limit no cliente): registra o que já foi lido
+            with self._lock:
+                for cursor_id in event.command.get("cursors", []):
+                    self._close_cursor((event.connection_id, cursor_id))
+            return
+        collection, shape = command_shape(event.command_name, event.command)
+        explain = self.explain and self._client is not None and event.command_name in EXPLAINABLE
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (collection, shape)
+            # uma vez por forma basta: o plano não muda com os valores na maioria dos casos
+            explain = explain and shape not in self._explained
+            if explain:
+                self._explained.add(shape)
+        if explain:
+            command = {k: v for k, v in event.command.items() if k in EXPLAIN_FIELDS}
+            try:
+                self._explain_queue.put_nowait((event.database_name, shape, command))
+            except queue.Full:
+                with self._lock:
+                    self._explained.discard(shape)
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def _stats(self, collection, shape):
+        stats = self.stats.get(shape)
+        if stats is None:
+            stats = self.stats[shape] = ShapeStats(collection, shape)
+            stats.index_used = self._index_used.get(shape)
+        return stats
+
+    def _sample_bytes(self, target, reply):
+        # target: ShapeStats ou a execução aberta de um cursor (dict)
+        if self._rng.random() < self.sample_rate:
+            if isinstance(target, dict):
+                target["bytes_sampled"] += len(encode(reply))
+                target["bytes_samples"] += 1
+            else:
+                target.bytes_sampled += len(encode(reply))
+                target.bytes_samples += 1
+
+    def _close_cursor(self, cursor_key, failed=False):
+        cursor = self._cursors.pop(cursor_key, None)
+        if cursor is None:
+            return
+        stats = self._stats(cursor["collection"], cursor["shape"])
+        stats.count += 1
+        stats.latencies.append(cursor["ms"])
+        stats.docs += cursor["docs"]
+        stats.bytes_sampled += cursor["bytes_sampled"]
+        stats.bytes_samples += cursor["bytes_samples"]
+        if failed:
+            stats.failures += 1
+
+    def _finish(self, event, failed):
+        duration_ms = event.duration_micros / 1000
+        with self._lock:
+            key = self._pending.pop((event.connection_id, event.request_id), None)
+            if key is None:
+                return
+            if key[0] == "getMore":
+                cursor_key = (event.connection_id, key[1])
+                cursor = self._cursors.get(cursor_key)
+                if cursor is None:
+                    return
+                cursor["ms"] += duration_ms
+                if failed:
+                    self._close_cursor(cursor_key, failed=True)
+                    return
+                cursor["docs"] += _docs_returned(event.command_name, event.reply)
+                self._sample_bytes(cursor, event.reply)
+                if _cursor_id(event.reply) == 0:
+                    self._close_cursor(cursor_key)
+                return
+
+            collection, shape = key
+            cursor_id = 0 if failed else _cursor_id(event.reply)
+            if cursor_id:
+                # mais lotes a caminho: a execução só é registrada no último getMore
+                cursor = self._cursors[(event.connection_id, cursor_id)] = {
+                    "collection": collection, "shape": shape, "ms": duration_ms,
+                    "docs": _docs_returned(event.command_name, event.reply),
+                    "bytes_sampled": 0, "bytes_samples": 0,
+                }
+                self._sample_bytes(cursor, event.reply)
+                return
+            stats = self._stats(collection, shape)
+            stats.count += 1
+            stats.latencies.append(duration_ms)
+            if failed:
+                stats.failures += 1
+                return
+            stats.docs += _docs_returned(event.command_name, event.reply)
+            self._sample_bytes(stats, event.reply)
+
+    def _explain_worker(self):
+        while True:
+            db_name, shape, command = self._explain_queue.get()
+            try:
+                result = self._client[db_name].command("explain", command, verbosity="queryPlanner")
+                used = plan_uses_index(result.get("queryPlanner", result))
+            except Exception:
+                used = None
+            with self._lock:
+                # se o profiler foi zerado no meio, descarta; a forma pode ainda não ter sido
+                # registrada (cursor aberto), então o resultado fica guardado para quando for
+                if shape in self._explained:
+                    self._index_used[shape] = used
+                    if shape in self.stats:
+                        self.stats[shape].index_used = used
+
+    # --- leitura ---------------------------------------------------------------
+
+    def export(self):
+        """Estado serializável (para juntar resultados de outros processos)."""
+        with self._lock:
+            return [s.export() for s in self.stats.values()]
+
+    def merge(self, exported):
+        with self._lock:
+            for item in exported:
+                stats = self.stats.get(item["shape"])
+                if stats is None:
+                    stats = self.stats[item["shape"]] = ShapeStats(item["collection"], item["shape"])
+                stats.count += item["count"]
+                stats.failures += item["failures"]
+                stats.latencies.extend(item["latencies"])
+                stats.docs += item["docs"]
+                stats.bytes_sampled += item["bytes_sampled"]
+                stats.bytes_samples += item["bytes_samples"]
+                if item["index_used"] is not None:
+                    stats.index_used = item["index_used"]
+
+    def summary(self):
+        """Uma linha por forma de consulta, da mais lenta (p95) para a mais rápida."""
+        with self._lock:
+            rows = []
+            for s in self.stats.values():
+                lat = list(s.latencies)
+                rows.append({
+                    "collection": s.collection,
+                    "shape": s.shape,
+                    "count": s.count,
+                    "failures": s.failures,
+                    "p50_ms": percentile(lat, 0.50),
+                    "p95_ms": percentile(lat, 0.95),
+                    "p99_ms": percentile(lat, 0.99),
+                    "total_ms": sum(lat),
+                    "docs_per_call": s.docs / s.count if s.count else 0,
+                    "avg_bytes": s.bytes_sampled / s.bytes_samples if s.bytes_samples else None,
+                    "index_used": s.index_used,
+                })
+        return sorted(rows, key=lambda r: r["p95_ms"] or 0, reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+            self._cursors.clear()
+            self._explained.clear()
+            self._index_used.clear()
+
+    def format_table(self, limit=20):
+        rows = self.summary()[:limit]
+        if not rows:
+            return "Nenhum comando registrado."
+        index_label = {True: "sim", False: "COLLSCAN", None: "-"}
+        lines = [f"{'qtd':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'docs':>8} {'índice':>9}  forma"]
+        for r in rows:
+            lines.append(
+                f"{r['count']:>7} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+                f"{r['docs_per_call']:>8.1f} {index_label[r['index_used']]:>9}  {r['shape'][:100]}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,329 @@
+"""
+Ingestão incremental para o modo "ao vivo" do dashboard
+
+Uma thread acompanha objects, a coleção de scans do SCAN_STORAGE (scans,
+scans_ts ou scan_buckets) e history por change stream (exige replica set;
+um nó só já serve). Os eventos vão para uma fila e `apply_pending()` aplica
+só esses deltas nos DataFrames e métricas em memória, então o custo de cada
+atualização é proporcional aos eventos novos e não ao total de dados.
+
+Em servidores standalone, e sempre para scans_ts (coleções time-series não
+têm change stream), o feed faz polling:
+
+- inserções em ordem de _id (ObjectId), a partir do maior _id já visto;
+  documentos gravados com _id do passado (pop_db --seed) não aparecem
+- em objects e scan_buckets, documentos cujo last_seen/last passou do maior
+  valor já visto voltam como replace
+- remoções não são vistas
+
+Inserções, atualizações, substituições (replace) e remoções mantêm as
+contagens de object_status (objetos da janela em memória) e action_types.
+
+Teste local com um replica set de um nó:
+
+    mongod --replSet rs0 --dbpath ./data --port 27017
+    mongosh --eval "rs.initiate()"
+    python live_feed.py          # em outro terminal: python pop_db.py --bulk
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import pandas as pd
+from pymongo.errors import OperationFailure, PyMongoError
+
+from scan_store import BUCKETS, SCAN_COLLECTIONS, TIMESERIES, scan_collection
+
+# janela inicial e tamanho máximo de cada DataFrame em memória
+DEFAULT_MAX_ROWS = 5000
+POLL_INTERVAL = 2.0
+
+# códigos de erro de change stream em servidor standalone
+CHANGE_STREAM_UNSUPPORTED = {40573, 40324}
+
+# campo usado para ordenar a janela inicial de cada coleção
+RECENT_FIELD = {
+    "objects": "last_seen",
+    "scans": "timestamp",
+    SCAN_COLLECTIONS[TIMESERIES]: "timestamp",
+    SCAN_COLLECTIONS[BUCKETS]: "last",
+    "history": "timestamp",
+}
+
+# coleções cujos documentos mudam depois de inseridos e o campo que avança
+# a cada mudança (last_seen a cada detecção, last a cada scan no bucket)
+UPDATE_FIELD = {"objects": "last_seen", SCAN_COLLECTIONS[BUCKETS]: "last"}
+
+# time-series não têm change stream: são lidas por polling mesmo em replica set
+UNWATCHABLE = {SCAN_COLLECTIONS[TIMESERIES]}
+
+
+def live_collections(mode=None):
+    """objects, a coleção de scans do modo de armazenamento e history."""
+    return ("objects", scan_collection(mode), "history")
+
+
+def _decrement(counts, key):
+    counts[key] -= 1
+    if counts[key] <= 0:
+        del counts[key]
+
+
+def _set_path(row, path, value):
+    # updatedFields usa caminhos com ponto (ex.: "coordinates.x")
+    head, _, rest = path.partition(".")
+    if not rest:
+        row[head] = value
+        return
+    nested = dict(row.get(head) or {})
+    _set_path(nested, rest, value)
+    row[head] = nested
+
+
+class LiveFeed:
+    def __init__(self, db, collections=None, max_rows=DEFAULT_MAX_ROWS, poll_interval=POLL_INTERVAL):
+        self.db = db
+        self.collections = tuple(collections or live_collections())
+        self.max_rows = max_rows
+        self.poll_interval = poll_interval
+        self.events = queue.Queue()
+        self.frames = {}
+        self.metrics = {
+            "events": Counter(),         # eventos aplicados por coleção
+            "action_types": Counter(),   # history por action_type
+            "object_status": Counter(),  # objects por status (carga inicial + deltas)
+        }
+        self.mode = None
+        self.error = None
+        self.last_event_at = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._resume_token = None
+        self._id_marks = {}       # coleção -> maior _id visto (polling de inserções)
+        self._update_marks = {}   # coleção -> maior valor de UPDATE_FIELD visto
+        self._object_status = {}  # _id (str) -> status dos objetos contados em object_status
+
+    # --- estado inicial -----------------------------------------------------
+
+    def load_initial(self):
+        """Carrega a janela mais recente de cada coleção (uma vez só)."""
+        for name in self.collections:
+            field = RECENT_FIELD.get(name, "_id")
+            docs = list(self.db[name].find().sort(field, -1).limit(self.max_rows))
+            docs.reverse()  # mais recentes no fim, onde entram os deltas
+            frame = pd.DataFrame(docs)
+            if not frame.empty:
+                frame.index = frame["_id"].astype(str)
+            self.frames[name] = frame
+            newest = self.db[name].find_one({}, {"_id": 1}, sort=[("_id", -1)])
+            self._id_marks[name] = newest["_id"] if newest else None
+            if name in UPDATE_FIELD:
+                stamps = [d[UPDATE_FIELD[name]] for d in docs if d.get(UPDATE_FIELD[name]) is not None]
+                self._update_marks[name] = max(stamps, default=None)
+            if name == "history" and not frame.empty:
+                self.metrics["action_types"].update(frame["action_type"].dropna())
+            if name == "objects":
+                for doc in docs:
+                    self._count_object(str(doc["_id"]), doc)
+
+    # --- assinatura ---------------------------------------------------------
+
+    def start(self):
+        if self._thread is not None:
+            return
+        if not self.frames:
+            self.load_initial()
+        self._thread = threading.Thread(target=self._run, name="live-feed", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        try:
+            self._watch()
+        except OperationFailure as exc:
+            if exc.code not in CHANGE_STREAM_UNSUPPORTED:
+                self.error = exc
+                raise
+            self._poll()
+
+    def _watch(self):
+        self.mode = "change_stream"
+        watched = [name for name in self.collections if name not in UNWATCHABLE]
+        polled = [name for name in self.collections if name in UNWATCHABLE]
+        pipeline = [{"$match": {"ns.coll": {"$in": watched}}}]
+        last_poll = 0.0
+        while not self._stop.is_set():
+            try:
+                with self.db.watch(pipeline, resume_after=self._resume_token, max_await_time_ms=1000) as stream:
+                    while not self._stop.is_set() and stream.alive:
+                        change = stream.try_next()
+                        if change is not None:
+                            self.events.put(self._from_change(change))
+                        self._resume_token = stream.resume_token
+                        if polled and time.monotonic() - last_poll >= self.poll_interval:
+                            self._poll_once(polled)
+                            last_poll = time.monotonic()
+            except OperationFailure:
+                raise
+            except PyMongoError:
+                # erro transitório: retoma do último resume token
+                time.sleep(self.poll_interval)
+
+    def _from_change(self, change):
+        op = change["operationType"]
+        event = {"collection": change["ns"]["coll"], "op": op, "_id": change["documentKey"]["_id"]}
+        if op == "insert":
+            event["doc"] = change["fullDocument"]
+        elif op == "update":
+            event["fields"] = change["updateDescription"]["updatedFields"]
+        elif op == "replace":
+            event["doc"] = change["fullDocument"]
+        return event
+
+    def _poll(self):
+        """Fallback para standalone: polling de todas as coleções."""
+        self.mode = "polling"
+        while not self._stop.is_set():
+            self._poll_once(self.collections)
+            self._stop.wait(self.poll_interval)
+
+    def _poll_once(self, names):
+        """Uma volta de polling: inserções por _id e, onde há UPDATE_FIELD, atualizações."""
+        for name in names:
+            col = self.db[name]
+            mark = self._id_marks.get(name)
+            for doc in col.find({"_id": {"$gt": mark}} if mark is not None else {}).sort("_id", 1):
+                self._id_marks[name] = doc["_id"]
+                self.events.put({"collection": name, "op": "insert", "_id": doc["_id"], "doc": doc})
+            field = UPDATE_FIELD.get(name)
+            if field is None or self._id_marks.get(name) is None:
+                continue
+            # os inseridos nesta volta já foram enviados acima
+            query = {"_id": {"$lte": self._id_marks[name]}}
+            if self._update_marks.get(name) is not None:
+                query[field] = {"$gt": self._update_marks[name]}
+            for doc in col.find(query):
+                if doc.get(field) is None:
+                    continue
+                self._update_marks[name] = max(self._update_marks.get(name) or doc[field], doc[field])
+                self.events.put({"collection": name, "op": "replace", "_id": doc["_id"], "doc": doc})
+
+    # --- aplicação dos deltas ----------------------------------------------
+
+    def apply_pending(self, limit=10000):
+        """Aplica os eventos enfileirados; retorna quantos foram aplicados."""
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self.events.get_nowait())
+            except queue.Empty:
+                break
+        if not batch:
+            return 0
+
+        with self._lock:
+            by_collection = {}
+            for event in batch:
+                by_collection.setdefault(event["collection"], []).append(event)
+            for name, events in by_collection.items():
+                self._apply_collection(name, events)
+                self.metrics["events"][name] += len(events)
+            self.last_event_at = datetime.utcnow()
+        return len(batch)
+
+    def _count_object(self, key, doc):
+        """Move o objeto `key` para o status de `doc` em object_status (doc=None: removido)."""
+        counts = self.metrics["object_status"]
+        if key in self._object_status:
+            _decrement(counts, self._object_status.pop(key))
+        if doc is not None:
+            self._object_status[key] = doc.get("status")
+            counts[doc.get("status")] += 1
+
+    def _apply_collection(self, name, events):
+        frame = self.frames.get(name, pd.DataFrame())
+        pending = {}  # inserções deste lote, concatenadas no fim
+        for event in events:
+            key = str(event["_id"])
+            if key in pending:
+                current = pending[key]
+            elif key in frame.index:
+                current = frame.loc[key].to_dict()
+            else:
+                current = None  # fora da janela em memória
+            if event["op"] in ("insert", "replace"):
+                # um insert de _id já conhecido (polling) é tratado como replace
+                doc = dict(event["doc"])
+                pending[key] = doc
+                if name == "history":
+                    if current is not None:
+                        _decrement(self.metrics["action_types"], current.get("action_type"))
+                    self.metrics["action_types"][doc.get("action_type")] += 1
+                if name == "objects":
+                    self._count_object(key, doc)
+            elif event["op"] == "update":
+                fields = event["fields"]
+                if name == "objects" and "status" in fields and key in self._object_status:
+                    self._count_object(key, {"status": fields["status"]})
+                if current is None:
+                    continue
+                for path, value in fields.items():
+                    _set_path(current, path, value)
+                if key not in pending:
+                    for column, value in current.items():
+                        if column not in frame.columns:
+                            frame[column] = None
+                        frame.at[key, column] = value
+            elif event["op"] == "delete":
+                pending.pop(key, None)
+                if key in frame.index:
+                    frame = frame.drop(index=key)
+                if name == "history" and current is not None:
+                    _decrement(self.metrics["action_types"], current.get("action_type"))
+                if name == "objects":
+                    self._count_object(key, None)
+
+        if pending:
+            new_rows = pd.DataFrame(list(pending.values()), index=list(pending.keys()))
+            # uma reinserção (replace) substitui a linha antiga
+            frame = pd.concat([frame[~frame.index.isin(new_rows.index)], new_rows]) if not frame.empty else new_rows
+        if len(frame) > self.max_rows:
+            if name == "objects":
+                # object_status conta só os objetos da janela em memória
+                for key in frame.index[:-self.max_rows]:
+                    self._count_object(key, None)
+            frame = frame.iloc[-self.max_rows:]
+        self.frames[name] = frame
+
+    def frame(self, name):
+        with self._lock:
+            return self.frames.get(name, pd.DataFrame())
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    client = MongoClient(os.getenv("MONGODB_URI"))
+    feed = LiveFeed(client[os.getenv("MONGODB_DB")])
+    feed.start()
+    print(f"Acompanhando {'/'.join(feed.collections)} (Ctrl+C para sair) ...")
+    try:
+        while True:
+            time.sleep(1)
+            applied = feed.apply_pending()
+            if applied:
+                print(f"[{feed.mode}] +{applied} eventos | total por coleção: {dict(feed.metrics['events'])}")
+    except KeyboardInterrupt:
+        feed.stop()
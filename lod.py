@@ -0,0 +1,133 @@
+"""
+Nível de detalhe (LOD) dos gráficos do dashboard
+
+Cada gráfico recebe no máximo `budget` pontos, qualquer que seja o tamanho
+da residência:
+
+- séries temporais: o servidor junta horas vizinhas em faixas com $bucketAuto
+  (soma de scans, máximo de objetos; ver scan_store.hourly_series_pipeline),
+  ou a série completa é reduzida com LTTB (Largest-Triangle-Three-Buckets)
+  em NumPy, que mantém picos e vales com poucos pontos
+- nuvem 3D de objetos: até `budget` objetos vão como pontos; acima disso o
+  servidor agrupa os objetos em uma grade de voxels ($group por
+  floor(coordenada / lado)) e devolve um ponto por voxel ocupado, na média
+  das coordenadas, com a contagem de objetos
+
+O lado do voxel é escolhido a partir da extensão dos dados para que a grade
+inteira tenha no máximo `budget` células.
+"""
+
+import numpy as np
+import pandas as pd
+
+from columnar import OBJECT_SCHEMA, frame_from_docs, select
+
+DEFAULT_POINT_BUDGET = 2000
+POINT_BUDGETS = [500, 1000, 2000, 5000, 10000]
+AXES = ("x", "y", "z")
+
+CLOUD_COLUMNS = select(OBJECT_SCHEMA, "name", "type", "coordinates.x", "coordinates.y", "coordinates.z")
+VOXEL_SCHEMA = {"x": "float", "y": "float", "z": "float", "count": "int", "type": "category", "name": "str"}
+
+
+# ---------------------------------------------------------------------------
+# Séries temporais
+# ---------------------------------------------------------------------------
+
+def lttb(x, y, n_out):
+    """Índices dos `n_out` pontos escolhidos pelo LTTB (primeiro e último sempre entram)."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    # n_out - 2 faixas entre o primeiro e o último ponto; cada faixa tem ao menos um ponto
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        # área do triângulo (ponto escolhido antes, candidato, média da próxima faixa)
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def lttb_frame(df, x, ys, budget=DEFAULT_POINT_BUDGET):
+    """Linhas de `df` escolhidas pelo LTTB de cada coluna de `ys` (o orçamento é dividido entre elas)."""
+    if len(df) <= budget:
+        return df
+    xs = df[x]
+    if pd.api.types.is_datetime64_any_dtype(xs):
+        xs = xs.astype("datetime64[ns]").astype(np.int64)
+    xs = xs.to_numpy(dtype=np.float64)
+    per_column = max(3, budget // len(ys))
+    keep = np.unique(np.concatenate([lttb(xs, df[col].to_numpy(dtype=np.float64), per_column) for col in ys]))
+    return df.iloc[keep]
+
+
+# ---------------------------------------------------------------------------
+# Nuvem de pontos 3D
+# ---------------------------------------------------------------------------
+
+def extent_pipeline(match):
+    bounds = {}
+    for axis in AXES:
+        bounds[f"min_{axis}"] = {"$min": f"$coordinates.{axis}"}
+        bounds[f"max_{axis}"] = {"$max": f"$coordinates.{axis}"}
+    return [{"$match": match}, {"$group": {"_id": None, "n": {"$sum": 1}, **bounds}}]
+
+
+def voxel_size(lo, hi, budget):
+    """Menor lado (crescendo 25% por vez) com o qual a grade sobre [lo, hi] tem até `budget` células."""
+    ext = np.maximum(np.asarray(hi, dtype=np.float64) - np.asarray(lo, dtype=np.float64), 0.0)
+    spread = ext[ext > 0]
+    if not len(spread):
+        return 1.0
+    size = (np.prod(spread) / budget) ** (1 / len(spread))
+    while np.prod(np.floor(ext / size) + 1) > budget:
+        size *= 1.25
+    return float(size)
+
+
+def voxel_pipeline(match, lo, size):
+    cell = {
+        axis: {"$floor": {"$divide": [{"$subtract": [f"$coordinates.{axis}", float(lo[i])]}, size]}}
+        for i, axis in enumerate(AXES)
+    }
+    return [
+        {"$match": {**match, **{f"coordinates.{axis}": {"$type": "number"} for axis in AXES}}},
+        {"$group": {
+            "_id": cell,
+            "count": {"$sum": 1},
+            **{axis: {"$avg": f"$coordinates.{axis}"} for axis in AXES},
+            "type": {"$first": "$type"},
+            "name": {"$first": "$name"},
+        }},
+        {"$project": {"_id": 0, "count": 1, "type": 1, "name": 1, **{axis: 1 for axis in AXES}}},
+    ]
+
+
+def point_cloud(col, match, budget=DEFAULT_POINT_BUDGET):
+    """Pontos do gráfico 3D: (DataFrame x/y/z/count/type/name, lado do voxel ou None).
+
+    Até `budget` objetos, um ponto por objeto (count = 1); acima disso, um
+    ponto por voxel ocupado.
+    """
+    extent = next(col.aggregate(extent_pipeline(match)), None)
+    if not extent or not extent["n"]:
+        return pd.DataFrame(columns=list(VOXEL_SCHEMA)), None
+    if extent["n"] <= budget:
+        df = frame_from_docs(list(col.find(match, {"name": 1, "type": 1, "coordinates": 1})), CLOUD_COLUMNS)
+        df = df.rename(columns={f"coordinates.{axis}": axis for axis in AXES})
+        df["count"] = 1
+        return df.dropna(subset=list(AXES)), None
+    lo = [extent[f"min_{axis}"] or 0.0 for axis in AXES]
+    hi = [extent[f"max_{axis}"] or 0.0 for axis in AXES]
+    size = voxel_size(lo, hi, budget)
+    docs = list(col.aggregate(voxel_pipeline(match, lo, size), batchSize=budget))
+    return frame_from_docs(docs, VOXEL_SCHEMA), size
@@ -0,0 +1,476 @@
+"""
+Migrações versionadas de índices e orientador de índices (index advisor)
+
+Substitui as células de criação de índices do create_db.ipynb. Cada migração
+tem um número de versão; as já aplicadas ficam registradas na coleção
+schema_migrations e não rodam de novo. Todas as operações são idempotentes
+(create_index de um índice igual não faz nada, drop de índice inexistente é
+ignorado), então uma migração interrompida pode ser reaplicada.
+
+O orientador reproduz as formas de consulta do dashboard com explain() e
+aponta COLLSCANs, ordenações em memória, índices redundantes (prefixo de outro
+índice) e sugere índices compostos na ordem igualdade -> ordenação -> intervalo.
+
+Uso:
+    python migrations.py             # aplica as migrações pendentes
+    python migrations.py --status    # lista versões aplicadas/pendentes
+    python migrations.py --to 2      # aplica só até a versão 2
+    python migrations.py --advise    # relatório do orientador
+"""
+
+import argparse
+import os
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+from async_db import ACTIVE_OBJECTS, recent_objects_pipeline
+from columnar import columnar_pipeline
+from facets import SORT_FIELD, base_match, facet_pipeline, page_filter, selection_match
+from instrumentation import plan_stages, plan_uses_index
+from lod import extent_pipeline
+from pagination import keyset_find
+from rollups import OBJECT_STATS, RESIDENCE_STATS
+from scan_store import (
+    BUCKETS, DOCUMENTS, hourly_series_pipeline, scan_collection, scan_count_pipeline, scan_ids_pipeline,
+    scan_page_pipeline, storage_mode,
+)
+from spatial import INDEX_COLUMNS, residence_index_query
+from timeline import SEARCH_LIMIT, SEARCH_PROJECTION, search_query, timeline_filter, timeline_pipeline
+
+MIGRATIONS_COLLECTION = "schema_migrations"
+
+# mesmo valor de dashboard_pages.data (que importa o streamlit)
+RECENT_OBJECTS_LIMIT = 50
+
+
+def create_index(db, collection, keys, **options):
+    db[collection].create_index(keys, **options)
+
+
+def drop_index(db, collection, name):
+    # já removido (ou coleção inexistente): nada a fazer
+    if name in db[collection].index_information():
+        db[collection].drop_index(name)
+
+
+# ---------------------------------------------------------------------------
+# Migrações
+# ---------------------------------------------------------------------------
+
+def initial_indexes(db):
+    # conjunto original do create_db.ipynb, sem o 2dsphere (ver v3)
+    create_index(db, "users", [("email", ASCENDING)], unique=True)
+    create_index(db, "users", [("created_at", ASCENDING)])
+
+    create_index(db, "residences", [("user_id", ASCENDING)])
+    create_index(db, "residences", [("name", TEXT)])
+    create_index(db, "residences", [("user_id", ASCENDING), ("name", ASCENDING)], unique=True)
+
+    create_index(db, "objects", [("residence_id", ASCENDING)])
+    create_index(db, "objects", [("scan_id", ASCENDING)])
+    create_index(db, "objects", [("status", ASCENDING)])
+    create_index(db, "objects", [("last_seen", ASCENDING)])
+    create_index(db, "objects", [("vision_hash", ASCENDING)])
+    create_index(db, "objects", [("vision_hash", ASCENDING), ("residence_id", ASCENDING)], unique=True)
+
+    create_index(db, "scans", [("residence_id", ASCENDING), ("timestamp", DESCENDING)])
+    create_index(db, "scans", [("residence_id", ASCENDING), ("timestamp", ASCENDING)], unique=True)
+
+    create_index(db, "history", [("object_id", ASCENDING), ("timestamp", DESCENDING)])
+    create_index(db, "history", [("action_type", ASCENDING)])
+
+    create_index(db, "model_training", [("status", ASCENDING)])
+    create_index(db, "model_training", [("created_at", DESCENDING)])
+    create_index(db, "model_training", [("artifact_ref", ASCENDING)], unique=True)
+
+
+def objects_by_residence_and_scan(db):
+    # o dashboard filtra objetos por residence_id + scan_id (e a ingestão por residência)
+    create_index(db, "objects", [("residence_id", ASCENDING), ("scan_id", ASCENDING)])
+    create_index(db, OBJECT_STATS, [("residence_id", ASCENDING)])
+
+
+def drop_redundant_indexes(db):
+    # vision_hash_1 é prefixo do índice único vision_hash_1_residence_id_1
+    drop_index(db, "objects", "vision_hash_1")
+    # residence_id_1 é prefixo de residence_id_1_scan_id_1
+    drop_index(db, "objects", "residence_id_1")
+    # user_id_1 é prefixo do índice único user_id_1_name_1
+    drop_index(db, "residences", "user_id_1")
+    # coordinates são {x, y, z} em metros, não GeoJSON: o 2dsphere não atende consulta nenhuma
+    drop_index(db, "objects", "coordinates_2dsphere")
+    # mesmas chaves do índice único residence_id_1_timestamp_1, que também é percorrido ao contrário
+    drop_index(db, "scans", "residence_id_1_timestamp_-1")
+
+
+def timeline_indexes(db):
+    # linha do tempo por usuário e busca de objetos por prefixo do nome (timeline.py)
+    create_index(db, "history", [("performed_by", ASCENDING), ("timestamp", DESCENDING)])
+    create_index(db, "objects", [("residence_id", ASCENDING), ("name", ASCENDING)])
+
+
+def history_archive_indexes(db):
+    # eventos arquivados consultados por objeto e resumos por residência (history_archive.py)
+    create_index(db, "history_archive", [("object_id", ASCENDING), ("timestamp", DESCENDING)])
+    create_index(db, "history_summaries", [("residence_id", ASCENDING)])
+
+
+def object_facet_indexes(db):
+    # $match inicial dos filtros facetados: residências + intervalo de last_seen (facets.py)
+    create_index(db, "objects", [("residence_id", ASCENDING), ("last_seen", DESCENDING)])
+
+
+def object_first_seen_index(db):
+    # período por first_seen nos filtros facetados (facets.py)
+    create_index(db, "objects", [("residence_id", ASCENDING), ("first_seen", DESCENDING)])
+
+
+MIGRATIONS = [
+    (1, "indices_iniciais", initial_indexes),
+    (2, "objects_residence_scan", objects_by_residence_and_scan),
+    (3, "remove_indices_redundantes", drop_redundant_indexes),
+    (4, "timeline_historico", timeline_indexes),
+    (5, "arquivo_historico", history_archive_indexes),
+    (6, "facetas_objetos", object_facet_indexes),
+    (7, "facetas_first_seen", object_first_seen_index),
+]
+
+
+# índices resultantes das migrações acima (sem os redundantes do dump
+# original nem o coordinates_2dsphere, já que as coordenadas {x,y,z} não são GeoJSON)
+EXPORT_INDEXES = {
+    "users": [
+        {"v": 2, "key": {"_id": 1}, "name": "_id_"},
+        {"v": 2, "key": {"email": 1}, "name": "email_1", "unique": True},
+        {"v": 2, "key": {"created_at": 1}, "name": "created_at_1"},
+    ],
+    "residences": [
+        {"v": 2, "key": {"_id": 1}, "name": "_id_"},
+        {"v": 2, "key": {"_fts": "text", "_ftsx": 1}, "name": "name_text", "weights": {"name": 1},
+         "default_language": "english", "language_override": "language", "textIndexVersion": 3},
+        {"v": 2, "key": {"user_id": 1, "name": 1}, "name": "user_id_1_name_1", "unique": True},
+    ],
+    "scans": [
+        {"v": 2, "key": {"_id": 1}, "name": "_id_"},
+        {"v": 2, "key": {"residence_id": 1, "timestamp": 1}, "name": "residence_id_1_timestamp_1", "unique": True},
+    ],
+    "objects": [
+        {"v": 2, "key": {"_id": 1}, "name": "_id_"},
+        {"v": 2, "key": {"scan_id": 1}, "name": "scan_id_1"},
+        {"v": 2, "key": {"status": 1}, "name": "status_1"},
+        {"v": 2, "key": {"last_seen": 1}, "name": "last_seen_1"},
+        {"v": 2, "key": {"residence_id": 1, "scan_id": 1}, "name": "residence_id_1_scan_id_1"},
+        {"v": 2, "key": {"residence_id": 1, "name": 1}, "name": "residence_id_1_name_1"},
+        {"v": 2, "key": {"residence_id": 1, "last_seen": -1}, "name": "residence_id_1_last_seen_-1"},
+        {"v": 2, "key": {"residence_id": 1, "first_seen": -1}, "name": "residence_id_1_first_seen_-1"},
+        {"v": 2, "key": {"vision_hash": 1, "residence_id": 1}, "name": "vision_hash_1_residence_id_1", "unique": True},
+    ],
+    "history": [
+        {"v": 2, "key": {"_id": 1}, "name": "_id_"},
+        {"v": 2, "key": {"object_id": 1, "timestamp": -1}, "name": "object_id_1_timestamp_-1"},
+        {"v": 2, "key": {"action_type": 1}, "name": "action_type_1"},
+        {"v": 2, "key": {"performed_by": 1, "timestamp": -1}, "name": "performed_by_1_timestamp_-1"},
+    ],
+}
+
+
+def index_models(specs):
+    """Converte especificações no formato do .metadata.json em IndexModel."""
+    models = []
+    for spec in specs:
+        if spec["name"] == "_id_":
+            continue
+        key = spec["key"]
+        if "_fts" in key:
+            # índice de texto: o dump guarda _fts/_ftsx, a criação usa os campos
+            keys = [(field, "text") for field in spec.get("weights", {})]
+        else:
+            keys = list(key.items())
+        options = {k: v for k, v in spec.items() if k not in ("v", "key", "ns")}
+        models.append(IndexModel(keys, **options))
+    return models
+
+
+def applied_versions(db):
+    return {doc["_id"]: doc for doc in db[MIGRATIONS_COLLECTION].find()}
+
+
+def migrate(db, target=None, verbose=True):
+    """Aplica, em ordem, as migrações ainda não registradas (até `target`)."""
+    applied = applied_versions(db)
+    ran = []
+    for version, name, func in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        if version in applied:
+            continue
+        if verbose:
+            print(f"Aplicando migração {version} ({name}) ...")
+        func(db)
+        db[MIGRATIONS_COLLECTION].replace_one(
+            {"_id": version}, {"_id": version, "name": name, "applied_at": datetime.utcnow()}, upsert=True
+        )
+        ran.append(version)
+    if verbose and not ran:
+        print("Nenhuma migração pendente.")
+    return ran
+
+
+def print_status(db):
+    applied = applied_versions(db)
+    for version, name, _ in MIGRATIONS:
+        doc = applied.get(version)
+        when = f"aplicada em {doc['applied_at']:%d/%m/%Y %H:%M}" if doc else "pendente"
+        print(f"{version:>3}  {name:<28} {when}")
+
+
+# ---------------------------------------------------------------------------
+# Orientador de índices
+# ---------------------------------------------------------------------------
+
+def sample_values(db):
+    """Valores reais para montar as consultas (ObjectId novo se a coleção estiver vazia)."""
+    obj = db.objects.find_one({}, {"residence_id": 1, "scan_id": 1}) or {}
+    res = db.residences.find_one({}, {"user_id": 1}) or {}
+    return {
+        "user_id": res.get("user_id", ObjectId()),
+        "residence_id": obj.get("residence_id", res.get("_id", ObjectId())),
+        "scan_id": obj.get("scan_id", ObjectId()),
+        "object_id": obj.get("_id", ObjectId()),
+    }
+
+
+def _find(collection, filter, **fields):
+    return {"find": collection, "filter": filter, **fields}
+
+
+def _aggregate(collection, pipeline):
+    return {"aggregate": collection, "pipeline": pipeline, "cursor": {}}
+
+
+def _distinct(collection, key, query):
+    return {"distinct": collection, "key": key, "query": query}
+
+
+def dashboard_query_shapes(v, mode=None):
+    """As consultas das páginas do dashboard, no formato do comando enviado ao servidor.
+
+    Cada forma sai das mesmas funções que as páginas chamam (paginação por
+    chave, facetas, linha do tempo, scan_store no modo SCAN_STORAGE), na
+    primeira página e com os filtros vazios; as projeções das tabelas ficam de
+    fora, pois não mudam o plano.
+    """
+    mode = mode or storage_mode()
+    scans = scan_collection(mode)
+    residence = [v["residence_id"]]
+    objects_match = {**base_match(residence), **selection_match({})}
+    shapes = [
+        ("Visão Geral: objetos ativos", {"count": "objects", "query": ACTIVE_OBJECTS}),
+        ("Visão Geral: objetos recentes", _aggregate("objects", recent_objects_pipeline(RECENT_OBJECTS_LIMIT))),
+    ]
+    if mode != DOCUMENTS:
+        shapes.append(("Visão Geral: total de scans", _aggregate(scans, scan_count_pipeline(mode))))
+    shapes += [
+        ("Usuários", _find("users", {}, sort={"name": 1}, projection={"name": 1})),
+        ("Residências do usuário", _find("residences", {"user_id": v["user_id"]}, projection={"name": 1})),
+        ("Resumo da residência", _find(RESIDENCE_STATS, {"_id": v["residence_id"]})),
+        ("Scans da residência (ids)", _aggregate(scans, scan_ids_pipeline(v["residence_id"], mode))),
+        ("Objetos: opções das facetas", _distinct("objects", "type", {"residence_id": {"$in": residence}})),
+        ("Objetos: contagens das facetas", _aggregate("objects", facet_pipeline(base_match(residence), {}))),
+        ("Objetos: página da tabela", _find("objects", **keyset_find(
+            page_filter(base_match(residence), {}), SORT_FIELD))),
+        ("Objetos: extensão do mapa 3D", _aggregate("objects", extent_pipeline(objects_match))),
+        ("Objetos: índice espacial", _aggregate("objects", columnar_pipeline(
+            residence_index_query(v["residence_id"]), INDEX_COLUMNS))),
+        ("History: tipos de evento", _distinct("history", "action_type", {})),
+        ("History: busca de objeto por nome", _find(
+            "objects", search_query(residence, "So"), sort={"name": 1}, limit=SEARCH_LIMIT,
+            projection=SEARCH_PROJECTION)),
+        ("History: objetos da residência", _distinct("objects", "_id", {"residence_id": v["residence_id"]})),
+        ("History: linha do tempo do usuário", _aggregate("history", timeline_pipeline(
+            timeline_filter(None, user_id=v["user_id"], action_types=["moved"])))),
+        ("History: linha do tempo do objeto", _aggregate("history", timeline_pipeline(
+            timeline_filter(None, object_id=v["object_id"])))),
+        ("History: resumo do objeto", _find(OBJECT_STATS, {"_id": v["object_id"]}, projection={"by_action": 1})),
+        ("History: resumos do usuário", _find(RESIDENCE_STATS, {"user_id": v["user_id"]},
+                                              projection={"history_by_action": 1})),
+    ]
+    if mode == BUCKETS:
+        page = _aggregate(scans, scan_page_pipeline(v["residence_id"]))
+    else:
+        page = _find(scans, **keyset_find({"residence_id": v["residence_id"]}, "timestamp"))
+    shapes += [
+        ("Scans: página da residência", page),
+        ("Scans: série por hora", _aggregate(scans, hourly_series_pipeline(v["residence_id"], mode))),
+    ]
+    return shapes
+
+
+def _query_parts(command):
+    """(filtro, ordenação) de um find/count/aggregate."""
+    if "aggregate" in command:
+        filter, sort = {}, {}
+        for stage in command["pipeline"]:
+            if "$match" in stage and not sort:
+                filter = stage["$match"]
+            elif "$sort" in stage:
+                sort = stage["$sort"]
+            else:
+                break
+        return filter, sort
+    return command.get("filter", command.get("query", {})), command.get("sort", {})
+
+
+def suggest_index(filter, sort):
+    """Índice composto na ordem igualdade -> ordenação -> intervalo (regra ESR)."""
+    equality, ranges = [], []
+    for field, cond in filter.items():
+        if field.startswith("$"):
+            continue
+        is_range = isinstance(cond, dict) and any(op in cond for op in ("$gt", "$gte", "$lt", "$lte", "$ne"))
+        (ranges if is_range else equality).append(field)
+    keys = [(f, 1) for f in equality]
+    keys += [(f, d) for f, d in sort.items() if f not in equality]
+    keys += [(f, 1) for f in ranges if f not in sort]
+    return keys
+
+
+def _covered_by(keys, indexes):
+    # algum índice existente começa pelos mesmos campos (direção exata ou toda invertida)
+    for info in indexes.values():
+        existing = list(info["key"])
+        prefix = existing[:len(keys)]
+        if prefix == keys or prefix == [(f, -d) for f, d in keys]:
+            return True
+    return False
+
+
+def _is_plain(key):
+    return all(isinstance(d, int) for _, d in key)
+
+
+def redundant_indexes(db, collections):
+    """Índices cujas chaves são prefixo de outro índice (e não são únicos)."""
+    found = []
+    for name in collections:
+        indexes = db[name].index_information()
+        for idx_name, info in indexes.items():
+            key = list(info["key"])
+            if idx_name == "_id_" or info.get("unique") or not _is_plain(key):
+                continue
+            for other_name, other in indexes.items():
+                other_key = list(other["key"])
+                if other_name == idx_name or not _is_plain(other_key) or len(other_key) < len(key):
+                    continue
+                # prefixo exato, ou o mesmo índice com todas as direções invertidas
+                prefix = other_key[:len(key)]
+                reversed_twin = len(other_key) == len(key) and prefix == [(f, -d) for f, d in key]
+                if reversed_twin and not other.get("unique") and other_name > idx_name:
+                    continue  # entre dois gêmeos só um é apontado
+                if prefix == key or reversed_twin:
+                    found.append({"collection": name, "index": idx_name, "covered_by": other_name})
+                    break
+    return found
+
+
+def non_geojson_geo_indexes(db, collections):
+    """Índices 2dsphere cujo campo não guarda GeoJSON ({type, coordinates})."""
+    found = []
+    for name in collections:
+        for idx_name, info in db[name].index_information().items():
+            for field, kind in info["key"]:
+                if kind != "2dsphere":
+                    continue
+                doc = db[name].find_one({field: {"$exists": True}}, {field: 1})
+                value = (doc or {}).get(field)
+                if isinstance(value, dict) and "type" not in value:
+                    found.append({"collection": name, "index": idx_name, "field": field})
+    return found
+
+
+def advise(db):
+    """Executa o explain das consultas do dashboard e monta o relatório."""
+    values = sample_values(db)
+    queries, suggestions = [], []
+    collections = set()
+    for label, command in dashboard_query_shapes(values):
+        collection = next(iter(command.values()))
+        collections.add(collection)
+        try:
+            explain = db.command("explain", command, verbosity="queryPlanner")
+        except OperationFailure as exc:
+            queries.append({"query": label, "collection": collection, "error": str(exc)})
+            continue
+        stages = plan_stages(explain.get("queryPlanner", explain))
+        uses_index = plan_uses_index(explain.get("queryPlanner", explain))
+        in_memory_sort = "SORT" in stages
+        queries.append({
+            "query": label, "collection": collection, "stages": stages,
+            "uses_index": uses_index, "in_memory_sort": in_memory_sort,
+        })
+
+        filter, sort = _query_parts(command)
+        if (uses_index is False and filter) or in_memory_sort:
+            keys = suggest_index(filter, sort)
+            if keys and not _covered_by(keys, db[collection].index_information()):
+                suggestion = {"collection": collection, "keys": keys, "query": label}
+                if suggestion not in suggestions:
+                    suggestions.append(suggestion)
+
+    return {
+        "queries": queries,
+        "redundant": redundant_indexes(db, sorted(collections)),
+        "geo_on_plain_coords": non_geojson_geo_indexes(db, sorted(collections)),
+        "suggestions": suggestions,
+    }
+
+
+def print_report(report):
+    print("==== Consultas do dashboard ====")
+    for q in report["queries"]:
+        if "error" in q:
+            print(f"  ERRO      {q['query']}: {q['error']}")
+            continue
+        status = {True: "índice", False: "COLLSCAN", None: "-"}[q["uses_index"]]
+        sort = " + SORT em memória" if q["in_memory_sort"] else ""
+        print(f"  {status:<9} {q['query']} ({q['collection']}){sort}")
+
+    print("==== Índices redundantes ====")
+    for r in report["redundant"] or [None]:
+        print(f"  {r['collection']}.{r['index']} (coberto por {r['covered_by']})" if r else "  nenhum")
+
+    print("==== 2dsphere em coordenadas não GeoJSON ====")
+    for g in report["geo_on_plain_coords"] or [None]:
+        print(f"  {g['collection']}.{g['index']} (campo {g['field']})" if g else "  nenhum")
+
+    print("==== Índices sugeridos ====")
+    for s in report["suggestions"] or [None]:
+        if s:
+            keys = ", ".join(f"{f}: {d}" for f, d in s["keys"])
+            print(f"  {s['collection']}: {{{keys}}}  <- {s['query']}")
+        else:
+            print("  nenhum")
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Migrações de índices e orientador de índices.")
+    parser.add_argument("--status", action="store_true", help="lista as migrações aplicadas e pendentes")
+    parser.add_argument("--to", type=int, default=None, help="aplica só até esta versão")
+    parser.add_argument("--advise", action="store_true", help="roda o explain das consultas do dashboard")
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv("MONGODB_URI"))
+    db = client[os.getenv("MONGODB_DB")]
+    if args.status:
+        print_status(db)
+    elif args.advise:
+        print_report(advise(db))
+    else:
+        migrate(db, target=args.to)
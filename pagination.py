@@ -0,0 +1,100 @@
+"""
+Paginação por chave (keyset) para as tabelas do dashboard
+
+Em vez de skip/offset, cada página continua a partir do último valor visto
+do campo de ordenação. Com o filtro de igualdade + ordenação batendo com um
+índice composto (ex.: object_id_1_timestamp_-1, residence_id_1_timestamp_-1)
+o servidor só lê os documentos da página, então o tempo até a primeira linha
+não depende do tamanho do histórico.
+
+O cursor de página é (último_valor, [_ids com esse valor já mostrados]):
+empates no campo de ordenação são resolvidos excluindo os _id já vistos,
+sem acrescentar _id na ordenação (o que impediria o uso do índice).
+"""
+
+DEFAULT_PAGE_SIZE = 50
+PAGE_SIZES = [25, 50, 100, 250]
+
+
+def keyset_query(filter, sort_field, direction=-1, after=None):
+    query = dict(filter or {})
+    if after is not None:
+        last_value, seen_ids = after
+        op = "$lte" if direction < 0 else "$gte"
+        query[sort_field] = {op: last_value}
+        if seen_ids:
+            query["_id"] = {"$nin": list(seen_ids)}
+    return query
+
+
+def keyset_find(filter, sort_field, direction=-1, after=None,
+                page_size=DEFAULT_PAGE_SIZE, projection=None):
+    """Campos do comando find de uma página (filter, sort, limit e projection)."""
+    if projection is not None and sort_field not in projection:
+        projection = dict(projection, **{sort_field: 1})
+    find = {
+        "filter": keyset_query(filter, sort_field, direction, after),
+        "sort": {sort_field: direction},
+        "limit": page_size + 1,
+    }
+    if projection is not None:
+        find["projection"] = projection
+    return find
+
+
+def keyset_page(col, filter, sort_field, direction=-1, after=None,
+                page_size=DEFAULT_PAGE_SIZE, projection=None):
+    """Busca uma página ordenada por `sort_field`.
+
+    Retorna (documentos, cursor_da_próxima_página); o cursor é None quando
+    não há mais páginas. Lê page_size + 1 documentos para saber se existe
+    uma próxima página sem precisar de count.
+    """
+    find = keyset_find(filter, sort_field, direction, after, page_size, projection)
+    cursor = (
+        col.find(find["filter"], find.get("projection"))
+        .sort(sort_field, direction)
+        .limit(find["limit"])
+        .batch_size(find["limit"])
+    )
+    return page_and_cursor(list(cursor), sort_field, after, page_size)
+
+
+def keyset_pipeline(filter, sort_field, direction=-1, after=None,
+                    page_size=DEFAULT_PAGE_SIZE, pipeline=None, prefix=None):
+    """Estágios da agregação de uma página (ver keyset_aggregate)."""
+    return [
+        *(prefix or []),
+        {"$match": keyset_query(filter, sort_field, direction, after)},
+        {"$sort": {sort_field: direction}},
+        {"$limit": page_size + 1},
+        *(pipeline or []),
+    ]
+
+
+def keyset_aggregate(col, filter, sort_field, direction=-1, after=None,
+                     page_size=DEFAULT_PAGE_SIZE, pipeline=None, prefix=None):
+    """Como keyset_page, mas os estágios de `pipeline` ($lookup, $project, ...)
+    rodam só sobre os documentos da página, depois do $match/$sort/$limit.
+
+    Os estágios precisam preservar `_id` e `sort_field` de cada documento.
+    `prefix` são estágios que rodam antes do filtro (ex.: $unwind dos scans
+    guardados em buckets por hora).
+    """
+    stages = keyset_pipeline(filter, sort_field, direction, after, page_size, pipeline, prefix)
+    docs = list(col.aggregate(stages, batchSize=page_size + 1))
+    return page_and_cursor(docs, sort_field, after, page_size)
+
+
+def page_and_cursor(docs, sort_field, after, page_size):
+    has_more = len(docs) > page_size
+    docs = docs[:page_size]
+    if not has_more or not docs:
+        return docs, None
+
+    last_value = docs[-1][sort_field]
+    seen_ids = [d["_id"] for d in docs if d[sort_field] == last_value]
+    # empates que já vinham da página anterior continuam excluídos
+    if after is not None and after[0] == last_value:
+        seen_ids = list(after[1]) + seen_ids
+    return docs, (last_value, seen_ids)
@@ -9,15 +9,30 @@ Seed com:
 - histórico de mudanças (moved, renamed, color change, removed) coerente
 """
 
+import argparse
+import asyncio
 import random
 import hashlib
+import struct
+import time
 import uuid
-from datetime import datetime, timedelta
-from pymongo import MongoClient
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId, encode, json_util
+from pymongo import MongoClient, UpdateOne
 from pymongo.errors import DuplicateKeyError, BulkWriteError
 from pymongo.server_api import ServerApi
 import os
 from dotenv import load_dotenv
+from async_db import async_client
+from common import COLLECTION_ORDER, DUPLICATE_KEY
+from dedup import ResidenceMatcher
+from history_archive import history_event
+from ingest import ingest_scan, record_object_events
+from instrumentation import QueryProfiler
+from migrations import EXPORT_INDEXES, index_models
+from rollups import apply_stat_ops, object_stat_ops, rebuild_stats, residence_stat_ops
+from scan_store import DOCUMENTS, migrate_scans, scan_collection, storage_mode
 
 load_dotenv()
 
@@ -34,6 +49,9 @@ MAX_SCANS_PER_RES = 20
 MAX_OBJECTS_PER_SCAN = 8    # 0..8 objetos por scan
 MAX_HISTORY_ENTRIES_PER_OBJECT = 4
 
+# data base usada quando há --seed (datetime.utcnow() tornaria a saída variável)
+SEEDED_BASE_DATE = datetime(2025, 1, 1)
+
 # Listas de apoio (nomes, tipos, cores, etc.)
 first_names = ["João", "Lucas", "Mariana", "Ana", "Carlos", "Fernanda", "Pedro", "Rafaela", "Gustavo", "Beatriz",
                "Marcos", "Patrícia", "Paulo", "Laura", "Ricardo", "Juliana", "Roberto", "Carolina", "Thiago", "Sofia"]
@@ -43,27 +61,782 @@ object_types = ["móvel", "eletrônico", "decoração", "utensílio", "eletrodom
 object_base_names = ["Sofá", "Mesa", "Cadeira", "Cama", "Armário", "TV", "Geladeira", "Micro-ondas", "Prateleira", "Tapete"]
 colors = ["azul", "vermelho", "verde", "preto", "branco", "cinza", "marrom", "amarelo", "bege"]
 
-def make_vision_hash(name, coords, seed=None):
+def make_vision_hash(name, coords, seed=None, rng=None):
+    # sem seed, o sal vem do rng (determinístico) ou de um uuid4 (aleatório)
+    if seed is None and rng is not None:
+        seed = "%032x" % rng.getrandbits(128)
     s = f"{name}-{coords}-{seed or uuid.uuid4().hex}"
     return hashlib.sha1(s.encode()).hexdigest()[:16]
 
-def jitter_coords(base_x=0.0, base_y=0.0, base_z=0.0):
+def jitter_coords(base_x=0.0, base_y=0.0, base_z=0.0, rng=random):
     return {
-        "x": round(base_x + random.uniform(-0.8, 0.8), 3),
-        "y": round(base_y + random.uniform(-0.8, 0.8), 3),
-        "z": round(base_z + random.uniform(-0.1, 0.6), 3)
+        "x": round(base_x + rng.uniform(-0.8, 0.8), 3),
+        "y": round(base_y + rng.uniform(-0.8, 0.8), 3),
+        "z": round(base_z + rng.uniform(-0.1, 0.6), 3)
     }
 
-def random_timestamp(start_date, scan_index):
+def random_timestamp(start_date, scan_index, rng=random):
     # Gera timestamps próximos entre si para evitar colisões de unique index por residence+timestamp
     # start_date é datetime; adiciona alguns minutos/horas/dias
-    delta = timedelta(days=random.randint(0, 90), hours=random.randint(0, 23), minutes=random.randint(0, 59))
+    delta = timedelta(days=rng.randint(0, 90), hours=rng.randint(0, 23), minutes=rng.randint(0, 59))
     # também adiciona um pouco baseado no índice do scan para evitar colisões
-    delta += timedelta(minutes=scan_index * random.randint(1, 10))
+    delta += timedelta(minutes=scan_index * rng.randint(1, 10))
     return start_date + delta
 
-def main():
-    client = MongoClient(MONGO_URI, server_api=ServerApi('1'))
+# ---------------------------------------------------------------------------
+# Modo bulk: monta os documentos de cada coleção em memória, resolve as
+# mutações do histórico antes da escrita e envia tudo em lotes
+# (insert_many / bulk_write) em vez de um round trip por documento.
+# ---------------------------------------------------------------------------
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_IN_FLIGHT = 4
+
+
+def new_object_id(rng=None, when=None):
+    """ObjectId novo; com `rng`, os 8 bytes após o timestamp saem do gerador."""
+    if rng is None:
+        return ObjectId()
+    ts = int(when.replace(tzinfo=timezone.utc).timestamp()) if when else 0
+    return ObjectId(struct.pack(">I", ts) + rng.randbytes(8))
+
+
+def user_rng(seed, u_idx):
+    # um gerador por usuário: o resultado não depende de como o intervalo
+    # de usuários é dividido entre shards/processos
+    return random.Random(f"{seed}:{u_idx}")
+
+
+def new_bundle():
+    return {name: [] for name in COLLECTION_ORDER}
+
+
+def build_user_bundle(u_idx, base_start_date, rng=None):
+    """Gera um usuário com residências, scans, objetos e histórico já resolvidos.
+
+    Os _id são atribuídos aqui para que as referências entre coleções existam
+    antes de qualquer escrita. Cada objeto é guardado no seu estado final
+    (após as detecções e os eventos do histórico), exatamente como o modo
+    sequencial deixaria o documento no banco.
+
+    Com `rng` (um random.Random próprio) a geração fica determinística:
+    _id, vision_hash e todos os sorteios saem do mesmo gerador.
+    """
+    id_rng = rng
+    rng = rng or random
+    bundle = new_bundle()
+
+    first = rng.choice(first_names)
+    last = rng.choice(last_names)
+    email = f"{first.lower()}.{last.lower()}{u_idx}@example.com"
+    user_id = new_object_id(id_rng, base_start_date)
+    bundle["users"].append({
+        "_id": user_id,
+        "name": f"{first} {last}",
+        "email": email,
+        "password_hash": hashlib.sha256((email + "password").encode()).hexdigest(),
+        "created_at": base_start_date + timedelta(days=rng.randint(0, 100)),
+        "preferences": {
+            "voice": rng.choice(["masculino", "feminino"]),
+            "language": "pt"
+        }
+    })
+
+    num_res = rng.randint(MIN_RES_PER_USER, MAX_RES_PER_USER)
+    for r in range(num_res):
+        res_name = rng.choice(room_names) + (f" - {r+1}" if r > 0 else "")
+        residence_id = new_object_id(id_rng, base_start_date)
+        residence_doc = {
+            "_id": residence_id,
+            "user_id": user_id,
+            "name": res_name,
+            "address": f"Rua {rng.choice(['A', 'B', 'C', 'D', 'E'])}, {rng.randint(1,999)}",
+            "description": f"{rng.choice(['Apartamento','Casa','Sobrado'])} {rng.randint(1,4)} quartos",
+            "created_at": base_start_date + timedelta(days=rng.randint(0, 100)),
+            "metadata": {
+                "area_m2": rng.randint(30, 250)
+            }
+        }
+        bundle["residences"].append(residence_doc)
+
+        persistent_objects = []
+        for p in range(rng.randint(3, 7)):
+            obj_name = f"{rng.choice(object_base_names)} #{p+1}"
+            coords = jitter_coords(rng=rng, base_x=rng.uniform(0,4), base_y=rng.uniform(0,4), base_z=0)
+            persistent_objects.append({
+                "residence_id": residence_id,
+                "name": obj_name,
+                "type": rng.choice(object_types),
+                "color": rng.choice(colors),
+                "coordinates": coords,
+                "scan_id": None,
+                "first_seen": None,
+                "last_seen": None,
+                "status": "ativo",
+                "confidence": round(rng.uniform(0.7, 0.99), 3),
+                "vision_hash": make_vision_hash(obj_name, coords, rng=id_rng)
+            })
+
+        # estado final dos objetos da residência: vision_hash -> documento
+        objects_by_hash = {}
+        # detecções perto de um objeto conhecido (mesmo nome base, type e color) herdam o hash dele;
+        # o catálogo de persistentes entra antes, para a primeira aparição manter o próprio hash
+        matcher = ResidenceMatcher()
+        for p_obj in persistent_objects:
+            matcher.upsert(p_obj)
+        used_timestamps = set()
+
+        num_scans = rng.randint(MIN_SCANS_PER_RES, MAX_SCANS_PER_RES)
+        scan_start_date = base_start_date + timedelta(days=rng.randint(0, 60))
+
+        for s_idx in range(num_scans):
+            scan_time = random_timestamp(scan_start_date, s_idx, rng=rng)
+            # colisões do índice único residence_id+timestamp já resolvidas em memória
+            while scan_time in used_timestamps:
+                scan_time += timedelta(seconds=rng.randint(1, 300))
+            used_timestamps.add(scan_time)
+
+            scan_id = new_object_id(id_rng, scan_time)
+            scan_doc = {
+                "_id": scan_id,
+                "residence_id": residence_id,
+                "user_id": user_id,
+                "timestamp": scan_time,
+                "camera_meta": {
+                    "device": rng.choice(["iPhone 12", "iPhone 13", "Pixel 6", "Galaxy S21"]),
+                    "fov": rng.choice([90, 100, 110, 120]),
+                    "position": {"x": round(rng.uniform(0,4),3), "y": round(rng.uniform(0,4),3), "z": round(rng.uniform(0.5,2.0),3)}
+                },
+                "objects_detected_count": 0
+            }
+            bundle["scans"].append(scan_doc)
+
+            n_objs = rng.randint(0, MAX_OBJECTS_PER_SCAN)
+            if persistent_objects and n_objs > 0:
+                from_persistent = rng.randint(0, min(len(persistent_objects), n_objs))
+            else:
+                from_persistent = 0
+            from_transient = n_objs - from_persistent
+
+            detections = []
+            chosen_persistent = rng.sample(persistent_objects, from_persistent) if from_persistent else []
+            for p_obj in chosen_persistent:
+                coords = jitter_coords(
+                    base_x=p_obj["coordinates"]["x"],
+                    base_y=p_obj["coordinates"]["y"],
+                    base_z=p_obj["coordinates"]["z"],
+                    rng=rng
+                )
+                detections.append({
+                    "residence_id": residence_id,
+                    "name": p_obj["name"],
+                    "type": p_obj["type"],
+                    "color": p_obj["color"],
+                    "coordinates": coords,
+                    "scan_id": scan_id,
+                    "first_seen": scan_time,
+                    "last_seen": scan_time,
+                    "status": "ativo",
+                    "confidence": round(rng.uniform(0.6, 0.99), 3),
+                    "vision_hash": p_obj["vision_hash"]
+                })
+
+            for t in range(from_transient):
+                obj_name = f"{rng.choice(object_base_names)} (scan{str(s_idx+1)})"
+                coords = jitter_coords(rng=rng, base_x=rng.uniform(0,4), base_y=rng.uniform(0,4), base_z=rng.uniform(0,1))
+                detections.append({
+                    "residence_id": residence_id,
+                    "name": obj_name,
+                    "type": rng.choice(object_types),
+                    "color": rng.choice(colors),
+                    "coordinates": coords,
+                    "scan_id": scan_id,
+                    "first_seen": scan_time,
+                    "last_seen": scan_time,
+                    "status": "ativo",
+                    "confidence": round(rng.uniform(0.5, 0.98), 3),
+                    "vision_hash": make_vision_hash(obj_name, coords, rng=id_rng)
+                })
+
+            for obj, vision_hash in zip(detections, matcher.match(detections, scan_time, keep=objects_by_hash)):
+                if vision_hash is not None:
+                    obj["vision_hash"] = vision_hash
+
+            # mesma regra do modo sequencial: objeto já visto só atualiza
+            # last_seen/scan_id/coordinates/confidence
+            detected_this_scan = []
+            for obj in detections:
+                existing = objects_by_hash.get(obj["vision_hash"])
+                if existing is None:
+                    obj["_id"] = new_object_id(id_rng, scan_time)
+                    objects_by_hash[obj["vision_hash"]] = obj
+                    bundle["objects"].append(obj)
+                else:
+                    existing.update({
+                        "last_seen": obj["last_seen"],
+                        "scan_id": scan_id,
+                        "coordinates": obj["coordinates"],
+                        "confidence": obj["confidence"]
+                    })
+                detected_this_scan.append((objects_by_hash[obj["vision_hash"]], obj))
+
+            scan_doc["objects_detected_count"] = len(detected_this_scan)
+
+            for (stored, obj) in detected_this_scan:
+                num_hist = rng.randint(0, MAX_HISTORY_ENTRIES_PER_OBJECT)
+                for h in range(num_hist):
+                    action_time = obj["last_seen"] + timedelta(minutes=rng.randint(1, 60*(h+1)))
+                    action_type = rng.choices(
+                        ["moved", "renamed", "color_changed", "removed", "status_update"],
+                        weights=[0.4, 0.15, 0.15, 0.05, 0.25],
+                        k=1
+                    )[0]
+                    # só os campos da ação entram no documento (formato esparso)
+                    changes = {}
+                    if action_type == "moved":
+                        old_coords = obj["coordinates"]
+                        new_coords = jitter_coords(rng=rng, base_x=old_coords["x"], base_y=old_coords["y"], base_z=old_coords["z"])
+                        changes = {"old_coordinates": old_coords, "new_coordinates": new_coords}
+                        notes = f"Objeto movido dentro da residência {res_name}."
+                        stored.update({"coordinates": new_coords, "last_seen": action_time})
+                    elif action_type == "renamed":
+                        old_name = obj["name"]
+                        new_name = old_name + " (renomeado)"
+                        changes = {"old_name": old_name, "new_name": new_name}
+                        notes = "Nome alterado pelo usuário."
+                        stored.update({"name": new_name, "last_seen": action_time})
+                    elif action_type == "color_changed":
+                        old_color = obj["color"]
+                        new_color = rng.choice([c for c in colors if c != old_color])
+                        changes = {"old_color": old_color, "new_color": new_color}
+                        notes = "Cor atualizada após nova detecção."
+                        stored.update({"color": new_color, "last_seen": action_time})
+                    elif action_type == "removed":
+                        notes = "Objeto removido."
+                        stored.update({"status": "removido", "last_seen": action_time})
+                    else:
+                        notes = "Atualização de status automática."
+                        stored.update({"last_seen": action_time})
+
+                    history_doc = history_event(
+                        stored["_id"], action_type, user_id, action_time, notes,
+                        _id=new_object_id(id_rng, action_time), **changes
+                    )
+                    bundle["history"].append(history_doc)
+
+            for stored, _ in detected_this_scan:
+                matcher.upsert(stored)
+
+        # objetos persistentes que nunca apareceram em um scan
+        for p_obj in persistent_objects:
+            if p_obj["vision_hash"] not in objects_by_hash:
+                p_obj_doc = p_obj.copy()
+                p_obj_doc.update({
+                    "_id": new_object_id(id_rng, residence_doc["created_at"]),
+                    "scan_id": None,
+                    "first_seen": residence_doc["created_at"],
+                    "last_seen": residence_doc["created_at"],
+                })
+                objects_by_hash[p_obj["vision_hash"]] = p_obj_doc
+                bundle["objects"].append(p_obj_doc)
+
+    return bundle
+
+
+def _write_errors(exc):
+    return exc.details.get("writeErrors", [])
+
+
+def insert_batch(col, docs, ordered=False, on_duplicate=None):
+    """Insere um lote com insert_many e inspeciona os erros do lote.
+
+    Erros de chave duplicada são entregues a `on_duplicate(doc)`, que devolve
+    o documento corrigido para reenvio (ou None para descartá-lo). No modo
+    ordenado o servidor para no primeiro erro, então os documentos seguintes
+    voltam para o próximo envio. Retorna (inseridos, descartados).
+    """
+    inserted = 0
+    dropped = []
+    pending = docs
+    while pending:
+        try:
+            col.insert_many(pending, ordered=ordered)
+            inserted += len(pending)
+            break
+        except BulkWriteError as exc:
+            count, pending = _resolve_write_errors(exc, pending, ordered, on_duplicate, dropped)
+            inserted += count
+    return inserted, dropped
+
+
+def _is_id_conflict(err):
+    key_pattern = err.get("keyPattern")
+    if key_pattern is not None:
+        return list(key_pattern) == ["_id"]
+    return "index: _id_ " in err.get("errmsg", "")
+
+
+def _resolve_write_errors(exc, pending, ordered, on_duplicate, dropped):
+    """Separa os documentos de um lote com erro em reenvio/descartados.
+
+    Retorna (inseridos no lote, documentos a reenviar); os descartados são
+    acrescentados a `dropped`. Erros que não são de chave duplicada sobem.
+    """
+    errors = _write_errors(exc)
+    failed = {e["index"] for e in errors}
+    retry = []
+    for err in errors:
+        doc = pending[err["index"]]
+        fixed = None
+        if err.get("code") == DUPLICATE_KEY and _is_id_conflict(err):
+            # o mesmo _id já está no banco (carga repetida com a mesma --seed): nada a corrigir
+            pass
+        elif err.get("code") == DUPLICATE_KEY and on_duplicate is not None:
+            fixed = on_duplicate(doc)
+        elif err.get("code") != DUPLICATE_KEY:
+            raise exc
+        if fixed is None:
+            dropped.append(doc)
+        else:
+            retry.append(fixed)
+    if ordered and errors:
+        # documentos depois do erro não foram tentados
+        last = max(failed)
+        retry.extend(pending[last + 1:])
+    return exc.details.get("nInserted", 0), retry
+
+
+async def insert_batch_async(col, docs, ordered=False, on_duplicate=None):
+    """Mesmo que insert_batch, para uma coleção do AsyncMongoClient."""
+    inserted = 0
+    dropped = []
+    pending = docs
+    while pending:
+        try:
+            await col.insert_many(pending, ordered=ordered)
+            inserted += len(pending)
+            break
+        except BulkWriteError as exc:
+            count, pending = _resolve_write_errors(exc, pending, ordered, on_duplicate, dropped)
+            inserted += count
+    return inserted, dropped
+
+
+class BulkSeeder:
+    """Acumula os documentos gerados e descarrega em lotes de `batch_size`.
+
+    O descarregamento sempre segue COLLECTION_ORDER para que os objetos
+    reaproveitados (chave duplicada vision_hash+residence_id contra dados já
+    existentes) sejam remapeados antes do histórico que aponta para eles.
+    """
+
+    def __init__(self, db, batch_size=DEFAULT_BATCH_SIZE, ordered=False):
+        self.db = db
+        self.batch_size = batch_size
+        self.ordered = ordered
+        self.buffers = new_bundle()
+        self.totals = {name: 0 for name in COLLECTION_ORDER}
+        # segundos gastos em escrita por coleção (usado pelo bench.py)
+        self.write_seconds = {name: 0.0 for name in COLLECTION_ORDER}
+        self.object_remap = {}
+
+    def add(self, bundle):
+        for name in COLLECTION_ORDER:
+            self.buffers[name].extend(bundle[name])
+        if any(len(buf) >= self.batch_size for buf in self.buffers.values()):
+            self.flush()
+
+    def flush(self):
+        for name in COLLECTION_ORDER:
+            docs = self.buffers[name]
+            self.buffers[name] = []
+            if name == "history" and self.object_remap:
+                for doc in docs:
+                    doc["object_id"] = self.object_remap.get(doc["object_id"], doc["object_id"])
+            started = time.perf_counter()
+            for start in range(0, len(docs), self.batch_size):
+                batch = docs[start:start + self.batch_size]
+                inserted, dropped = insert_batch(
+                    self.db[name], batch, self.ordered, self._duplicate_handler(name)
+                )
+                self.totals[name] += inserted
+                if name == "objects" and dropped:
+                    self._merge_existing_objects(dropped)
+            self.write_seconds[name] += time.perf_counter() - started
+
+    def _duplicate_handler(self, name):
+        if name == "users":
+            # caso raro de e-mail duplicado: mesmo _id, e-mail com sufixo
+            def fix_user(doc):
+                local, domain = doc["email"].split("@", 1)
+                doc["email"] = f"{local}.{uuid.uuid4().hex[:6]}@{domain}"
+                return doc
+            return fix_user
+        if name == "scans":
+            # timestamp colidiu com um scan já existente: desloca alguns segundos
+            def fix_scan(doc):
+                doc["timestamp"] = doc["timestamp"] + timedelta(seconds=random.randint(1, 300))
+                return doc
+            return fix_scan
+        # objects: tratado depois do lote em _merge_existing_objects
+        # history: sem índice único; duplicata é descartada
+        return lambda doc: None
+
+    def _merge_existing_objects(self, dropped):
+        """Atualiza os objetos que já existiam no banco com um único bulk_write."""
+        existing = self.db.objects.find(existing_objects_filter(dropped), {"vision_hash": 1, "residence_id": 1})
+        ops = existing_object_updates(dropped, existing, self.object_remap)
+        if ops:
+            result = self.db.objects.bulk_write(ops, ordered=self.ordered)
+            self.totals["objects"] += result.modified_count
+
+
+def existing_objects_filter(dropped):
+    return {"$or": [{"vision_hash": d["vision_hash"], "residence_id": d["residence_id"]} for d in dropped]}
+
+
+def existing_object_updates(dropped, existing_docs, remap):
+    """UpdateOne para cada objeto rejeitado por já existir; registra o _id real em `remap`."""
+    existing = {(e["vision_hash"], e["residence_id"]): e["_id"] for e in existing_docs}
+    ops = []
+    for doc in dropped:
+        existing_id = existing.get((doc["vision_hash"], doc["residence_id"]))
+        if existing_id is None:
+            continue
+        remap[doc["_id"]] = existing_id
+        ops.append(UpdateOne({"_id": existing_id}, {"$set": {
+            "last_seen": doc["last_seen"],
+            "scan_id": doc["scan_id"],
+            "coordinates": doc["coordinates"],
+            "confidence": doc["confidence"]
+        }}))
+    return ops
+
+
+class AsyncBulkSeeder(BulkSeeder):
+    """BulkSeeder sobre o AsyncMongoClient: cada bloco é gravado em uma task.
+
+    Blocos diferentes são independentes (cada usuário carrega seus próprios
+    objetos e histórico), então vários podem estar em voo ao mesmo tempo; dentro
+    de um bloco a ordem de COLLECTION_ORDER é mantida.
+    """
+
+    async def write_chunk(self, chunk):
+        for name in COLLECTION_ORDER:
+            docs = chunk[name]
+            if name == "history" and self.object_remap:
+                for doc in docs:
+                    doc["object_id"] = self.object_remap.get(doc["object_id"], doc["object_id"])
+            started = time.perf_counter()
+            for start in range(0, len(docs), self.batch_size):
+                batch = docs[start:start + self.batch_size]
+                inserted, dropped = await insert_batch_async(
+                    self.db[name], batch, self.ordered, self._duplicate_handler(name)
+                )
+                self.totals[name] += inserted
+                if name == "objects" and dropped:
+                    await self._merge_existing_objects_async(dropped)
+            self.write_seconds[name] += time.perf_counter() - started
+
+    async def _merge_existing_objects_async(self, dropped):
+        cursor = self.db.objects.find(existing_objects_filter(dropped), {"vision_hash": 1, "residence_id": 1})
+        ops = existing_object_updates(dropped, await cursor.to_list(None), self.object_remap)
+        if ops:
+            result = await self.db.objects.bulk_write(ops, ordered=self.ordered)
+            self.totals["objects"] += result.modified_count
+
+
+def base_date_for(seed):
+    # com seed a data base é fixa, senão os dados mudariam a cada execução
+    if seed is None:
+        return datetime.utcnow() - timedelta(days=120)
+    return SEEDED_BASE_DATE
+
+
+def generate_bundles(start, stop, seed=None, base_start_date=None):
+    """Gera os bundles dos usuários [start, stop)."""
+    base_start_date = base_start_date or base_date_for(seed)
+    for u_idx in range(start, stop):
+        rng = user_rng(seed, u_idx) if seed is not None else None
+        yield build_user_bundle(u_idx, base_start_date, rng=rng)
+
+
+def seed_bulk(db, num_users=NUM_USERS, batch_size=DEFAULT_BATCH_SIZE, ordered=False, seed=None, start=0):
+    seeder = BulkSeeder(db, batch_size=batch_size, ordered=ordered)
+    for bundle in generate_bundles(start, start + num_users, seed=seed):
+        seeder.add(bundle)
+    seeder.flush()
+    return seeder.totals
+
+
+def next_chunk(bundles, batch_size):
+    """Junta bundles até algum buffer chegar a `batch_size` (None quando acabarem)."""
+    chunk = new_bundle()
+    empty = True
+    for bundle in bundles:
+        empty = False
+        for name in COLLECTION_ORDER:
+            chunk[name].extend(bundle[name])
+        if any(len(docs) >= batch_size for docs in chunk.values()):
+            break
+    return None if empty else chunk
+
+
+async def seed_async(num_users=NUM_USERS, batch_size=DEFAULT_BATCH_SIZE, ordered=False, seed=None,
+                     in_flight=DEFAULT_IN_FLIGHT, event_listeners=None):
+    """Modo bulk em que a geração do próximo bloco se sobrepõe às escritas em voo.
+
+    A geração roda em uma thread (asyncio.to_thread) enquanto o event loop
+    atende as respostas do servidor; até `in_flight` blocos ficam pendentes.
+    """
+    client = async_client(MONGO_URI, event_listeners=event_listeners)
+    try:
+        seeder = AsyncBulkSeeder(client[DB_NAME], batch_size=batch_size, ordered=ordered)
+        bundles = generate_bundles(0, num_users, seed=seed)
+        tasks = set()
+        while True:
+            chunk = await asyncio.to_thread(next_chunk, bundles, batch_size)
+            if chunk is None:
+                break
+            if len(tasks) >= in_flight:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+            tasks.add(asyncio.create_task(seeder.write_chunk(chunk)))
+        if tasks:
+            await asyncio.gather(*tasks)
+        return seeder.totals
+    finally:
+        await client.close()
+
+
+# ---------------------------------------------------------------------------
+# Modo paralelo: o intervalo de usuários é dividido em shards, cada um gerado
+# em um processo com seu próprio MongoClient. Como o RNG é por usuário, a mesma
+# --seed produz os mesmos documentos com qualquer número de workers.
+# ---------------------------------------------------------------------------
+
+def split_shards(num_users, num_shards):
+    size, extra = divmod(num_users, num_shards)
+    shards = []
+    start = 0
+    for i in range(num_shards):
+        stop = start + size + (1 if i < extra else 0)
+        if stop > start:
+            shards.append((start, stop))
+        start = stop
+    return shards
+
+
+def seed_shard(start, stop, seed, batch_size, ordered):
+    # executado no processo filho: MongoClient não pode ser compartilhado via fork
+    profiler = QueryProfiler(explain=False)
+    client = MongoClient(MONGO_URI, server_api=ServerApi('1'), event_listeners=[profiler])
+    try:
+        seeder = BulkSeeder(client[DB_NAME], batch_size=batch_size, ordered=ordered)
+        for bundle in generate_bundles(start, stop, seed=seed):
+            seeder.add(bundle)
+        seeder.flush()
+        # as métricas do processo filho voltam serializadas para o processo principal
+        return seeder.totals, profiler.export()
+    finally:
+        client.close()
+
+
+def seed_parallel(num_users=NUM_USERS, workers=None, shards=None, seed=None,
+                  batch_size=DEFAULT_BATCH_SIZE, ordered=False, profiler=None):
+    workers = workers or os.cpu_count() or 1
+    shards = split_shards(num_users, shards or workers)
+    totals = {name: 0 for name in COLLECTION_ORDER}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(seed_shard, start, stop, seed, batch_size, ordered)
+            for start, stop in shards
+        ]
+        for future in as_completed(futures):
+            shard_totals, shard_profile = future.result()
+            for name, count in shard_totals.items():
+                totals[name] += count
+            if profiler is not None:
+                profiler.merge(shard_profile)
+    return totals
+
+
+# ---------------------------------------------------------------------------
+# Exportação offline: grava os documentos gerados direto em arquivos, sem
+# banco. O layout é o mesmo de base_completa/map_app_db (<coleção>.bson +
+# <coleção>.metadata.json), compatível com mongorestore. Opcionalmente grava
+# também <coleção>.parquet (requer pyarrow).
+# ---------------------------------------------------------------------------
+
+def create_export_indexes(db):
+    for name, specs in EXPORT_INDEXES.items():
+        models = index_models(specs)
+        if models:
+            db[name].create_indexes(models)
+
+
+def parquet_schemas(pa):
+    xyz = pa.struct([("x", pa.float64()), ("y", pa.float64()), ("z", pa.float64())])
+    ts = pa.timestamp("ms")
+    oid = pa.string()
+    return {
+        "users": pa.schema([
+            ("_id", oid), ("name", pa.string()), ("email", pa.string()),
+            ("password_hash", pa.string()), ("created_at", ts),
+            ("preferences", pa.struct([("voice", pa.string()), ("language", pa.string())])),
+        ]),
+        "residences": pa.schema([
+            ("_id", oid), ("user_id", oid), ("name", pa.string()), ("address", pa.string()),
+            ("description", pa.string()), ("created_at", ts),
+            ("metadata", pa.struct([("area_m2", pa.int64())])),
+        ]),
+        "scans": pa.schema([
+            ("_id", oid), ("residence_id", oid), ("user_id", oid), ("timestamp", ts),
+            ("camera_meta", pa.struct([("device", pa.string()), ("fov", pa.int64()), ("position", xyz)])),
+            ("objects_detected_count", pa.int64()),
+        ]),
+        "objects": pa.schema([
+            ("_id", oid), ("residence_id", oid), ("name", pa.string()), ("type", pa.string()),
+            ("color", pa.string()), ("coordinates", xyz), ("scan_id", oid),
+            ("first_seen", ts), ("last_seen", ts), ("status", pa.string()),
+            ("confidence", pa.float64()), ("vision_hash", pa.string()),
+        ]),
+        "history": pa.schema([
+            ("_id", oid), ("object_id", oid), ("action_type", pa.string()), ("performed_by", oid),
+            ("timestamp", ts), ("notes", pa.string()),
+            ("old_coordinates", xyz), ("new_coordinates", xyz),
+            ("old_color", pa.string()), ("new_color", pa.string()),
+            ("old_name", pa.string()), ("new_name", pa.string()),
+        ]),
+    }
+
+
+def _parquet_value(value):
+    # ObjectId vira hex; dicts aninhados viram struct
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, dict):
+        return {k: _parquet_value(v) for k, v in value.items()}
+    return value
+
+
+class CollectionFileWriter:
+    """Escreve uma coleção em <nome>.bson (e opcionalmente <nome>.parquet).
+
+    Os documentos ficam num buffer de `buffer_size` itens e são descarregados
+    quando ele enche, então a memória não cresce com o volume gerado.
+    """
+
+    def __init__(self, out_dir, name, buffer_size=DEFAULT_BATCH_SIZE, parquet=False):
+        self.name = name
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.count = 0
+        self.bson_file = open(os.path.join(out_dir, f"{name}.bson"), "wb")
+        self.parquet_writer = None
+        if parquet:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise SystemExit("Exportação Parquet requer pyarrow: pip install pyarrow")
+            self._pa = pa
+            self.schema = parquet_schemas(pa)[name]
+            self.parquet_writer = pq.ParquetWriter(os.path.join(out_dir, f"{name}.parquet"), self.schema)
+
+    def write(self, docs):
+        self.buffer.extend(docs)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        self.bson_file.write(b"".join(encode(doc) for doc in self.buffer))
+        if self.parquet_writer is not None:
+            rows = [{k: _parquet_value(doc.get(k)) for k in self.schema.names} for doc in self.buffer]
+            self.parquet_writer.write_table(self._pa.Table.from_pylist(rows, schema=self.schema))
+        self.count += len(self.buffer)
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.bson_file.close()
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+
+
+def write_metadata(out_dir, name):
+    metadata = {"indexes": EXPORT_INDEXES[name], "collectionName": name, "type": "collection"}
+    with open(os.path.join(out_dir, f"{name}.metadata.json"), "w", encoding="utf-8") as f:
+        f.write(json_util.dumps(metadata, json_options=json_util.CANONICAL_JSON_OPTIONS, separators=(",", ":")))
+
+
+def export_dataset(out_dir, bundles, buffer_size=DEFAULT_BATCH_SIZE, parquet=False):
+    """Consome os bundles um a um e grava cada coleção em arquivo."""
+    os.makedirs(out_dir, exist_ok=True)
+    writers = {name: CollectionFileWriter(out_dir, name, buffer_size, parquet) for name in COLLECTION_ORDER}
+    try:
+        for bundle in bundles:
+            for name in COLLECTION_ORDER:
+                writers[name].write(bundle[name])
+    finally:
+        for writer in writers.values():
+            writer.close()
+    for name in COLLECTION_ORDER:
+        write_metadata(out_dir, name)
+    return {name: writer.count for name, writer in writers.items()}
+
+
+def export_main(out_dir, num_users=NUM_USERS, seed=None, buffer_size=DEFAULT_BATCH_SIZE, parquet=False):
+    print(f"Exportando {num_users} usuários para {out_dir} ...")
+    totals = export_dataset(out_dir, generate_bundles(0, num_users, seed=seed),
+                            buffer_size=buffer_size, parquet=parquet)
+    print("==== Exportação finalizada ====")
+    for name in COLLECTION_ORDER:
+        print(f"{name}: {totals[name]} documentos")
+    print(f"Restaure com: mongorestore --drop --db <banco> --dir \"{out_dir}\"")
+
+
+def print_bulk_summary(totals):
+    print("==== População finalizada (bulk) ====")
+    print(f"Usuários criados: {totals['users']}")
+    print(f"Residências criadas: {totals['residences']}")
+    print(f"Scans criados: {totals['scans']}")
+    print(f"Objetos criados/atualizados: {totals['objects']}")
+    print(f"Entradas de histórico criadas: {totals['history']}")
+    print("Resumos (residence_stats/object_stats) atualizados.")
+    print("Concluído.")
+
+
+def print_profile(profiler):
+    # tempo por forma de comando (insert/update/find...), do mais lento (p95) ao mais rápido
+    print("==== Comandos executados ====")
+    print(profiler.format_table())
+
+
+def store_scans(db, drop_source=False):
+    """Copia os scans dos modos bulk/paralelo/async (gravados em `scans`) para a
+    coleção do modo SCAN_STORAGE (buckets/timeseries).
+
+    O modo sequencial já grava direto no destino (ingest_scan) e não passa por aqui.
+    """
+    mode = storage_mode()
+    if mode == DOCUMENTS:
+        return
+    copied = migrate_scans(db, mode, drop_source=drop_source)
+    print(f"Scans copiados para {scan_collection(mode)} ({mode}): {copied} documentos")
+    if not drop_source:
+        print("A coleção scans foi mantida; use --drop-scans para removê-la (sem isso, a próxima carga copia esses scans de novo).")
+
+
+def main(bulk=False, batch_size=DEFAULT_BATCH_SIZE, ordered=False, num_users=NUM_USERS,
+         seed=None, workers=None, shards=None, use_async=False, in_flight=DEFAULT_IN_FLIGHT,
+         drop_scans=False):
+    # o seeder só escreve, então não há por que rodar explain
+    profiler = QueryProfiler(explain=False)
+    client = MongoClient(MONGO_URI, server_api=ServerApi('1'), event_listeners=[profiler])
 
     print("Conectando ao MongoDB ...")
     try:
@@ -73,11 +846,38 @@ def main():
     
     db = client[DB_NAME]
 
+    if workers:
+        if seed is None:
+            seed = random.randrange(2**32)
+        print(f"Gerando {num_users} usuários em {workers} processos (seed={seed}) ...")
+        totals = seed_parallel(num_users=num_users, workers=workers, shards=shards, seed=seed,
+                               batch_size=batch_size, ordered=ordered, profiler=profiler)
+        store_scans(db, drop_source=drop_scans)
+        rebuild_stats(db)
+        print_bulk_summary(totals)
+        print_profile(profiler)
+        return
+
+    if use_async:
+        totals = asyncio.run(seed_async(num_users=num_users, batch_size=batch_size, ordered=ordered,
+                                        seed=seed, in_flight=in_flight, event_listeners=[profiler]))
+        store_scans(db, drop_source=drop_scans)
+        rebuild_stats(db)
+        print_bulk_summary(totals)
+        print_profile(profiler)
+        return
+
+    if bulk:
+        totals = seed_bulk(db, num_users=num_users, batch_size=batch_size, ordered=ordered, seed=seed)
+        store_scans(db, drop_source=drop_scans)
+        rebuild_stats(db)
+        print_bulk_summary(totals)
+        print_profile(profiler)
+        return
+
     users_col = db.users
     residences_col = db.residences
-    scans_col = db.scans
     objects_col = db.objects
-    history_col = db.history
 
     # Contadores para imprimir ao final
     total_users = 0
@@ -88,7 +888,7 @@ def main():
 
     base_start_date = datetime.utcnow() - timedelta(days=120)
 
-    for u_idx in range(NUM_USERS):
+    for u_idx in range(num_users):
         # Criar usuário
         first = random.choice(first_names)
         last = random.choice(last_names)
@@ -132,6 +932,7 @@ def main():
             }
             res_res = residences_col.insert_one(residence_doc)
             residence_id = res_res.inserted_id
+            apply_stat_ops(db, residence_stat_ops(residence_doc))
             total_residences += 1
 
             # Para manter alguns "objetos comuns" por residência para termos repetições entre scans
@@ -159,6 +960,11 @@ def main():
                 }
                 persistent_objects.append(obj_doc)
 
+            # residência nova: o índice de deduplicação começa só com o catálogo
+            matcher = ResidenceMatcher()
+            for p_obj in persistent_objects:
+                matcher.upsert(p_obj)
+
             # Scans
             num_scans = random.randint(MIN_SCANS_PER_RES, MAX_SCANS_PER_RES)
             scan_start_date = base_start_date + timedelta(days=random.randint(0, 60))
@@ -176,18 +982,12 @@ def main():
                         "fov": random.choice([90, 100, 110, 120]),
                         "position": {"x": round(random.uniform(0,4),3), "y": round(random.uniform(0,4),3), "z": round(random.uniform(0.5,2.0),3)}
                     },
-                    "objects_detected_count": 0  # atualizaremos após detectar
+                    "objects_detected_count": 0  # definido por ingest_scan
                 }
 
-                # Inserir scan (cuidando de unique index residence+timestamp)
-                try:
-                    scan_res = scans_col.insert_one(scan_doc)
-                except DuplicateKeyError:
-                    # se timestamp colidir, desloca por alguns segundos e tenta de novo
-                    scan_doc["timestamp"] = scan_time + timedelta(seconds=random.randint(1,300))
-                    scan_res = scans_col.insert_one(scan_doc)
-
-                scan_id = scan_res.inserted_id
+                # _id definido aqui para os objetos já apontarem para o scan;
+                # a gravação acontece em ingest_scan junto com os objetos
+                scan_id = scan_doc["_id"] = ObjectId()
                 total_scans += 1
 
                 # quantos objetos este scan detecta? pode ser 0 (cenário pedido)
@@ -249,52 +1049,25 @@ def main():
                     }
                     scan_objects.append(obj_doc)
 
-                # inserir objetos detectados neste scan (tratando possíveis duplicatas/unique index vision_hash+residence_id)
-                inserted_ids_this_scan = []
-                for obj in scan_objects:
-                    try:
-                        res = objects_col.insert_one(obj)
-                        obj_id = res.inserted_id
-                        total_objects += 1
-                        inserted_ids_this_scan.append((obj_id, obj))
-                        # rastrear por vision_hash
-                        inserted_objects_by_hash[obj["vision_hash"]] = {
-                            "object_id": obj_id,
-                            "last_seen": obj["last_seen"],
-                            "name": obj["name"],
-                            "color": obj["color"],
-                            "coordinates": obj["coordinates"]
-                        }
-                    except DuplicateKeyError:
-                        # Já existe um objeto com mesmo vision_hash e residence_id.
-                        # Podemos atualizar o last_seen/scan_id para manter histórico coerente.
-                        existing = objects_col.find_one({"vision_hash": obj["vision_hash"], "residence_id": residence_id})
-                        if existing:
-                            update_doc = {
-                                "$set": {
-                                    "last_seen": obj["last_seen"],
-                                    "scan_id": scan_id,
-                                    "coordinates": obj["coordinates"],
-                                    "confidence": obj["confidence"]
-                                }
-                            }
-                            objects_col.update_one({"_id": existing["_id"]}, update_doc)
-                            inserted_ids_this_scan.append((existing["_id"], obj))
-                            inserted_objects_by_hash[obj["vision_hash"]] = {
-                                "object_id": existing["_id"],
-                                "last_seen": obj["last_seen"],
-                                "name": obj["name"],
-                                "color": obj["color"],
-                                "coordinates": obj["coordinates"]
-                            }
-                        else:
-                            # Caso raro onde procura por doc similar por visão falha -> ignora para evitar crash
-                            continue
-
-                # Atualiza campo objects_detected_count no scan
-                scans_col.update_one({"_id": scan_id}, {"$set": {"objects_detected_count": len(inserted_ids_this_scan)}})
+                # grava o scan e reconcilia os objetos detectados em lote
+                # (um $in + um bulk_write, tratando o unique index vision_hash+residence_id)
+                result = ingest_scan(db, residence_id, scan_doc, scan_objects, matcher=matcher)
+                total_objects += result["inserted"]
+                inserted_ids_this_scan = list(zip(result["object_ids"], scan_objects))
+                hash_of = dict(zip(result["object_ids"], result["vision_hashes"]))
+                for obj_id, obj in inserted_ids_this_scan:
+                    inserted_objects_by_hash[hash_of[obj_id]] = {
+                        "object_id": obj_id,
+                        "last_seen": obj["last_seen"],
+                        "name": obj["name"],
+                        "color": obj["color"],
+                        "coordinates": obj["coordinates"]
+                    }
 
                 # Gerar histórico aleatório para alguns objetos (moved, renamed, color change, removed)
+                # eventos e updates dos objetos vão ao banco juntos, uma vez por scan
+                history_docs = []
+                object_sets = {}
                 for (obj_id, obj) in inserted_ids_this_scan:
                     # criar 0..MAX_HISTORY_ENTRIES_PER_OBJECT entradas ao longo do tempo
                     num_hist = random.randint(0, MAX_HISTORY_ENTRIES_PER_OBJECT)
@@ -305,57 +1078,42 @@ def main():
                             weights=[0.4, 0.15, 0.15, 0.05, 0.25],
                             k=1
                         )[0]
-                        history_doc = {
-                            "object_id": obj_id,
-                            "action_type": action_time and action_type or "moved",  # ensure non-empty
-                            "performed_by": user_id,
-                            "timestamp": action_time,
-                            "notes": "",
-                            "old_coordinates": None,
-                            "new_coordinates": None,
-                            "old_color": None,
-                            "new_color": None,
-                            "old_name": None,
-                            "new_name": None
-                        }
 
+                        changes = {}
                         if action_type == "moved":
                             old_coords = obj["coordinates"]
                             new_coords = jitter_coords(base_x=old_coords["x"], base_y=old_coords["y"], base_z=old_coords["z"])
-                            history_doc["old_coordinates"] = old_coords
-                            history_doc["new_coordinates"] = new_coords
-                            history_doc["notes"] = f"Objeto movido dentro da residência {res_name}."
-                            # também atualiza objeto no banco
-                            objects_col.update_one({"_id": obj_id}, {"$set": {"coordinates": new_coords, "last_seen": action_time}})
+                            changes = {"old_coordinates": old_coords, "new_coordinates": new_coords}
+                            notes = f"Objeto movido dentro da residência {res_name}."
+                            update = {"coordinates": new_coords, "last_seen": action_time}
                         elif action_type == "renamed":
                             old_name = obj["name"]
                             new_name = old_name + " (renomeado)"
-                            history_doc["old_name"] = old_name
-                            history_doc["new_name"] = new_name
-                            history_doc["notes"] = "Nome alterado pelo usuário."
-                            objects_col.update_one({"_id": obj_id}, {"$set": {"name": new_name, "last_seen": action_time}})
+                            changes = {"old_name": old_name, "new_name": new_name}
+                            notes = "Nome alterado pelo usuário."
+                            update = {"name": new_name, "last_seen": action_time}
                         elif action_type == "color_changed":
                             old_color = obj["color"]
                             new_color = random.choice([c for c in colors if c != old_color])
-                            history_doc["old_color"] = old_color
-                            history_doc["new_color"] = new_color
-                            history_doc["notes"] = "Cor atualizada após nova detecção."
-                            objects_col.update_one({"_id": obj_id}, {"$set": {"color": new_color, "last_seen": action_time}})
+                            changes = {"old_color": old_color, "new_color": new_color}
+                            notes = "Cor atualizada após nova detecção."
+                            update = {"color": new_color, "last_seen": action_time}
                         elif action_type == "removed":
-                            history_doc["notes"] = "Objeto removido."
-                            objects_col.update_one({"_id": obj_id}, {"$set": {"status": "removido", "last_seen": action_time}})
+                            notes = "Objeto removido."
+                            update = {"status": "removido", "last_seen": action_time}
                         else:
                             # status_update or other small event
-                            history_doc["notes"] = "Atualização de status automática."
-                            objects_col.update_one({"_id": obj_id}, {"$set": {"last_seen": action_time}})
+                            notes = "Atualização de status automática."
+                            update = {"last_seen": action_time}
 
-                        # Inserir histórico
-                        try:
-                            history_col.insert_one(history_doc)
-                            total_history += 1
-                        except DuplicateKeyError:
-                            # raríssimo: continuar
-                            continue
+                        history_docs.append(history_event(obj_id, action_type, user_id, action_time, notes, **changes))
+                        # o último evento de cada campo vence, como nos update_one sequenciais
+                        object_sets.setdefault(obj_id, {}).update(update)
+
+                # grava eventos e updates e mantém os resumos (eventos por ação, mudanças de status)
+                total_history += record_object_events(db, residence_id, history_docs, object_sets)
+                for obj_id, fields in object_sets.items():
+                    matcher.upsert(dict(fields, vision_hash=hash_of[obj_id]))
 
             # Após todos os scans, garantir que os objetos persistentes sejam inseridos se nunca apareceram
             for p_obj in persistent_objects:
@@ -369,6 +1127,7 @@ def main():
                     })
                     try:
                         res = objects_col.insert_one(p_obj_doc)
+                        apply_stat_ops(db, object_stat_ops(p_obj_doc))
                         total_objects += 1
                         inserted_objects_by_hash[p_obj["vision_hash"]] = {
                             "object_id": res.inserted_id,
@@ -378,13 +1137,41 @@ def main():
                         # se já existir ok
                         continue
 
+    # os resumos já foram mantidos a cada escrita e os scans já estão na coleção do modo
+
     print("==== População finalizada ====")
     print(f"Usuários criados: {total_users}")
     print(f"Residências criadas: {total_residences}")
     print(f"Scans criados: {total_scans}")
     print(f"Objetos criados/atualizados: {total_objects}")
     print(f"Entradas de histórico criadas: {total_history}")
+    print("Resumos (residence_stats/object_stats) atualizados.")
     print("Concluído.")
+    print_profile(profiler)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Popula o banco com dados sintéticos.")
+    parser.add_argument("--users", type=int, default=NUM_USERS, help="quantidade de usuários gerados")
+    parser.add_argument("--bulk", action="store_true", help="gera em memória e grava em lotes (insert_many/bulk_write)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="documentos por lote no modo bulk")
+    parser.add_argument("--ordered", action="store_true", help="usa lotes ordenados (padrão: não ordenados)")
+    parser.add_argument("--seed", type=int, default=None, help="seed para geração determinística (modos bulk/paralelo)")
+    parser.add_argument("--workers", type=int, default=None, help="processos para geração em shards (implica modo bulk)")
+    parser.add_argument("--shards", type=int, default=None, help="quantidade de shards (padrão: igual a --workers)")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="modo bulk com AsyncMongoClient: gera o próximo lote enquanto os anteriores são gravados")
+    parser.add_argument("--in-flight", type=int, default=DEFAULT_IN_FLIGHT, help="lotes gravando ao mesmo tempo no modo --async")
+    parser.add_argument("--drop-scans", action="store_true",
+                        help="com SCAN_STORAGE=timeseries/buckets, remove a coleção scans depois de copiar os scans gerados")
+    parser.add_argument("--export-dir", default=None, help="grava .bson/.metadata.json neste diretório em vez de usar o banco")
+    parser.add_argument("--parquet", action="store_true", help="com --export-dir, grava também arquivos .parquet")
+    args = parser.parse_args()
+
+    if args.export_dir:
+        export_main(args.export_dir, num_users=args.users, seed=args.seed,
+                    buffer_size=args.batch_size, parquet=args.parquet)
+        raise SystemExit(0)
+
+    main(bulk=args.bulk, batch_size=args.batch_size, ordered=args.ordered, num_users=args.users,
+         seed=args.seed, workers=args.workers, shards=args.shards,
+         use_async=args.use_async, in_flight=args.in_flight, drop_scans=args.drop_scans)
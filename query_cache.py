@@ -0,0 +1,123 @@
+"""
+Cache de resultados de consultas do dashboard
+
+- chave = coleção + operação + filtro + projeção + sort/limit (serializados)
+- TTL por coleção (dados que mudam pouco ficam mais tempo em cache)
+- tamanho máximo com descarte LRU
+- contadores de hit/miss para acompanhar a eficiência do cache
+
+Uma única instância é compartilhada entre as sessões do Streamlit, então
+vários analistas abrindo as mesmas telas geram uma consulta só no cluster.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from bson import json_util
+
+# segundos que um resultado fica válido, por coleção
+DEFAULT_TTLS = {
+    "users": 300,
+    "residences": 300,
+    "scans": 60,
+    "scans_ts": 60,
+    "scan_buckets": 60,
+    "objects": 30,
+    "history": 30,
+    "residence_stats": 30,
+    "object_stats": 30,
+}
+DEFAULT_TTL = 60
+DEFAULT_MAX_ENTRIES = 256
+
+
+def make_key(collection, operation, *parts):
+    # json_util lida com ObjectId/datetime; sort_keys deixa a chave estável
+    return (collection, operation, json_util.dumps(parts, sort_keys=True))
+
+
+class QueryCache:
+    def __init__(self, ttls=None, default_ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, clock=time.monotonic):
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()  # chave -> (expira_em, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def ttl_for(self, collection):
+        return self.ttls.get(collection, self.default_ttl)
+
+    def get_or_load(self, key, loader):
+        """Devolve o valor em cache para `key` ou chama `loader()` e guarda."""
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # a consulta roda fora do lock para não serializar as sessões
+        value = loader()
+
+        with self._lock:
+            self._entries[key] = (now + self.ttl_for(key[0]), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def find(self, col, filter=None, projection=None, sort=None, limit=0):
+        key = make_key(col.name, "find", filter or {}, projection, sort, limit)
+
+        def load():
+            cursor = col.find(filter or {}, projection)
+            if sort:
+                cursor = cursor.sort(sort)
+            if limit:
+                cursor = cursor.limit(limit)
+            return list(cursor)
+
+        return list(self.get_or_load(key, load))
+
+    def aggregate(self, col, pipeline):
+        key = make_key(col.name, "aggregate", pipeline)
+        return list(self.get_or_load(key, lambda: list(col.aggregate(pipeline))))
+
+    def distinct(self, col, field, filter=None):
+        key = make_key(col.name, "distinct", field, filter or {})
+        return list(self.get_or_load(key, lambda: col.distinct(field, filter or {})))
+
+    def count(self, col, filter=None):
+        # sem filtro usa os metadados da coleção (estimated_document_count)
+        key = make_key(col.name, "count", filter or {})
+        if filter:
+            return self.get_or_load(key, lambda: col.count_documents(filter))
+        return self.get_or_load(key, col.estimated_document_count)
+
+    def invalidate(self, collection=None):
+        """Remove as entradas de uma coleção ou, sem argumento, todas."""
+        with self._lock:
+            if collection is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[0] == collection]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
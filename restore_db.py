@@ -0,0 +1,180 @@
+"""
+Carga do dump (base_completa/map_app_db) sem o mongorestore
+
+Para cada <coleção>.bson + <coleção>.metadata.json do diretório:
+- o arquivo é mapeado em memória (mmap) e lido documento a documento com
+  bson.decode_file_iter, sem carregar o arquivo inteiro
+- os documentos vão em lotes de insert_many não ordenados, com uma thread por
+  coleção gravando em paralelo
+- os índices do .metadata.json são criados depois da carga, não antes, para
+  que cada insert não precise atualizar os índices secundários
+
+O progresso (bytes já gravados de cada arquivo) fica na coleção
+`restore_progress` do banco de destino. Se a carga for interrompida, a próxima
+execução continua do último lote confirmado; documentos de um lote que já
+tinham entrado são ignorados pela chave _id.
+
+Uso:
+    python restore_db.py                                # base_completa/map_app_db -> MONGODB_DB
+    python restore_db.py --dir .\\dump --db outro_banco --drop
+    python restore_db.py --migrate                      # aplica migrations.py ao final
+"""
+
+import argparse
+import mmap
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bson import decode_file_iter, json_util
+from pymongo.errors import BulkWriteError
+
+from common import DUPLICATE_KEY
+from migrations import index_models
+
+DEFAULT_DUMP_DIR = os.path.join("base_completa", "map_app_db")
+DEFAULT_BATCH_SIZE = 1000
+PROGRESS = "restore_progress"
+PROGRESS_INTERVAL = 1.0  # segundos entre linhas de progresso por coleção
+
+_print_lock = threading.Lock()
+
+
+def log(message):
+    with _print_lock:
+        print(message, flush=True)
+
+
+def dump_files(dump_dir):
+    """(coleção, caminho do .bson, especificações de índice) de cada coleção do dump."""
+    found = []
+    for name in sorted(os.listdir(dump_dir)):
+        if not name.endswith(".metadata.json"):
+            continue
+        stem = name[:-len(".metadata.json")]
+        with open(os.path.join(dump_dir, name), encoding="utf-8") as f:
+            metadata = json_util.loads(f.read())
+        bson_path = os.path.join(dump_dir, stem + ".bson")
+        collection = metadata.get("collectionName") or stem
+        found.append((collection, bson_path if os.path.exists(bson_path) else None, metadata.get("indexes", [])))
+    return found
+
+
+def iter_documents(path, offset=0):
+    """Documentos do arquivo a partir de `offset`, com o offset logo após cada um."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        mm.seek(offset)
+        for doc in decode_file_iter(mm):
+            yield doc, mm.tell()
+
+
+def insert_batch(col, docs):
+    """insert_many não ordenado; _id já existente (lote repetido após falha) é ignorado."""
+    try:
+        return len(col.insert_many(docs, ordered=False).inserted_ids)
+    except BulkWriteError as exc:
+        if any(err.get("code") != DUPLICATE_KEY for err in exc.details.get("writeErrors", [])):
+            raise
+        return exc.details.get("nInserted", 0)
+
+
+def restore_collection(db, collection, path, indexes, batch_size=DEFAULT_BATCH_SIZE):
+    """Carrega um arquivo .bson (retomando do progresso salvo) e cria os índices."""
+    progress = db[PROGRESS]
+    size = os.path.getsize(path) if path else 0
+    state = progress.find_one({"_id": collection})
+    if state and state.get("file_size") != size:
+        log(f"[{collection}] arquivo mudou desde a última carga; recomeçando do início")
+        state = None
+    if state and state.get("done"):
+        log(f"[{collection}] já carregada ({state['docs']} documentos)")
+        return state["docs"], 0.0
+    offset = state["offset"] if state else 0
+    loaded = state["docs"] if state else 0
+    if not state:
+        progress.replace_one({"_id": collection}, {"_id": collection, "file_size": size, "offset": 0,
+                                                   "docs": 0, "done": False}, upsert=True)
+    elif offset:
+        log(f"[{collection}] retomando em {offset / 1024 ** 2:.1f} de {size / 1024 ** 2:.1f} MB")
+
+    col = db[collection]
+    started = last_log = time.perf_counter()
+    start_offset, start_docs = offset, loaded
+    batch = []
+    for doc, end in (iter_documents(path, offset) if size else ()):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            insert_batch(col, batch)
+            loaded += len(batch)
+            offset = end
+            batch = []
+            progress.update_one({"_id": collection}, {"$set": {"offset": offset, "docs": loaded}})
+            now = time.perf_counter()
+            if now - last_log >= PROGRESS_INTERVAL:
+                last_log = now
+                mb = (offset - start_offset) / 1024 ** 2
+                log(f"[{collection}] {loaded} docs  {offset / size:6.1%}  {mb / (now - started):.1f} MB/s")
+    if batch:
+        insert_batch(col, batch)
+        loaded += len(batch)
+        offset = size
+    elapsed = time.perf_counter() - started
+
+    # índices só depois da carga: uma construção por índice em vez de uma atualização por documento
+    models = index_models(indexes)
+    if models and loaded:
+        index_started = time.perf_counter()
+        col.create_indexes(models)
+        log(f"[{collection}] {len(models)} índices criados em {time.perf_counter() - index_started:.1f}s")
+
+    progress.update_one({"_id": collection}, {"$set": {"offset": offset, "docs": loaded, "done": True}})
+    rate = (loaded - start_docs) / elapsed if elapsed else 0
+    log(f"[{collection}] concluída: {loaded} docs em {elapsed:.1f}s ({rate:,.0f} docs/s)")
+    return loaded, elapsed
+
+
+def restore(db, dump_dir=DEFAULT_DUMP_DIR, batch_size=DEFAULT_BATCH_SIZE, drop=False, workers=None):
+    """Carrega todas as coleções do dump, uma thread por coleção. Retorna docs por coleção."""
+    files = dump_files(dump_dir)
+    if drop:
+        for collection, _, _ in files:
+            db[collection].drop()
+        db[PROGRESS].drop()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers or len(files) or 1) as pool:
+        futures = {
+            collection: pool.submit(restore_collection, db, collection, path, indexes, batch_size)
+            for collection, path, indexes in files
+            if path is not None
+        }
+        totals = {collection: future.result()[0] for collection, future in futures.items()}
+    elapsed = time.perf_counter() - started
+    total = sum(totals.values())
+    log(f"Total: {total} documentos em {elapsed:.1f}s ({total / elapsed if elapsed else 0:,.0f} docs/s)")
+    return totals
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Carrega um dump .bson/.metadata.json sem mongorestore.")
+    parser.add_argument("--dir", default=DEFAULT_DUMP_DIR, help="diretório do dump")
+    parser.add_argument("--uri", default=os.getenv("MONGODB_URI"), help="URI do servidor de destino")
+    parser.add_argument("--db", default=None, help="banco de destino (padrão: MONGODB_DB ou o nome do diretório)")
+    parser.add_argument("--drop", action="store_true", help="apaga as coleções e o progresso antes de carregar")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="documentos por insert_many")
+    parser.add_argument("--workers", type=int, default=None, help="threads (padrão: uma por coleção)")
+    parser.add_argument("--migrate", action="store_true", help="aplica as migrações de índices ao final")
+    args = parser.parse_args()
+
+    db_name = args.db or os.getenv("MONGODB_DB") or os.path.basename(os.path.normpath(args.dir))
+    db = MongoClient(args.uri)[db_name]
+    print(f"Carregando {args.dir} em {db_name} ...")
+    restore(db, args.dir, batch_size=args.batch_size, drop=args.drop, workers=args.workers)
+    if args.migrate:
+        from migrations import migrate
+        migrate(db)
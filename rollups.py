@@ -0,0 +1,264 @@
+"""
+Coleções de resumo (rollups) por residência e por objeto
+
+- residence_stats: um documento por residência (_id = residence_id) com
+  contagens de objetos por status e tipo, objetos ativos, total de scans,
+  último scan e eventos de histórico por action_type
+- object_stats: um documento por objeto (_id = object_id) com eventos por
+  action_type, total de eventos e data do último evento
+
+Os resumos são reconstruídos por pipelines de agregação com $merge
+(`rebuild_stats`) e mantidos no caminho de escrita com $inc
+(`scan_stat_ops`, `object_stat_ops`, `history_stat_ops`), então o dashboard
+lê um documento pequeno em vez de varrer objects/history.
+
+Uso:
+    python rollups.py                       # reconstrói tudo
+    python rollups.py --residence <id> ...  # só as residências informadas
+"""
+
+import argparse
+import os
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from scan_store import BUCKETS, DOCUMENTS, scan_collection, storage_mode
+
+RESIDENCE_STATS = "residence_stats"
+OBJECT_STATS = "object_stats"
+HISTORY_SUMMARIES = "history_summaries"
+
+# chaves nulas não podem virar campo em $arrayToObject
+UNKNOWN = "desconhecido"
+
+
+def _merge_into(collection):
+    return {"$merge": {"into": collection, "on": "_id", "whenMatched": "merge", "whenNotMatched": "insert"}}
+
+
+def _counts_by(field, group_key, out_field, total_field=None):
+    """Estágios que contam documentos por `field` dentro de `group_key`."""
+    second = {"_id": "$_id.g", out_field: {"$push": {"k": "$_id.v", "v": "$n"}}}
+    if total_field:
+        second[total_field] = {"$sum": "$n"}
+    return [
+        {"$group": {"_id": {"g": group_key, "v": {"$ifNull": [f"${field}", UNKNOWN]}}, "n": {"$sum": 1}}},
+        {"$group": second},
+        {"$set": {out_field: {"$arrayToObject": f"${out_field}"}}},
+    ]
+
+
+def object_stats_pipeline(match=None, summary_match=None):
+    # history -> eventos por objeto, com o residence_id do objeto; os eventos já
+    # compactados entram pelas contagens de history_summaries (history_archive.py)
+    return [
+        *([{"$match": match}] if match else []),
+        {"$project": {"object_id": 1, "action": {"$ifNull": ["$action_type", UNKNOWN]}, "n": {"$literal": 1},
+                      "last": "$timestamp"}},
+        {"$unionWith": {"coll": HISTORY_SUMMARIES, "pipeline": [
+            *([{"$match": summary_match}] if summary_match else []),
+            {"$project": {"object_id": "$_id", "last": "$last_event_at", "by_action": {"$objectToArray": "$by_action"}}},
+            {"$unwind": "$by_action"},
+            {"$project": {"object_id": 1, "last": 1, "action": "$by_action.k", "n": "$by_action.v"}},
+        ]}},
+        {"$group": {
+            "_id": {"g": "$object_id", "v": "$action"},
+            "n": {"$sum": "$n"},
+            "last": {"$max": "$last"},
+        }},
+        {"$group": {
+            "_id": "$_id.g",
+            "by_action": {"$push": {"k": "$_id.v", "v": "$n"}},
+            "events_total": {"$sum": "$n"},
+            "last_event_at": {"$max": "$last"},
+        }},
+        {"$set": {"by_action": {"$arrayToObject": "$by_action"}}},
+        {"$lookup": {"from": "objects", "localField": "_id", "foreignField": "_id",
+                     "pipeline": [{"$project": {"residence_id": 1}}], "as": "obj"}},
+        {"$set": {"residence_id": {"$first": "$obj.residence_id"}, "updated_at": "$$NOW"}},
+        {"$unset": "obj"},
+        _merge_into(OBJECT_STATS),
+    ]
+
+
+def residence_object_pipelines(match=None):
+    pre = [{"$match": match}] if match else []
+    return [
+        pre + _counts_by("status", "$residence_id", "objects_by_status", "objects_total") + [
+            {"$set": {"active_objects": {"$ifNull": ["$objects_by_status.ativo", 0]}, "updated_at": "$$NOW"}},
+            _merge_into(RESIDENCE_STATS),
+        ],
+        pre + _counts_by("type", "$residence_id", "objects_by_type") + [_merge_into(RESIDENCE_STATS)],
+    ]
+
+
+def residence_owner_pipeline(match=None):
+    # todas as residências entram com o user_id, mesmo sem scans (filtro da página History)
+    return [
+        *([{"$match": match}] if match else []),
+        {"$project": {"user_id": 1}},
+        _merge_into(RESIDENCE_STATS),
+    ]
+
+
+def residence_scan_pipeline(match=None, mode=DOCUMENTS):
+    if mode == BUCKETS:
+        # cada bucket já traz a quantidade de scans e o último timestamp da hora
+        return [
+            *([{"$match": match}] if match else []),
+            {"$group": {"_id": "$residence_id", "scans_total": {"$sum": "$count"}, "last_scan_at": {"$max": "$last"}}},
+            _merge_into(RESIDENCE_STATS),
+        ]
+    return [
+        *([{"$match": match}] if match else []),
+        {"$group": {"_id": "$residence_id", "scans_total": {"$sum": 1}, "last_scan_at": {"$max": "$timestamp"}}},
+        _merge_into(RESIDENCE_STATS),
+    ]
+
+
+def residence_history_pipeline(match=None):
+    # parte de object_stats (já agregado) em vez de varrer history de novo
+    return [
+        *([{"$match": match}] if match else []),
+        {"$match": {"residence_id": {"$ne": None}}},
+        {"$project": {"residence_id": 1, "by_action": {"$objectToArray": "$by_action"}}},
+        {"$unwind": "$by_action"},
+        {"$group": {"_id": {"g": "$residence_id", "v": "$by_action.k"}, "n": {"$sum": "$by_action.v"}}},
+        {"$group": {"_id": "$_id.g", "history_by_action": {"$push": {"k": "$_id.v", "v": "$n"}},
+                    "history_total": {"$sum": "$n"}}},
+        {"$set": {"history_by_action": {"$arrayToObject": "$history_by_action"}}},
+        _merge_into(RESIDENCE_STATS),
+    ]
+
+
+def rebuild_stats(db, residence_ids=None):
+    """Reconstrói os resumos (todos ou só das residências informadas)."""
+    res_match = {"residence_id": {"$in": residence_ids}} if residence_ids else None
+    hist_match = summary_match = None
+    if residence_ids:
+        object_ids = db.objects.distinct("_id", res_match)
+        hist_match = {"object_id": {"$in": object_ids}}
+        summary_match = {"_id": {"$in": object_ids}}
+        db[OBJECT_STATS].delete_many({"_id": {"$in": object_ids}})
+        db[RESIDENCE_STATS].delete_many({"_id": {"$in": residence_ids}})
+    else:
+        db[OBJECT_STATS].delete_many({})
+        db[RESIDENCE_STATS].delete_many({})
+
+    db.residences.aggregate(residence_owner_pipeline({"_id": {"$in": residence_ids}} if residence_ids else None))
+    db.history.aggregate(object_stats_pipeline(hist_match, summary_match))
+    for pipeline in residence_object_pipelines(res_match):
+        db.objects.aggregate(pipeline)
+    mode = storage_mode()
+    db[scan_collection(mode)].aggregate(residence_scan_pipeline(res_match, mode))
+    db[OBJECT_STATS].aggregate(residence_history_pipeline(res_match))
+    ensure_indexes(db)
+
+
+def ensure_indexes(db):
+    db[OBJECT_STATS].create_index([("residence_id", 1)])
+
+
+# ---------------------------------------------------------------------------
+# Atualizações no caminho de escrita ($inc). Cada função devolve triplas
+# (coleção, _id, update) para o chamador juntar às demais e enviar com
+# `apply_stat_ops`, que combina as do mesmo documento em um único upsert.
+#
+# Quem grava pelo caminho de escrita (ingest_scan, record_object_events,
+# pop_db.py sequencial, write_behind.py) mantém os resumos assim; as cargas em
+# lote do pop_db.py (--bulk, --workers, --async) e a compactação do
+# history_archive.py (compact_history) chamam `rebuild_stats` ao final.
+# ---------------------------------------------------------------------------
+
+def residence_stat_ops(residence_doc):
+    """Residência nova: o resumo nasce com o user_id, antes do primeiro scan."""
+    return [(RESIDENCE_STATS, residence_doc["_id"], {"$set": {"user_id": residence_doc.get("user_id")}})]
+
+
+def scan_stat_ops(scan_doc):
+    return [(RESIDENCE_STATS, scan_doc["residence_id"], {
+        "$inc": {"scans_total": 1},
+        "$max": {"last_scan_at": scan_doc["timestamp"]},
+        "$set": {"user_id": scan_doc.get("user_id"), "updated_at": datetime.utcnow()},
+    })]
+
+
+def object_stat_ops(obj_doc, old_status=None):
+    """Objeto novo (old_status=None) ou mudança de status de um existente."""
+    status = obj_doc.get("status") or UNKNOWN
+    inc = {f"objects_by_status.{status}": 1}
+    if old_status is None:
+        inc["objects_total"] = 1
+        inc[f"objects_by_type.{obj_doc.get('type') or UNKNOWN}"] = 1
+    else:
+        if old_status == status:
+            return []
+        inc[f"objects_by_status.{old_status}"] = -1
+    active = (status == "ativo") - (old_status == "ativo")
+    if active:
+        inc["active_objects"] = active
+    return [(RESIDENCE_STATS, obj_doc["residence_id"], {"$inc": inc})]
+
+
+def history_stat_ops(history_doc, residence_id):
+    action = history_doc.get("action_type") or UNKNOWN
+    return [
+        (OBJECT_STATS, history_doc["object_id"], {
+            "$inc": {f"by_action.{action}": 1, "events_total": 1},
+            "$max": {"last_event_at": history_doc["timestamp"]},
+            "$set": {"residence_id": residence_id},
+        }),
+        (RESIDENCE_STATS, residence_id, {"$inc": {f"history_by_action.{action}": 1, "history_total": 1}}),
+    ]
+
+
+def merge_stat_ops(ops):
+    """Junta as atualizações do mesmo documento: soma $inc, maior $max, último $set."""
+    merged = {}
+    for collection, _id, update in ops:
+        target = merged.setdefault((collection, _id), {})
+        for field, value in update.get("$inc", {}).items():
+            inc = target.setdefault("$inc", {})
+            inc[field] = inc.get(field, 0) + value
+        for field, value in update.get("$max", {}).items():
+            current = target.setdefault("$max", {}).get(field)
+            if current is None or (value is not None and value > current):
+                target["$max"][field] = value
+        if "$set" in update:
+            target.setdefault("$set", {}).update(update["$set"])
+    # contadores que se anularam (ex.: status que foi e voltou) não precisam ir ao servidor
+    for key, update in list(merged.items()):
+        inc = {field: value for field, value in update.pop("$inc", {}).items() if value}
+        if inc:
+            update["$inc"] = inc
+        if not update:
+            del merged[key]
+    return merged
+
+
+def apply_stat_ops(db, ops):
+    """Envia as triplas (coleção, _id, update) com um bulk_write por coleção."""
+    by_collection = {}
+    for (collection, _id), update in merge_stat_ops(ops).items():
+        by_collection.setdefault(collection, []).append(UpdateOne({"_id": _id}, update, upsert=True))
+    for collection, col_ops in by_collection.items():
+        db[collection].bulk_write(col_ops, ordered=False)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Reconstrói residence_stats e object_stats.")
+    parser.add_argument("--residence", action="append", default=None, help="_id da residência (pode repetir)")
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv("MONGODB_URI"))
+    db = client[os.getenv("MONGODB_DB")]
+    residence_ids = [ObjectId(r) for r in args.residence] if args.residence else None
+    rebuild_stats(db, residence_ids)
+    print(f"residence_stats: {db[RESIDENCE_STATS].estimated_document_count()} documentos")
+    print(f"object_stats: {db[OBJECT_STATS].estimated_document_count()} documentos")
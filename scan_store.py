@@ -0,0 +1,381 @@
+"""
+Modos de armazenamento dos scans
+
+- documents (padrão): um documento por scan em `scans`, como antes
+- timeseries: coleção time-series `scans_ts` (timeField timestamp, metaField
+  residence_id); o servidor agrupa os scans em buckets comprimidos e dispensa
+  os dois índices de residence_id+timestamp
+- buckets: um documento por residência e hora em `scan_buckets`, com os scans
+  da hora em um array e os totais da hora (quantidade, soma/máximo de objetos)
+  já calculados; um único índice residence_id_1_hour_1
+
+O modo vem da variável de ambiente SCAN_STORAGE. As leituras do dashboard
+passam pelos adaptadores abaixo, que devolvem pipelines de agregação (usados
+tanto pelo client síncrono quanto pelo async_db) e, no modo buckets, o
+gráfico lê direto os totais por hora, sem tocar nos scans individuais.
+
+Uso:
+    python scan_store.py --migrate buckets [--drop-source]   # scans -> scan_buckets
+    python scan_store.py --migrate timeseries                # scans -> scans_ts
+    python scan_store.py --report                            # tamanho de dados e índices
+"""
+
+import argparse
+import os
+import threading
+from datetime import datetime
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import CollectionInvalid
+
+from pagination import DEFAULT_PAGE_SIZE, keyset_aggregate, keyset_page, keyset_pipeline
+
+DOCUMENTS = "documents"
+TIMESERIES = "timeseries"
+BUCKETS = "buckets"
+MODES = (DOCUMENTS, TIMESERIES, BUCKETS)
+
+SCAN_COLLECTIONS = {DOCUMENTS: "scans", TIMESERIES: "scans_ts", BUCKETS: "scan_buckets"}
+
+# um scan a cada 5 s durante uma hora cabe em um bucket; acima disso abre outro
+MAX_SCANS_PER_BUCKET = 720
+MIGRATION_BATCH_SIZE = 1000
+
+BUCKET_SCAN_FIELDS = ("_id", "timestamp", "objects_detected_count", "camera_meta")
+
+# (client, banco, modo) já preparados por este processo
+_ensured = set()
+_ensured_lock = threading.Lock()
+
+
+def storage_mode():
+    mode = os.getenv("SCAN_STORAGE", DOCUMENTS)
+    if mode not in MODES:
+        raise ValueError(f"SCAN_STORAGE inválido: {mode!r} (use {', '.join(MODES)})")
+    return mode
+
+
+def scan_collection(mode=None):
+    return SCAN_COLLECTIONS[mode or storage_mode()]
+
+
+def hour_of(ts):
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def ensure_collection(db, mode=None):
+    """Cria a coleção/índices do modo (idempotente)."""
+    mode = mode or storage_mode()
+    if mode == TIMESERIES and SCAN_COLLECTIONS[TIMESERIES] not in db.list_collection_names():
+        try:
+            db.create_collection(SCAN_COLLECTIONS[TIMESERIES], timeseries={
+                "timeField": "timestamp", "metaField": "residence_id", "granularity": "seconds",
+            })
+        except CollectionInvalid:
+            pass  # outro processo criou entre a listagem e o create
+    elif mode == BUCKETS:
+        db[SCAN_COLLECTIONS[BUCKETS]].create_index([("residence_id", ASCENDING), ("hour", ASCENDING)])
+    with _ensured_lock:
+        _ensured.add((id(db.client), db.name, mode))
+
+
+def ensure_collection_once(db, mode=None):
+    """ensure_collection só na primeira escrita do processo em cada banco e modo.
+
+    Sem isso, o primeiro insert em scans_ts criaria uma coleção comum, e o
+    índice de scan_buckets nunca seria criado. Quem apaga o banco depois
+    disso deve chamar ensure_collection de novo.
+    """
+    mode = mode or storage_mode()
+    if (id(db.client), db.name, mode) not in _ensured:
+        ensure_collection(db, mode)
+
+
+# ---------------------------------------------------------------------------
+# Escrita
+# ---------------------------------------------------------------------------
+
+def bucket_update(scan_doc):
+    """Upsert que acrescenta o scan ao bucket da hora (ou abre um novo, se cheio)."""
+    entry = {f: scan_doc[f] for f in BUCKET_SCAN_FIELDS if f in scan_doc}
+    count = scan_doc.get("objects_detected_count", 0)
+    return UpdateOne(
+        {
+            "residence_id": scan_doc["residence_id"],
+            "hour": hour_of(scan_doc["timestamp"]),
+            "count": {"$lt": MAX_SCANS_PER_BUCKET},
+        },
+        {
+            "$push": {"scans": entry},
+            "$inc": {"count": 1, "objects_sum": count},
+            "$max": {"objects_max": count, "last": scan_doc["timestamp"]},
+            "$min": {"first": scan_doc["timestamp"]},
+            "$setOnInsert": {"user_id": scan_doc.get("user_id")},
+        },
+        upsert=True,
+    )
+
+
+def insert_scan(db, scan_doc, mode=None):
+    """Grava um scan no modo configurado (documents continua com insert_one)."""
+    mode = mode or storage_mode()
+    ensure_collection_once(db, mode)
+    if mode == BUCKETS:
+        db[SCAN_COLLECTIONS[BUCKETS]].bulk_write([bucket_update(scan_doc)])
+    else:
+        db[SCAN_COLLECTIONS[mode]].insert_one(scan_doc)
+
+
+# ---------------------------------------------------------------------------
+# Leitura: pipelines de agregação por modo
+# ---------------------------------------------------------------------------
+
+def _unwind_buckets(match):
+    return [
+        {"$match": match},
+        {"$unwind": "$scans"},
+        {"$project": {
+            **{f: f"$scans.{f}" for f in BUCKET_SCAN_FIELDS},
+            "residence_id": 1, "user_id": 1,
+        }},
+    ]
+
+
+def scan_ids_pipeline(residence_id, mode=None):
+    """_id dos scans da residência, do mais recente ao mais antigo."""
+    mode = mode or storage_mode()
+    if mode == BUCKETS:
+        return [
+            {"$match": {"residence_id": residence_id}},
+            {"$unwind": "$scans"},
+            {"$sort": {"scans.timestamp": -1}},
+            {"$project": {"_id": "$scans._id"}},
+        ]
+    return [
+        {"$match": {"residence_id": residence_id}},
+        {"$sort": {"timestamp": -1}},
+        {"$project": {"_id": 1}},
+    ]
+
+
+def hourly_series_pipeline(residence_id, mode=None, max_points=None):
+    """Scans por hora e objetos detectados (média/máximo) para o gráfico.
+
+    Com `max_points`, horas vizinhas são juntadas por $bucketAuto em até
+    `max_points` faixas (soma de scans, máximo de objetos, média ponderada).
+    """
+    mode = mode or storage_mode()
+    if mode == BUCKETS:
+        # totais já guardados no bucket: um documento pequeno por hora
+        group = {
+            "_id": "$hour",
+            "scans": {"$sum": "$count"},
+            "objects_sum": {"$sum": "$objects_sum"},
+            "objects_max": {"$max": "$objects_max"},
+        }
+    else:
+        group = {
+            "_id": {"$dateTrunc": {"date": "$timestamp", "unit": "hour"}},
+            "scans": {"$sum": 1},
+            "objects_sum": {"$sum": "$objects_detected_count"},
+            "objects_max": {"$max": "$objects_detected_count"},
+        }
+    stages = [
+        {"$match": {"residence_id": residence_id}},
+        {"$group": group},
+        {"$sort": {"_id": 1}},
+    ]
+    hour = "$_id"
+    if max_points:
+        stages.append({"$bucketAuto": {
+            "groupBy": "$_id",
+            "buckets": max_points,
+            "output": {
+                "hour": {"$min": "$_id"},
+                "scans": {"$sum": "$scans"},
+                "objects_sum": {"$sum": "$objects_sum"},
+                "objects_max": {"$max": "$objects_max"},
+            },
+        }})
+        stages.append({"$sort": {"hour": 1}})
+        hour = "$hour"
+    stages.append({"$project": {
+        "_id": 0, "hour": hour, "scans": 1, "objects_max": 1,
+        "objects_avg": {"$divide": ["$objects_sum", "$scans"]},
+    }})
+    return stages
+
+
+def scan_count_pipeline(mode=None):
+    mode = mode or storage_mode()
+    if mode == BUCKETS:
+        return [{"$group": {"_id": None, "n": {"$sum": "$count"}}}]
+    return [{"$count": "n"}]
+
+
+def count_scans(db, mode=None):
+    """Total de scans; no modo documents usa os metadados da coleção."""
+    mode = mode or storage_mode()
+    if mode == DOCUMENTS:
+        return db.scans.estimated_document_count()
+    result = list(db[SCAN_COLLECTIONS[mode]].aggregate(scan_count_pipeline(mode)))
+    return result[0]["n"] if result else 0
+
+
+def _bucket_page_args(residence_id, after, projection):
+    # (estágios da página, prefixo que desfaz os buckets da residência)
+    match = {"residence_id": residence_id}
+    if after is not None:
+        # buckets de horas posteriores ao cursor já foram mostrados
+        match["hour"] = {"$lte": hour_of(after[0])}
+    stages = [{"$project": dict(projection, timestamp=1)}] if projection else []
+    return stages, _unwind_buckets(match)
+
+
+def scan_page_pipeline(residence_id, after=None, page_size=DEFAULT_PAGE_SIZE, projection=None):
+    """Estágios que scan_page envia a scan_buckets no modo buckets."""
+    stages, prefix = _bucket_page_args(residence_id, after, projection)
+    return keyset_pipeline({}, "timestamp", -1, after, page_size, stages, prefix)
+
+
+def scan_page(db, residence_id, after=None, page_size=DEFAULT_PAGE_SIZE, projection=None, mode=None):
+    """Página de scans da residência por timestamp decrescente (como keyset_page)."""
+    mode = mode or storage_mode()
+    if mode != BUCKETS:
+        return keyset_page(db[SCAN_COLLECTIONS[mode]], {"residence_id": residence_id}, "timestamp",
+                           -1, after, page_size, projection)
+    stages, prefix = _bucket_page_args(residence_id, after, projection)
+    return keyset_aggregate(db[SCAN_COLLECTIONS[BUCKETS]], {}, "timestamp", -1, after, page_size,
+                            stages, prefix=prefix)
+
+
+# ---------------------------------------------------------------------------
+# Migração dos documentos de `scans` para o modo escolhido
+# ---------------------------------------------------------------------------
+
+def build_buckets(scans):
+    """Agrupa scans ordenados por (residence_id, timestamp) em documentos por hora."""
+    bucket = None
+    for scan in scans:
+        hour = hour_of(scan["timestamp"])
+        if (bucket is None or bucket["residence_id"] != scan["residence_id"]
+                or bucket["hour"] != hour or bucket["count"] >= MAX_SCANS_PER_BUCKET):
+            if bucket is not None:
+                yield bucket
+            bucket = {
+                "residence_id": scan["residence_id"], "user_id": scan.get("user_id"), "hour": hour,
+                "count": 0, "objects_sum": 0, "objects_max": 0,
+                "first": scan["timestamp"], "last": scan["timestamp"], "scans": [],
+            }
+        count = scan.get("objects_detected_count", 0)
+        bucket["scans"].append({f: scan[f] for f in BUCKET_SCAN_FIELDS if f in scan})
+        bucket["count"] += 1
+        bucket["objects_sum"] += count
+        bucket["objects_max"] = max(bucket["objects_max"], count)
+        bucket["last"] = max(bucket["last"], scan["timestamp"])
+    if bucket is not None:
+        yield bucket
+
+
+def bucket_merge(bucket):
+    """Upsert que junta um bucket de build_buckets ao bucket já gravado da mesma hora.
+
+    Se o bucket existente não comporta todos os scans, um novo é aberto.
+    """
+    return UpdateOne(
+        {
+            "residence_id": bucket["residence_id"],
+            "hour": bucket["hour"],
+            "count": {"$lte": MAX_SCANS_PER_BUCKET - bucket["count"]},
+        },
+        {
+            "$push": {"scans": {"$each": bucket["scans"]}},
+            "$inc": {"count": bucket["count"], "objects_sum": bucket["objects_sum"]},
+            "$max": {"objects_max": bucket["objects_max"], "last": bucket["last"]},
+            "$min": {"first": bucket["first"]},
+            "$setOnInsert": {"user_id": bucket["user_id"]},
+        },
+        upsert=True,
+    )
+
+
+def migrate_scans(db, mode, drop_source=False, batch_size=MIGRATION_BATCH_SIZE):
+    """Acrescenta os documentos de `scans` à coleção do modo `mode`.
+
+    Lê em ordem de residence_id+timestamp (índice único) e grava em lotes.
+    Em buckets, cada hora é juntada ao bucket que já existir (bucket_merge).
+    Com `drop_source`, remove `scans` ao final (os scans passam a existir só
+    no destino, e uma nova migração não os duplica). Retorna quantos
+    documentos foram gravados no destino (buckets: quantos foram juntados).
+    """
+    if mode == DOCUMENTS:
+        return 0
+    target = db[SCAN_COLLECTIONS[mode]]
+    ensure_collection(db, mode)
+
+    source = db.scans.find({}, sort=[("residence_id", ASCENDING), ("timestamp", ASCENDING)],
+                           batch_size=batch_size)
+    docs = build_buckets(source) if mode == BUCKETS else source
+
+    def write(batch):
+        if mode == BUCKETS:
+            target.bulk_write([bucket_merge(bucket) for bucket in batch])
+        else:
+            target.insert_many(batch, ordered=False)
+        return len(batch)
+
+    written = 0
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            written += write(batch)
+            batch = []
+    if batch:
+        written += write(batch)
+
+    if drop_source:
+        db.scans.drop()
+    return written
+
+
+def storage_report(db):
+    """Tamanho dos dados, em disco e dos índices de cada coleção de scans existente."""
+    existing = set(db.list_collection_names())
+    rows = []
+    for mode, name in SCAN_COLLECTIONS.items():
+        if name not in existing:
+            continue
+        stats = db.command("collStats", name)
+        rows.append({
+            "mode": mode, "collection": name, "count": stats.get("count"),
+            "size": stats.get("size", 0), "storage_size": stats.get("storageSize", 0),
+            "index_size": stats.get("totalIndexSize", 0), "indexes": stats.get("nindexes"),
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Migração e relatório dos modos de armazenamento dos scans.")
+    parser.add_argument("--migrate", choices=[TIMESERIES, BUCKETS], help="copia scans para este modo")
+    parser.add_argument("--drop-source", action="store_true",
+                        help="remove a coleção scans após a migração (sem isso, migrar de novo duplica os scans)")
+    parser.add_argument("--report", action="store_true", help="mostra tamanho de dados e índices")
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv("MONGODB_URI"))
+    db = client[os.getenv("MONGODB_DB")]
+    if args.migrate:
+        started = datetime.utcnow()
+        written = migrate_scans(db, args.migrate, drop_source=args.drop_source)
+        print(f"{written} documentos gravados em {SCAN_COLLECTIONS[args.migrate]} "
+              f"em {(datetime.utcnow() - started).total_seconds():.1f}s")
+        print(f"Defina SCAN_STORAGE={args.migrate} no .env para o dashboard e a ingestão usarem o novo modo.")
+    if args.report or not args.migrate:
+        for r in storage_report(db):
+            print(f"{r['collection']:<13} {r['count'] or 0:>9} docs  dados {r['size'] / 1024:>9.1f} KB  "
+                  f"disco {r['storage_size'] / 1024:>9.1f} KB  índices ({r['indexes']}) {r['index_size'] / 1024:>9.1f} KB")
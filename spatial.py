@@ -0,0 +1,181 @@
+"""
+Consultas espaciais sobre as coordenadas {x, y, z} dos objetos
+
+As coordenadas são cômodo-locais (metros), não GeoJSON, então o índice
+coordinates_2dsphere não serve para elas. Aqui os objetos de uma residência
+são carregados em um array NumPy contíguo (N x 3) e indexados por uma grade
+de células cúbicas (grid bucketing). O índice de cada residência fica em
+cache e responde:
+
+- objetos a até r metros de um ponto (`within_radius`)
+- objetos dentro de uma caixa (`within_box`)
+- k objetos mais próximos (`nearest`), base para o aviso de obstáculo por voz
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from columnar import OBJECT_SCHEMA, load_frame, select
+
+DEFAULT_CELL_SIZE = 0.5  # metros
+DEFAULT_CACHE_TTL = 60
+DEFAULT_CACHE_SIZE = 64
+
+POINT_FIELDS = ("x", "y", "z")
+INDEX_COLUMNS = select(OBJECT_SCHEMA, "_id", "name", "type", "coordinates.x", "coordinates.y", "coordinates.z")
+
+
+def coords_to_array(coords):
+    """Converte uma sequência de dicts {x, y, z} em um array float64 (N x 3).
+
+    Coordenadas ausentes ou incompletas viram NaN, sem laço por eixo.
+    """
+    flat = np.fromiter(
+        (c.get(f, np.nan) if isinstance(c, dict) else np.nan for c in coords for f in POINT_FIELDS),
+        dtype=np.float64,
+    )
+    return flat.reshape(-1, 3)
+
+
+class GridIndex:
+    """Índice de grade uniforme sobre pontos 3D."""
+
+    def __init__(self, points, ids=None, cell_size=DEFAULT_CELL_SIZE, extra=None):
+        points = np.ascontiguousarray(points, dtype=np.float64).reshape(-1, 3)
+        valid = ~np.isnan(points).any(axis=1)
+        self.points = points[valid]
+        self.ids = np.asarray(ids if ids is not None else np.arange(len(points)), dtype=object)[valid]
+        self.extra = {k: np.asarray(v, dtype=object)[valid] for k, v in (extra or {}).items()}
+        self.cell_size = cell_size
+
+        cells = np.floor(self.points / cell_size).astype(np.int64)
+        # ordena os pontos por célula: cada célula vira um intervalo [início, fim)
+        order = np.lexsort((cells[:, 2], cells[:, 1], cells[:, 0]))
+        self.points = self.points[order]
+        self.ids = self.ids[order]
+        self.extra = {k: v[order] for k, v in self.extra.items()}
+        cells = cells[order]
+        uniq, starts, counts = np.unique(cells, axis=0, return_index=True, return_counts=True)
+        self._buckets = {tuple(c): (s, s + n) for c, s, n in zip(uniq.tolist(), starts, counts)}
+
+    def __len__(self):
+        return len(self.points)
+
+    def _candidates(self, lo, hi):
+        c_lo = np.floor(np.asarray(lo) / self.cell_size).astype(np.int64)
+        c_hi = np.floor(np.asarray(hi) / self.cell_size).astype(np.int64)
+        n_cells = np.prod(c_hi - c_lo + 1)
+        if n_cells > len(self._buckets):
+            # caixa maior que a quantidade de células ocupadas: percorre só as ocupadas
+            keys = [k for k in self._buckets if all(c_lo[i] <= k[i] <= c_hi[i] for i in range(3))]
+        else:
+            keys = [
+                (x, y, z)
+                for x in range(c_lo[0], c_hi[0] + 1)
+                for y in range(c_lo[1], c_hi[1] + 1)
+                for z in range(c_lo[2], c_hi[2] + 1)
+            ]
+        ranges = [self._buckets[k] for k in keys if k in self._buckets]
+        if not ranges:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(s, e) for s, e in ranges])
+
+    def within_box(self, lo, hi):
+        """Índices (no array interno) dos pontos dentro da caixa [lo, hi]."""
+        idx = self._candidates(lo, hi)
+        pts = self.points[idx]
+        mask = np.all((pts >= lo) & (pts <= hi), axis=1)
+        return idx[mask]
+
+    def within_radius(self, center, radius):
+        """Índices e distâncias dos pontos a até `radius` de `center`, do mais perto ao mais longe."""
+        center = np.asarray(center, dtype=np.float64)
+        idx = self._candidates(center - radius, center + radius)
+        dist = np.linalg.norm(self.points[idx] - center, axis=1)
+        mask = dist <= radius
+        idx, dist = idx[mask], dist[mask]
+        order = np.argsort(dist, kind="stable")
+        return idx[order], dist[order]
+
+    def nearest(self, center, k=1, max_radius=None):
+        """Os k pontos mais próximos; a busca cresce em raios até achar k."""
+        if not len(self):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        radius = self.cell_size
+        limit = max_radius or np.inf
+        while True:
+            idx, dist = self.within_radius(center, min(radius, limit))
+            # dentro do raio a busca é exata: se já há k pontos, são os k mais próximos
+            if len(idx) >= k or radius >= limit or len(idx) == len(self):
+                return idx[:k], dist[:k]
+            radius *= 2
+
+    def records(self, idx, dist=None):
+        """Linhas (dicts) para exibir os resultados de uma consulta."""
+        rows = []
+        for pos, i in enumerate(idx):
+            row = {"_id": self.ids[i], "x": self.points[i, 0], "y": self.points[i, 1], "z": self.points[i, 2]}
+            row.update({k: v[i] for k, v in self.extra.items()})
+            if dist is not None:
+                row["distance"] = float(dist[pos])
+            rows.append(row)
+        return rows
+
+
+def residence_index_query(residence_id, status="ativo"):
+    query = {"residence_id": residence_id}
+    if status:
+        query["status"] = status
+    return query
+
+
+def load_residence_index(db, residence_id, status="ativo", cell_size=DEFAULT_CELL_SIZE):
+    """Carrega os objetos de uma residência (só os campos necessários) e indexa."""
+    query = residence_index_query(residence_id, status)
+    # colunas tipadas direto dos lotes BSON: sem um dict por objeto em memória
+    df = load_frame(db.objects, query, INDEX_COLUMNS)
+    return GridIndex(
+        df[["coordinates.x", "coordinates.y", "coordinates.z"]].to_numpy(),
+        ids=df["_id"].to_numpy(dtype=object),
+        cell_size=cell_size,
+        extra={"name": df["name"].to_numpy(dtype=object), "type": df["type"].to_numpy(dtype=object)},
+    )
+
+
+class SpatialIndexCache:
+    """Índices por residência com TTL e tamanho máximo (LRU)."""
+
+    def __init__(self, db, ttl=DEFAULT_CACHE_TTL, max_entries=DEFAULT_CACHE_SIZE, cell_size=DEFAULT_CELL_SIZE):
+        self.db = db
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cell_size = cell_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, residence_id, status="ativo"):
+        key = (residence_id, status)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+        index = load_residence_index(self.db, residence_id, status, self.cell_size)
+        with self._lock:
+            self._entries[key] = (now + self.ttl, index)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+    def invalidate(self, residence_id=None):
+        with self._lock:
+            if residence_id is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == residence_id]:
+                    del self._entries[key]
@@ -0,0 +1,153 @@
+"""
+Relatório de inicialização do dashboard
+
+Para cada página de dashboard_pages, mede em um processo Python novo (sem
+cache de módulos) quanto custa importar o módulo dela depois do que o
+dashboard.py sempre importa (streamlit, dotenv e o próprio pacote), com
+`python -X importtime`, e lista os pacotes mais pesados. Com --render, abre
+o app com o AppTest do Streamlit já na página (?page=<nome>), também em um
+processo novo, e mede o tempo até a primeira renderização completa (com as
+consultas ao banco do .env, se a página fizer alguma).
+
+Os tempos são comparados com os orçamentos de dashboard_pages/timing.py (ou
+os informados na linha de comando); o script sai com código 1 se algum for
+estourado, para ser usado antes de adicionar uma página nova.
+
+Uso:
+    python startup_report.py
+    python startup_report.py --render --import-budget-ms 800
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from dashboard_pages import ALL_PAGES, HIDDEN_PAGES
+from dashboard_pages.timing import FIRST_RENDER_BUDGET_MS, IMPORT_BUDGET_MS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SHELL_IMPORTS = "import streamlit, dotenv"
+SHELL_MODULES = ["dashboard_pages", "dashboard_pages.data"]
+MARKER = "-- startup_report --"
+TOP_PACKAGES = 5
+
+RENDER_SCRIPT = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+
+label, hidden, timeout = sys.argv[1], sys.argv[2] == "1", float(sys.argv[3])
+at = AppTest.from_file("dashboard.py", default_timeout=timeout)
+at.query_params["page"] = label
+if hidden:
+    at.query_params["diag"] = "1"
+started = time.perf_counter()
+at.run()
+elapsed = (time.perf_counter() - started) * 1000
+print(json.dumps({"render_ms": elapsed, "errors": [e.value for e in at.exception]}))
+"""
+
+
+def parse_importtime(stderr):
+    """Linhas do -X importtime depois do marcador: [(módulo, self_us, cumulative_us, nível)]."""
+    rows, after = [], False
+    for line in stderr.splitlines():
+        if line.strip() == MARKER:
+            after = True
+            continue
+        if not after or not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            continue  # cabeçalho
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), level))
+    return rows
+
+
+def import_profile(modules, preload=SHELL_IMPORTS):
+    """Custo de importar `modules` depois de `preload`, em um processo novo.
+
+    Devolve (ms no total, [(pacote, ms)] dos pacotes mais pesados).
+    """
+    code = f"{preload}; import sys; sys.stderr.write({MARKER!r} + '\\n'); import {', '.join(modules)}"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=HERE, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    rows = parse_importtime(proc.stderr)
+    total_us = sum(cumulative for _, _, cumulative, level in rows if level == 0)
+    # custo de cada pacote: a maior linha cumulativa dele (subpacotes ficam dentro)
+    packages = {}
+    for name, _, cumulative, _ in rows:
+        root = name.split(".")[0]
+        if root != "dashboard_pages":
+            packages[root] = max(packages.get(root, 0), cumulative)
+    heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:TOP_PACKAGES]
+    return total_us / 1000, [(name, us / 1000) for name, us in heaviest]
+
+
+def render_time(label, timeout):
+    """(ms até a primeira renderização da página, erros mostrados no app)."""
+    proc = subprocess.run(
+        [sys.executable, "-c", RENDER_SCRIPT, label, "1" if label in HIDDEN_PAGES else "0", str(timeout)],
+        cwd=HERE, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        return None, [proc.stderr.strip().splitlines()[-1]]
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return result["render_ms"], result["errors"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tempo de importação e de primeira renderização das páginas do dashboard.")
+    parser.add_argument("--render", action="store_true", help="mede também a primeira renderização (AppTest)")
+    parser.add_argument("--pages", default=None, help="páginas separadas por vírgula (padrão: todas)")
+    parser.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--render-budget-ms", type=float, default=FIRST_RENDER_BUDGET_MS)
+    parser.add_argument("--timeout", type=float, default=60, help="limite (s) da renderização de cada página")
+    args = parser.parse_args(argv)
+
+    labels = [p.strip() for p in args.pages.split(",")] if args.pages else list(ALL_PAGES)
+    unknown = [label for label in labels if label not in ALL_PAGES]
+    if unknown:
+        parser.error(f"páginas desconhecidas: {', '.join(unknown)}")
+
+    over = []
+    shell_ms, shell_top = import_profile(SHELL_MODULES, preload="pass")
+    print(f"dashboard.py (streamlit, dotenv e dashboard_pages): {shell_ms:.0f} ms")
+    print("  " + ", ".join(f"{name} {ms:.0f} ms" for name, ms in shell_top))
+
+    for label in labels:
+        import_ms, top = import_profile([ALL_PAGES[label]], preload=f"{SHELL_IMPORTS}; import {', '.join(SHELL_MODULES)}")
+        line = f"\n{label} ({ALL_PAGES[label]}): importação {import_ms:.0f} ms"
+        if import_ms > args.import_budget_ms:
+            over.append(f"importação de {label}: {import_ms:.0f} ms > {args.import_budget_ms:.0f} ms")
+        if args.render:
+            render_ms, errors = render_time(label, args.timeout)
+            if render_ms is None:
+                line += " | renderização falhou"
+            else:
+                line += f" | primeira renderização {render_ms:.0f} ms"
+                if render_ms > args.render_budget_ms:
+                    over.append(f"renderização de {label}: {render_ms:.0f} ms > {args.render_budget_ms:.0f} ms")
+            for error in errors:
+                line += f"\n  erro: {error}"
+        print(line)
+        if top:
+            print("  mais pesados: " + ", ".join(f"{name} {ms:.0f} ms" for name, ms in top))
+
+    if over:
+        print("\nOrçamentos estourados:")
+        for line in over:
+            print(f"  - {line}")
+        return 1
+    print("\nTodas as páginas dentro do orçamento.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
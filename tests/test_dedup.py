@@ -0,0 +1,57 @@
+from datetime import datetime
+
+import pytest
+
+from dedup import ResidenceMatcher
+from ingest import unique_by_hash
+
+WHEN = datetime(2025, 1, 1)
+
+
+def detection(vision_hash, x):
+    return {
+        "vision_hash": vision_hash, "name": "Cadeira", "type": "móvel", "color": "preto",
+        "coordinates": {"x": x, "y": 1.0, "z": 0.0},
+    }
+
+
+def matcher_with(*docs):
+    matcher = ResidenceMatcher()
+    for doc in docs:
+        matcher.upsert(dict(doc, last_seen=WHEN, status="ativo"))
+    return matcher
+
+
+def test_known_hash_claims_its_object_before_new_detections():
+    # "A" já está no banco; a detecção nova ao lado não pode herdar o hash dele
+    matcher = matcher_with(detection("A", 1.0))
+    detections = [detection("A", 1.0), detection("novo", 1.3)]
+    assert matcher.match(detections, WHEN, keep={"A"}) == ["A", None]
+
+
+def test_known_hash_outside_index_keeps_identity():
+    # objeto gravado mas fora do índice (ex.: removido): mantém o hash e não é comparado
+    matcher = matcher_with(detection("B", 1.0))
+    assert matcher.match([detection("A", 1.0)], WHEN, keep={"A"}) == ["A"]
+
+
+def test_new_detection_inherits_nearby_object():
+    matcher = matcher_with(detection("A", 1.0))
+    assert matcher.match([detection("novo", 1.3)], WHEN) == ["A"]
+
+
+def test_one_detection_per_object():
+    matcher = matcher_with(detection("A", 1.0))
+    assert matcher.match([detection("n1", 1.2), detection("n2", 1.1)], WHEN) == [None, "A"]
+
+
+def test_repeated_detection_counts_once():
+    detections = [detection("A", 1.0), detection("A", 1.2)]
+    by_hash = unique_by_hash(["A", "A"], detections)
+    assert list(by_hash) == ["A"]
+    assert by_hash["A"]["coordinates"]["x"] == 1.2
+
+
+def test_distinct_detections_resolved_to_same_hash_are_refused():
+    with pytest.raises(ValueError):
+        unique_by_hash(["A", "novo"], [detection("A", 1.0), detection("A", 1.3)])
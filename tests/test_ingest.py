@@ -0,0 +1,91 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from common import DUPLICATE_KEY
+from ingest import ingest_scan
+from rollups import RESIDENCE_STATS
+
+WHEN = datetime(2025, 1, 1)
+RESIDENCE = ObjectId()
+
+
+class Result:
+    def __init__(self, matched_count=0, upserted_count=0):
+        self.matched_count = matched_count
+        self.upserted_count = upserted_count
+
+
+class FakeCollection:
+    """bulk_write devolve (ou levanta) a próxima resposta de `responses`."""
+
+    def __init__(self, responses=()):
+        self.responses = list(responses)
+        self.calls = []
+
+    def bulk_write(self, ops, ordered=True):
+        self.calls.append(list(ops))
+        response = self.responses.pop(0) if self.responses else Result()
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def insert_one(self, doc):
+        self.calls.append(doc)
+
+
+class FakeDb(dict):
+    def __missing__(self, name):
+        return self.setdefault(name, FakeCollection())
+
+    __getattr__ = dict.__getitem__
+
+
+def detection(vision_hash, x):
+    return {
+        "vision_hash": vision_hash, "name": "Cadeira", "type": "móvel", "color": "preto",
+        "coordinates": {"x": x, "y": 1.0, "z": 0.0},
+    }
+
+
+def raced_db(concurrent_id, error_code=DUPLICATE_KEY):
+    # outro scanner inseriu "B" entre a leitura dos objetos existentes e o bulk_write
+    error = BulkWriteError({
+        "writeErrors": [{"index": 1, "code": error_code, "errmsg": "E11000"}],
+        "nUpserted": 1, "nMatched": 0,
+    })
+    objects = FakeCollection([error, Result(matched_count=1)])
+    db = FakeDb(objects=objects)
+    # a consulta inicial não vê "B"; a releitura depois da corrida vê
+    objects.find = lambda filter, projection=None: (
+        [{"_id": concurrent_id, "vision_hash": "B"}] if len(objects.calls) > 1 else []
+    )
+    return db
+
+
+def test_duplicate_key_race_retries_as_plain_update(monkeypatch):
+    monkeypatch.setenv("SCAN_STORAGE", "documents")
+    concurrent_id = ObjectId()
+    db = raced_db(concurrent_id)
+    result = ingest_scan(db, RESIDENCE, {"timestamp": WHEN}, [detection("A", 1.0), detection("B", 2.0)])
+
+    retry = db.objects.calls[1]
+    assert len(retry) == 1 and isinstance(retry[0], UpdateOne)
+    assert retry[0]._filter == {"vision_hash": "B", "residence_id": RESIDENCE}
+    assert set(retry[0]._doc) == {"$set"} and not retry[0]._upsert
+    assert result["object_ids"][1] == concurrent_id
+    assert (result["inserted"], result["updated"]) == (1, 1)
+
+    # só o objeto que esta chamada inseriu entra nos resumos
+    stats = [op for ops in db[RESIDENCE_STATS].calls for op in ops]
+    assert stats[0]._doc["$inc"]["objects_total"] == 1
+
+
+def test_other_bulk_errors_are_raised(monkeypatch):
+    monkeypatch.setenv("SCAN_STORAGE", "documents")
+    db = raced_db(ObjectId(), error_code=121)
+    with pytest.raises(BulkWriteError):
+        ingest_scan(db, RESIDENCE, {"timestamp": WHEN}, [detection("A", 1.0), detection("B", 2.0)])
@@ -0,0 +1,46 @@
+import numpy as np
+
+from lod import lttb, voxel_size
+
+
+def test_lttb_keeps_endpoints_and_budget():
+    x = np.arange(1000)
+    keep = lttb(x, np.sin(x / 50), 100)
+    assert len(keep) == 100
+    assert keep[0] == 0 and keep[-1] == 999
+    assert np.all(np.diff(keep) > 0)
+
+
+def test_lttb_keeps_isolated_spike():
+    y = np.zeros(500)
+    y[321] = 10.0
+    assert 321 in lttb(np.arange(500), y, 20)
+
+
+def test_lttb_returns_everything_below_budget():
+    assert list(lttb([0, 1, 2], [1, 2, 3], 10)) == [0, 1, 2]
+    assert list(lttb(range(5), range(5), 2)) == [0, 1, 2, 3, 4]
+
+
+def cells(lo, hi, size):
+    ext = np.asarray(hi, dtype=np.float64) - np.asarray(lo, dtype=np.float64)
+    return np.prod(np.floor(ext / size) + 1)
+
+
+def test_voxel_grid_fits_budget():
+    lo, hi = (0.0, 0.0, 0.0), (10.0, 5.0, 3.0)
+    size = voxel_size(lo, hi, 1000)
+    assert cells(lo, hi, size) <= 1000
+    # o lado cresce 25% por vez: um passo menor já estouraria o orçamento
+    assert cells(lo, hi, size / 1.25) > 1000
+
+
+def test_voxel_ignores_flat_axes():
+    # todos os objetos no mesmo z: a grade é 2D e o orçamento vai todo para x/y
+    size = voxel_size((0.0, 0.0, 1.0), (10.0, 10.0, 1.0), 100)
+    assert cells((0.0, 0.0, 1.0), (10.0, 10.0, 1.0), size) <= 100
+    assert size < 2.0
+
+
+def test_voxel_single_point():
+    assert voxel_size((1.0, 2.0, 3.0), (1.0, 2.0, 3.0), 100) == 1.0
@@ -0,0 +1,52 @@
+import pytest
+
+from pagination import keyset_page, keyset_query, page_and_cursor
+
+mongomock = pytest.importorskip("mongomock")
+
+
+def collection(values):
+    col = mongomock.MongoClient().db.events
+    col.insert_many([{"_id": i, "residence_id": 1, "timestamp": value} for i, value in enumerate(values)])
+    return col
+
+
+def walk(col, page_size, direction=-1):
+    pages, after = [], None
+    while True:
+        docs, after = keyset_page(col, {"residence_id": 1}, "timestamp", direction, after, page_size)
+        pages.append([doc["_id"] for doc in docs])
+        if after is None:
+            return pages
+
+
+@pytest.mark.parametrize("direction", [-1, 1])
+def test_ties_across_pages_are_shown_once(direction):
+    # 7 documentos com o mesmo timestamp atravessam três páginas de 3
+    col = collection([5, 4, 4, 4, 4, 4, 4, 4, 3, 2])
+    pages = walk(col, 3, direction)
+    ids = [i for page in pages for i in page]
+    assert sorted(ids) == list(range(10))
+    assert all(len(page) == 3 for page in pages[:-1])
+
+
+def test_cursor_keeps_ties_from_previous_page():
+    docs = [{"_id": 3, "t": 4}, {"_id": 4, "t": 4}, {"_id": 5, "t": 4}]
+    _, after = page_and_cursor(docs, "t", (4, [1, 2]), page_size=2)
+    assert after == (4, [1, 2, 3, 4])
+
+
+def test_cursor_resets_ties_when_value_changes():
+    docs = [{"_id": 3, "t": 4}, {"_id": 4, "t": 3}, {"_id": 5, "t": 3}]
+    _, after = page_and_cursor(docs, "t", (4, [1, 2]), page_size=2)
+    assert after == (3, [4])
+
+
+def test_last_page_has_no_cursor():
+    assert page_and_cursor([{"_id": 1, "t": 1}], "t", None, page_size=2) == ([{"_id": 1, "t": 1}], None)
+
+
+def test_query_excludes_seen_ids_without_sorting_by_id():
+    assert keyset_query({"residence_id": 1}, "timestamp", -1, (4, [1, 2])) == {
+        "residence_id": 1, "timestamp": {"$lte": 4}, "_id": {"$nin": [1, 2]},
+    }
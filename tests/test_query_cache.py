@@ -0,0 +1,70 @@
+from query_cache import QueryCache, make_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def loader(calls, value):
+    def load():
+        calls.append(value)
+        return value
+    return load
+
+
+def test_entry_expires_after_collection_ttl():
+    clock = Clock()
+    cache = QueryCache(ttls={"objects": 30}, clock=clock)
+    key = make_key("objects", "find", {"status": "ativo"})
+    calls = []
+    assert cache.get_or_load(key, loader(calls, 1)) == 1
+    clock.now = 29.9
+    assert cache.get_or_load(key, loader(calls, 2)) == 1
+    clock.now = 30.0
+    assert cache.get_or_load(key, loader(calls, 3)) == 3
+    assert calls == [1, 3]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_unknown_collection_uses_default_ttl():
+    clock = Clock()
+    cache = QueryCache(ttls={}, default_ttl=5, clock=clock)
+    key = make_key("outra", "count", {})
+    calls = []
+    cache.get_or_load(key, loader(calls, 1))
+    clock.now = 5.0
+    cache.get_or_load(key, loader(calls, 2))
+    assert calls == [1, 2]
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryCache(max_entries=2, clock=Clock())
+    a, b, c = (make_key("objects", "find", name) for name in "abc")
+    calls = []
+    cache.get_or_load(a, loader(calls, "a"))
+    cache.get_or_load(b, loader(calls, "b"))
+    cache.get_or_load(a, loader(calls, "a2"))  # hit: "a" passa a ser o mais recente
+    cache.get_or_load(c, loader(calls, "c"))   # descarta "b"
+    assert cache.evictions == 1
+    assert cache.get_or_load(a, loader(calls, "a3")) == "a"
+    assert cache.get_or_load(b, loader(calls, "b2")) == "b2"
+    assert calls == ["a", "b", "c", "b2"]
+
+
+def test_key_ignores_dict_order():
+    assert make_key("objects", "find", {"a": 1, "b": 2}) == make_key("objects", "find", {"b": 2, "a": 1})
+
+
+def test_invalidate_only_drops_that_collection():
+    cache = QueryCache(clock=Clock())
+    calls = []
+    cache.get_or_load(make_key("objects", "find", {}), loader(calls, 1))
+    cache.get_or_load(make_key("history", "find", {}), loader(calls, 2))
+    cache.invalidate("objects")
+    cache.get_or_load(make_key("objects", "find", {}), loader(calls, 3))
+    cache.get_or_load(make_key("history", "find", {}), loader(calls, 4))
+    assert calls == [1, 2, 3]
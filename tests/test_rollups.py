@@ -0,0 +1,41 @@
+from datetime import datetime
+
+from rollups import OBJECT_STATS, RESIDENCE_STATS, merge_stat_ops
+
+
+def test_increments_of_same_document_are_summed():
+    merged = merge_stat_ops([
+        (RESIDENCE_STATS, 1, {"$inc": {"scans_total": 1}}),
+        (RESIDENCE_STATS, 1, {"$inc": {"scans_total": 2, "objects_total": 1}}),
+        (OBJECT_STATS, 1, {"$inc": {"events_total": 1}}),
+    ])
+    assert merged == {
+        (RESIDENCE_STATS, 1): {"$inc": {"scans_total": 3, "objects_total": 1}},
+        (OBJECT_STATS, 1): {"$inc": {"events_total": 1}},
+    }
+
+
+def test_counters_that_cancel_out_are_dropped():
+    # status que foi e voltou no mesmo lote: nada a enviar
+    merged = merge_stat_ops([
+        (RESIDENCE_STATS, 1, {"$inc": {"objects_by_status.ativo": -1, "objects_by_status.removido": 1}}),
+        (RESIDENCE_STATS, 1, {"$inc": {"objects_by_status.ativo": 1, "objects_by_status.removido": -1}}),
+    ])
+    assert merged == {}
+
+
+def test_max_keeps_latest_and_ignores_none():
+    merged = merge_stat_ops([
+        (RESIDENCE_STATS, 1, {"$max": {"last_scan_at": datetime(2025, 1, 2)}}),
+        (RESIDENCE_STATS, 1, {"$max": {"last_scan_at": None}}),
+        (RESIDENCE_STATS, 1, {"$max": {"last_scan_at": datetime(2025, 1, 1)}}),
+    ])
+    assert merged[(RESIDENCE_STATS, 1)] == {"$max": {"last_scan_at": datetime(2025, 1, 2)}}
+
+
+def test_last_set_wins_and_survives_zero_increments():
+    merged = merge_stat_ops([
+        (RESIDENCE_STATS, 1, {"$set": {"user_id": "a"}, "$inc": {"scans_total": 1}}),
+        (RESIDENCE_STATS, 1, {"$set": {"user_id": "b"}, "$inc": {"scans_total": -1}}),
+    ])
+    assert merged == {(RESIDENCE_STATS, 1): {"$set": {"user_id": "b"}}}
@@ -0,0 +1,91 @@
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from common import DUPLICATE_KEY
+from write_behind import WriteBehindQueue
+
+BUCKETS = "scan_buckets"
+
+
+class FakeCollection:
+    """bulk_write roteirizado: cada chamada consome a próxima exceção de `failures`."""
+
+    def __init__(self, failures=(), stored_scans=()):
+        self.failures = list(failures)
+        self.stored_scans = list(stored_scans)
+        self.calls = []
+
+    def bulk_write(self, ops, ordered=True):
+        self.calls.append(list(ops))
+        if self.failures:
+            raise self.failures.pop(0)
+
+    def find(self, filter, projection=None):
+        wanted = set(filter["scans._id"]["$in"])
+        return [{"scans": [{"_id": scan_id} for scan_id in self.stored_scans if scan_id in wanted]}]
+
+
+class FakeDb(dict):
+    def __missing__(self, name):
+        return self.setdefault(name, FakeCollection())
+
+
+def writer(db):
+    return WriteBehindQueue(db, retry_backoff=0, scan_mode="documents", update_stats=False)
+
+
+def entry(operation, scan_id=None):
+    return (operation, 0.0, None, scan_id)
+
+
+def bucket(scan_id):
+    return UpdateOne({"residence_id": 1}, {"$push": {"scans": {"_id": scan_id}}}, upsert=True)
+
+
+def test_unapplied_retries_inserts_and_missing_bucket_scans():
+    db = FakeDb({BUCKETS: FakeCollection(stored_scans=["s1"])})
+    batch = [
+        entry(InsertOne({"_id": 1})),
+        entry(bucket("s1"), scan_id="s1"),
+        entry(bucket("s2"), scan_id="s2"),
+        entry(UpdateOne({"_id": 2}, {"$inc": {"n": 1}})),
+    ]
+    retry, applied, uncertain = writer(db)._unapplied(BUCKETS, batch, [0, 1, 2, 3])
+    assert retry == [0, 2]
+    assert applied == [1]
+    assert uncertain == [3]
+
+
+def test_flush_counts_duplicate_after_transient_error_as_written():
+    # a tentativa interrompida gravou o documento 0; na repetição ele volta como chave duplicada
+    duplicate = BulkWriteError({"writeErrors": [{"index": 0, "code": DUPLICATE_KEY, "errmsg": "dup"}]})
+    db = FakeDb({"users": FakeCollection([AutoReconnect("queda"), duplicate])})
+    queue = writer(db)
+    queue._buffers["users"] = [entry(InsertOne({"_id": 1})), entry(InsertOne({"_id": 2}))]
+    queue._flush("users")
+    assert queue.stats["committed"] == 2
+    assert queue.stats["duplicates"] == 0
+    assert queue.stats["retries"] == 1
+    assert len(db["users"].calls) == 2
+
+
+def test_flush_does_not_repeat_plain_updates():
+    db = FakeDb({"objects": FakeCollection([AutoReconnect("queda")])})
+    queue = writer(db)
+    queue._buffers["objects"] = [entry(InsertOne({"_id": 1})), entry(UpdateOne({"_id": 2}, {"$inc": {"n": 1}}))]
+    queue._flush("objects")
+    # o $inc pode ter sido aplicado pela tentativa interrompida: só o insert é repetido
+    assert [len(ops) for ops in db["objects"].calls] == [2, 1]
+    assert queue.stats["committed"] == 1
+    assert queue.stats["failed"] == 1
+
+
+def test_flush_gives_up_on_non_transient_error():
+    errors = [{"index": 1, "code": 121, "errmsg": "validação"}]
+    db = FakeDb({"history": FakeCollection([BulkWriteError({"writeErrors": errors})])})
+    queue = writer(db)
+    queue._buffers["history"] = [entry(InsertOne({"_id": i})) for i in range(3)]
+    queue._flush("history")
+    assert queue.stats["committed"] == 2
+    assert queue.stats["failed"] == 1
+    assert queue.stats["retries"] == 0
@@ -0,0 +1,108 @@
+"""
+Linha do tempo do histórico (history -> objects -> residences)
+
+Uma única agregação devolve uma página de eventos já com o nome/tipo do objeto
+e o nome da residência, juntados no servidor com $lookup:
+
+- escopo por usuário (performed_by, índice performed_by_1_timestamp_-1), por
+  residência (object_id $in os objetos da residência, índice
+  object_id_1_timestamp_-1) ou por objeto
+- filtro opcional por action_type (índice action_type_1 quando não há escopo)
+- paginação por chave em timestamp; o $lookup roda só sobre os eventos da página
+
+A escolha do objeto usa busca por prefixo do nome no índice
+residence_id_1_name_1, sem carregar a lista de objetos do usuário.
+"""
+
+import re
+
+from pagination import DEFAULT_PAGE_SIZE, keyset_aggregate, keyset_pipeline
+
+SEARCH_LIMIT = 20
+SEARCH_PROJECTION = {"name": 1, "type": 1, "color": 1, "status": 1, "residence_id": 1}
+
+TIMELINE_FIELDS = {
+    "timestamp": 1, "action_type": 1, "notes": 1, "object_id": 1,
+    "old_coordinates": 1, "new_coordinates": 1, "old_color": 1, "new_color": 1,
+    "old_name": 1, "new_name": 1,
+}
+
+
+def timeline_filter(db, user_id=None, residence_id=None, object_id=None, action_types=None):
+    """Filtro sobre history para o escopo pedido (o mais específico vence)."""
+    query = {}
+    if object_id is not None:
+        query["object_id"] = object_id
+    elif residence_id is not None:
+        # history não guarda residence_id: resolve os objetos da residência pelo índice
+        query["object_id"] = {"$in": db.objects.distinct("_id", {"residence_id": residence_id})}
+    elif user_id is not None:
+        query["performed_by"] = user_id
+    if action_types:
+        query["action_type"] = {"$in": list(action_types)}
+    return query
+
+
+def timeline_stages():
+    """Estágios aplicados à página: junta objeto e residência e projeta os campos exibidos."""
+    return [
+        {"$project": TIMELINE_FIELDS},
+        {"$lookup": {
+            "from": "objects", "localField": "object_id", "foreignField": "_id",
+            "pipeline": [{"$project": {"_id": 0, "name": 1, "type": 1, "residence_id": 1}}],
+            "as": "object",
+        }},
+        {"$unwind": {"path": "$object", "preserveNullAndEmptyArrays": True}},
+        {"$lookup": {
+            "from": "residences", "localField": "object.residence_id", "foreignField": "_id",
+            "pipeline": [{"$project": {"_id": 0, "name": 1}}],
+            "as": "residence",
+        }},
+        {"$unwind": {"path": "$residence", "preserveNullAndEmptyArrays": True}},
+        {"$set": {
+            "object_name": "$object.name",
+            "object_type": "$object.type",
+            "residence": "$residence.name",
+        }},
+        {"$project": {"object": 0, "object_id": 0}},
+    ]
+
+
+def timeline_pipeline(query, after=None, page_size=DEFAULT_PAGE_SIZE):
+    """Estágios que timeline_page envia a history (filtro de timeline_filter)."""
+    return keyset_pipeline(query, "timestamp", -1, after, page_size, timeline_stages())
+
+
+def timeline_page(db, user_id=None, residence_id=None, object_id=None, action_types=None,
+                  after=None, page_size=DEFAULT_PAGE_SIZE, query=None):
+    """Uma página da linha do tempo, do evento mais recente ao mais antigo.
+
+    `query` é um filtro já montado por timeline_filter (ex.: guardado em
+    cache pelo dashboard) e dispensa os argumentos de escopo.
+    Retorna (eventos, cursor_da_próxima_página), como keyset_page.
+    """
+    if query is None:
+        query = timeline_filter(db, user_id, residence_id, object_id, action_types)
+    return keyset_aggregate(db.history, query, "timestamp", -1, after, page_size, timeline_stages())
+
+
+def search_query(residence_ids, prefix):
+    """Filtro de objects por prefixo do nome (o prefixo já sem espaços, não vazio).
+
+    O regex ancorado vira um intervalo no índice residence_id_1_name_1; a
+    primeira letra é testada minúscula e maiúscula ("sof" acha "Sofá").
+    """
+    variants = {prefix, prefix[0].upper() + prefix[1:], prefix[0].lower() + prefix[1:]}
+    return {
+        "residence_id": {"$in": list(residence_ids)},
+        "name": {"$in": [re.compile("^" + re.escape(v)) for v in sorted(variants)]},
+    }
+
+
+def search_objects(db, residence_ids, prefix, limit=SEARCH_LIMIT):
+    """Objetos das residências cujo nome começa com `prefix`, em ordem de nome."""
+    prefix = prefix.strip()
+    if not prefix or not residence_ids:
+        return []
+    query = search_query(residence_ids, prefix)
+    return list(db.objects.find(query, SEARCH_PROJECTION).sort("name", 1).limit(limit))
@@ -0,0 +1,451 @@
+"""
+Fila de escrita (write-behind) com group commit e backpressure
+
+Os produtores (scanners, o gerador do pop_db.py) entregam scans, objetos e
+eventos de history a uma fila limitada em memória e seguem adiante, sem
+esperar a confirmação de cada escrita. Uma thread de flush agrupa as
+operações por coleção e grava cada grupo com um bulk_write não ordenado
+quando:
+
+- o grupo chega a `batch_size` operações (gatilho por tamanho), ou
+- a operação mais antiga do grupo espera há `max_delay` segundos (gatilho por tempo)
+
+Erros transitórios (queda de conexão, troca de primário, erros com o rótulo
+RetryableWriteError) repetem o lote com espera exponencial. Só o que é
+seguro repetir volta ao servidor:
+
+- inserts: os documentos já levam _id, então um insert que a tentativa
+  interrompida gravou só gera chave duplicada, contada como gravada
+- upserts de bucket ($push + $inc): antes de repetir, uma consulta por
+  scans._id tira os scans que já estão em algum bucket
+- outros updates (ex.: $inc em objetos): sem como saber se foram aplicados,
+  não são repetidos e contam como falha
+
+Com `update_stats`, cada scan, objeto novo e evento de history enfileirado
+leva as atualizações de residence_stats/object_stats que ele causa
+(rollups.py); elas são enviadas depois do lote, só para as operações que
+foram gravadas nele (duplicadas e falhas não contam). Com a fila cheia, `submit` espera até
+`timeout` e então levanta `Backpressure`; `pressure()` dá a ocupação da fila
+para o produtor reduzir o ritmo antes disso. O write concern é configurável
+(w=0 não espera confirmação; w="majority", j=True espera a gravação no
+journal da maioria).
+
+Gerador de carga (usa os geradores do pop_db.py e um banco descartável):
+    python write_behind.py --users 50 --producers 4
+    python write_behind.py --users 50 --batch-size 1000 --max-delay 0.1 --w majority --journal
+    python write_behind.py --users 20 --rate 2000      # ritmo fixo: mede a latência sustentada
+"""
+
+import argparse
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, PyMongoError
+from pymongo.write_concern import WriteConcern
+
+import pop_db
+from common import COLLECTION_ORDER, DUPLICATE_KEY, summarize
+from rollups import apply_stat_ops, history_stat_ops, object_stat_ops, residence_stat_ops, scan_stat_ops
+from scan_store import BUCKETS, SCAN_COLLECTIONS, bucket_update, ensure_collection, storage_mode
+
+DEFAULT_MAX_QUEUE = 10_000
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_DELAY = 0.05   # segundos
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_RETRY_BACKOFF = 0.1
+DEFAULT_SUBMIT_TIMEOUT = 5.0
+MAX_LATENCY_SAMPLES = 200_000
+LOAD_DB = "map_app_load"
+
+# upserts de bucket precisam ser ordenados: dois scans da mesma hora no mesmo
+# lote abririam dois buckets
+ORDERED_COLLECTIONS = {SCAN_COLLECTIONS[BUCKETS]}
+
+_STOP = object()
+
+
+class Backpressure(Exception):
+    """A fila continuou cheia durante todo o tempo de espera do submit."""
+
+
+def is_transient(exc):
+    if isinstance(exc, ConnectionFailure):
+        return True
+    return isinstance(exc, PyMongoError) and exc.has_error_label("RetryableWriteError")
+
+
+class WriteBehindQueue:
+    """Fila limitada + thread de flush com group commit por coleção."""
+
+    def __init__(self, db, max_queue=DEFAULT_MAX_QUEUE, batch_size=DEFAULT_BATCH_SIZE, max_delay=DEFAULT_MAX_DELAY,
+                 write_concern=None, max_retries=DEFAULT_MAX_RETRIES, retry_backoff=DEFAULT_RETRY_BACKOFF,
+                 scan_mode=None, update_stats=True):
+        self.db = db
+        self.update_stats = update_stats
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.write_concern = write_concern
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.scan_mode = scan_mode or storage_mode()
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.stats = Counter()           # submitted, committed, duplicates, failed, retries, batches, stalls, rejected, stats_failed
+        self.committed_by_collection = Counter()
+        self.latencies = deque(maxlen=MAX_LATENCY_SAMPLES)  # segundos entre submit e confirmação
+        self.errors = deque(maxlen=100)
+        self._buffers = {}               # coleção -> [(operação, instante do submit, atualizações dos resumos, _id do scan)]
+        self._lock = threading.Lock()
+        self._thread = None
+
+    # --- produtores ---------------------------------------------------------
+
+    def submit(self, collection, operation, block=True, timeout=DEFAULT_SUBMIT_TIMEOUT, stat_ops=None, scan_id=None):
+        """Enfileira uma operação (dict = InsertOne, ou um modelo de escrita do PyMongo).
+
+        `stat_ops` são as triplas de rollups.py aplicadas se a operação for
+        gravada; `scan_id` marca um upsert de bucket (ver _unapplied).
+        """
+        if isinstance(operation, dict):
+            operation = InsertOne(operation)
+        item = (collection, operation, time.perf_counter(), stat_ops if self.update_stats else None, scan_id)
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.stats["stalls"] += 1
+            try:
+                if not block:
+                    raise queue.Full
+                self.queue.put(item, timeout=timeout)
+            except queue.Full:
+                with self._lock:
+                    self.stats["rejected"] += 1
+                raise Backpressure(f"fila cheia ({self.queue.maxsize} operações)") from None
+        with self._lock:
+            self.stats["submitted"] += 1
+
+    def submit_residence(self, residence_doc, **kwargs):
+        """Residência nova; o resumo dela é aberto com o user_id."""
+        kwargs.setdefault("stat_ops", residence_stat_ops(residence_doc))
+        self.submit("residences", residence_doc, **kwargs)
+
+    def submit_scan(self, scan_doc, **kwargs):
+        """Scan na coleção do modo de armazenamento (ver scan_store.py)."""
+        kwargs.setdefault("stat_ops", scan_stat_ops(scan_doc))
+        if self.scan_mode == BUCKETS:
+            self.submit(SCAN_COLLECTIONS[BUCKETS], bucket_update(scan_doc), scan_id=scan_doc["_id"], **kwargs)
+        else:
+            self.submit(SCAN_COLLECTIONS[self.scan_mode], scan_doc, **kwargs)
+
+    def submit_object(self, operation, **kwargs):
+        """Objeto novo (dict) ou update de um existente.
+
+        Um update que muda o status deve levar em `stat_ops` o
+        object_stat_ops(objeto, old_status=...) correspondente.
+        """
+        if isinstance(operation, dict):
+            kwargs.setdefault("stat_ops", object_stat_ops(operation))
+        self.submit("objects", operation, **kwargs)
+
+    def submit_history(self, event, residence_id=None, **kwargs):
+        """Evento de history; com `residence_id`, conta nos resumos da residência e do objeto."""
+        if residence_id is not None:
+            kwargs.setdefault("stat_ops", history_stat_ops(event, residence_id))
+        self.submit("history", event, **kwargs)
+
+    def pressure(self):
+        """Ocupação da fila entre 0 e 1."""
+        return self.queue.qsize() / self.queue.maxsize if self.queue.maxsize else 0.0
+
+    # --- ciclo de vida ------------------------------------------------------
+
+    def start(self):
+        if self._thread is None:
+            # scans_ts precisa nascer time-series e scan_buckets precisa do índice antes do primeiro lote
+            ensure_collection(self.db, self.scan_mode)
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self, timeout=None):
+        """Grava tudo que está na fila e encerra a thread de flush."""
+        if self._thread is not None:
+            self.queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- flush --------------------------------------------------------------
+
+    def _run(self):
+        while True:
+            due = [items[0][1] + self.max_delay for items in self._buffers.values() if items]
+            wait = max(0.0, min(due) - time.perf_counter()) if due else self.max_delay
+            try:
+                item = self.queue.get(timeout=wait)
+            except queue.Empty:
+                item = None
+            # esvazia o que já está na fila sem voltar a esperar
+            items = [] if item is None else [item]
+            while item is not None and item is not _STOP and len(items) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                items.append(item)
+
+            stop = False
+            for entry in items:
+                if entry is _STOP:
+                    stop = True
+                    continue
+                collection, *operation = entry
+                buffer = self._buffers.setdefault(collection, [])
+                buffer.append(tuple(operation))
+                if len(buffer) >= self.batch_size:
+                    self._flush(collection)
+
+            now = time.perf_counter()
+            for collection in self._ordered(self._buffers):
+                buffer = self._buffers[collection]
+                if buffer and (stop or now - buffer[0][1] >= self.max_delay):
+                    self._flush(collection)
+            if stop:
+                return
+
+    def _ordered(self, collections):
+        # vários grupos vencem juntos: referências primeiro, com os scans na
+        # posição de "scans" em qualquer modo de armazenamento
+        rank = {name: i for i, name in enumerate(COLLECTION_ORDER)}
+        rank.update((name, rank["scans"]) for name in SCAN_COLLECTIONS.values())
+        return sorted(collections, key=lambda name: rank.get(name, len(rank)))
+
+    def _collection(self, name):
+        col = self.db[name]
+        return col.with_options(write_concern=self.write_concern) if self.write_concern is not None else col
+
+    def _unapplied(self, collection, batch, pending):
+        """Separa as operações de um lote interrompido: (repetir, já gravadas, incertas)."""
+        retry, applied, uncertain, scan_ids = [], [], [], {}
+        for i in pending:
+            operation, _, _, scan_id = batch[i]
+            if isinstance(operation, InsertOne):
+                retry.append(i)
+            elif scan_id is not None:
+                scan_ids[i] = scan_id
+            else:
+                uncertain.append(i)
+        if scan_ids:
+            stored = {
+                scan["_id"]
+                for doc in self.db[collection].find({"scans._id": {"$in": list(scan_ids.values())}}, {"scans._id": 1})
+                for scan in doc["scans"]
+            }
+            for i, scan_id in scan_ids.items():
+                (applied if scan_id in stored else retry).append(i)
+        return sorted(retry), applied, uncertain
+
+    def _flush(self, collection):
+        batch = self._buffers.pop(collection, [])
+        if not batch:
+            return
+        col = self._collection(collection)
+        ops = [entry[0] for entry in batch]
+        ordered = collection in ORDERED_COLLECTIONS
+        pending = list(range(len(ops)))  # posições no lote ainda não resolvidas
+        written = []                     # posições gravadas
+        duplicates = failed = retries = 0
+        while pending:
+            try:
+                if retries:
+                    # a tentativa interrompida pode ter gravado parte do lote
+                    pending, applied, uncertain = self._unapplied(collection, batch, pending)
+                    written += applied
+                    if uncertain:
+                        failed += len(uncertain)
+                        self.errors.append(f"{collection}: {len(uncertain)} update(s) não repetido(s) após erro transitório")
+                    if not pending:
+                        break
+                col.bulk_write([ops[i] for i in pending], ordered=ordered)
+                written += pending
+                break
+            except BulkWriteError as exc:
+                errors = exc.details.get("writeErrors", [])
+                dup = sum(1 for e in errors if e.get("code") == DUPLICATE_KEY)
+                if any(e.get("code") != DUPLICATE_KEY for e in errors):
+                    self.errors.append(f"{collection}: {next(e for e in errors if e.get('code') != DUPLICATE_KEY).get('errmsg')}")
+                if not ordered:
+                    rejected = {e["index"] for e in errors if not (retries and e.get("code") == DUPLICATE_KEY)}
+                    written += [i for k, i in enumerate(pending) if k not in rejected]
+                    if not retries:
+                        duplicates += dup
+                    failed += len(errors) - dup
+                    break
+                # lote ordenado para no primeiro erro: só segue adiante se foi chave duplicada
+                stopped = errors[0]["index"] if errors else len(pending)
+                written += pending[:stopped]
+                if dup and errors[0].get("code") == DUPLICATE_KEY:
+                    if retries:
+                        written.append(pending[stopped])
+                    else:
+                        duplicates += 1
+                    pending = pending[stopped + 1:]
+                    continue
+                failed += len(pending) - stopped
+                break
+            except PyMongoError as exc:
+                if not is_transient(exc) or retries == self.max_retries:
+                    failed += len(pending)
+                    self.errors.append(f"{collection}: {exc}")
+                    break
+                time.sleep(self.retry_backoff * 2 ** retries)
+                retries += 1
+
+        stats_failed = 0
+        stat_ops = [op for i in written for op in (batch[i][2] or [])]
+        if stat_ops:
+            try:
+                apply_stat_ops(self.db, stat_ops)
+            except PyMongoError as exc:
+                # $inc não é idempotente: sem repetição; `python rollups.py` reconstrói os resumos
+                stats_failed = len(stat_ops)
+                self.errors.append(f"resumos: {exc}")
+
+        now = time.perf_counter()
+        self.latencies.extend(now - entry[1] for entry in batch)
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["committed"] += len(written)
+            self.stats["duplicates"] += duplicates
+            self.stats["failed"] += failed
+            self.stats["retries"] += retries
+            self.stats["stats_failed"] += stats_failed
+            self.committed_by_collection[collection] += len(written)
+
+
+# ---------------------------------------------------------------------------
+# Gerador de carga
+# ---------------------------------------------------------------------------
+
+def produce(writer, bundles, rate=None, counter=None):
+    """Entrega os documentos dos bundles à fila, a `rate` operações/s (ou sem limite)."""
+    started = time.perf_counter()
+    sent = 0
+    for bundle in bundles:
+        # os eventos de history só trazem object_id; a residência vem dos objetos do bundle
+        residence_of = {obj["_id"]: obj["residence_id"] for obj in bundle["objects"]}
+        for doc in bundle["users"]:
+            writer.submit("users", doc)
+        for doc in bundle["residences"]:
+            writer.submit_residence(doc)
+        for doc in bundle["scans"]:
+            writer.submit_scan(doc)
+        for doc in bundle["objects"]:
+            writer.submit_object(doc)
+        for doc in bundle["history"]:
+            writer.submit_history(doc, residence_id=residence_of.get(doc["object_id"]))
+        sent += sum(len(docs) for docs in bundle.values())
+        if rate:
+            # ritmo fixo: dorme o que sobrou do tempo previsto para `sent` operações
+            ahead = sent / rate - (time.perf_counter() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+    if counter is not None:
+        counter.append(sent)
+
+
+def run_load(db, num_users, producers=4, seed=None, rate=None, **options):
+    """Gera `num_users` usuários em `producers` threads e mede a fila de escrita."""
+    shards = pop_db.split_shards(num_users, producers)
+    per_producer = rate / len(shards) if rate else None
+    sent = []
+    writer = WriteBehindQueue(db, **options).start()
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(
+            target=produce,
+            args=(writer, pop_db.generate_bundles(start, stop, seed=seed), per_producer, sent),
+            name=f"producer-{i}",
+        )
+        for i, (start, stop) in enumerate(shards)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    produced = time.perf_counter() - started
+    writer.close()
+    elapsed = time.perf_counter() - started
+    stats = dict(writer.stats)
+    return {
+        "operations": sum(sent),
+        "produce_seconds": round(produced, 3),
+        "total_seconds": round(elapsed, 3),
+        "ops_per_s": round(stats.get("committed", 0) / elapsed, 1) if elapsed else None,
+        "avg_batch": round(len(writer.latencies) / stats["batches"], 1) if stats.get("batches") else 0,
+        "stats": stats,
+        "by_collection": dict(writer.committed_by_collection),
+        "latency": summarize(writer.latencies),
+        "errors": list(writer.errors)[:5],
+    }
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Gerador de carga da fila de escrita write-behind.")
+    parser.add_argument("--uri", default=os.getenv("MONGODB_URI"), help="URI do servidor")
+    parser.add_argument("--db", default=LOAD_DB, help="banco descartável (apagado antes e depois)")
+    parser.add_argument("--users", type=int, default=50, help="usuários gerados (com residências, scans, ...)")
+    parser.add_argument("--producers", type=int, default=4, help="threads produtoras")
+    parser.add_argument("--rate", type=float, default=None, help="operações/s somando os produtores (padrão: sem limite)")
+    parser.add_argument("--seed", type=int, default=None, help="seed dos geradores")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_MAX_QUEUE, help="capacidade da fila")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="operações por bulk_write")
+    parser.add_argument("--max-delay", type=float, default=DEFAULT_MAX_DELAY, help="espera máxima de uma operação na fila (s)")
+    parser.add_argument("--w", default="1", help='write concern: 0, 1, 2, ... ou "majority"')
+    parser.add_argument("--journal", action="store_true", help="espera a gravação no journal (j=True)")
+    parser.add_argument("--no-stats", action="store_true", help="não mantém residence_stats/object_stats")
+    parser.add_argument("--keep", action="store_true", help="não apaga o banco ao final")
+    args = parser.parse_args()
+
+    w = int(args.w) if args.w.isdigit() else args.w
+    client = MongoClient(args.uri)
+    client.drop_database(args.db)
+    try:
+        result = run_load(
+            client[args.db], args.users, producers=args.producers, seed=args.seed, rate=args.rate,
+            max_queue=args.queue_size, batch_size=args.batch_size, max_delay=args.max_delay,
+            write_concern=WriteConcern(w=w, j=args.journal or None), update_stats=not args.no_stats,
+        )
+    finally:
+        if not args.keep:
+            client.drop_database(args.db)
+
+    stats = result["stats"]
+    print(f"Operações: {result['operations']} em {result['total_seconds']} s "
+          f"(produção {result['produce_seconds']} s)")
+    print(f"Gravadas:  {stats.get('committed', 0)}  ({result['ops_per_s']} ops/s, "
+          f"{stats.get('batches', 0)} lotes, média {result['avg_batch']} por lote)")
+    print(f"Repetições: {stats.get('retries', 0)}  duplicadas: {stats.get('duplicates', 0)}  "
+          f"falhas: {stats.get('failed', 0)}  resumos não aplicados: {stats.get('stats_failed', 0)}")
+    print(f"Fila cheia: {stats.get('stalls', 0)} esperas, {stats.get('rejected', 0)} rejeições")
+    latency = result["latency"]
+    if latency:
+        print(f"Latência submit -> confirmação (ms): p50 {latency['p50_ms']}  p95 {latency['p95_ms']}  "
+              f"p99 {latency['p99_ms']}  máx {latency['max_ms']}")
+    for name, count in result["by_collection"].items():
+        print(f"  {name:<13} {count:>9}")
+    for error in result["errors"]:
+        print(f"  erro: {error}")